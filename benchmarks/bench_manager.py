@@ -0,0 +1,404 @@
+"""
+Benchmarks for the KnowledgeGraphManager tool paths on synthetic graphs.
+
+Generates reproducible graphs (seeded) of the requested sizes, runs every tool
+path against each storage backend and reports latency, throughput and peak
+Python memory as JSON, so runs can be diffed before and after a change:
+
+    python benchmarks/bench_manager.py --sizes 1000,10000 --output before.json
+    python benchmarks/bench_manager.py --sizes 1000,10000 --output after.json
+    python benchmarks/bench_manager.py --compare before.json after.json
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+# The server module builds a global manager on import; keep it off real data
+_scratch_dir = tempfile.mkdtemp(prefix='memory-bench-')
+os.environ.setdefault('MEMORY_FILE_PATH', os.path.join(_scratch_dir, 'global.jsonl'))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+import memory_server  # noqa: E402
+from memory_server import Entity, KnowledgeGraph, KnowledgeGraphManager, Relation, create_store  # noqa: E402
+
+OPERATIONS = [
+    'save_graph', 'load_graph', 'create_entities', 'search_nodes', 'open_nodes',
+    'delete_entities', 'prune_entities', 'review_conversation_analysis', 'add_observations_full_cache'
+]
+
+# Result cache size for add_observations_full_cache: the server's default
+FULL_CACHE_SIZE = 256
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ra', 'ten', 'vo', 'shi', 'pu', 'den', 'gal', 'or', 'ne', 'stra', 'qui', 'bel', 'zu']
+ENTITY_TYPES = ['person', 'organization', 'location', 'concept', 'project', 'event']
+RELATION_TYPES = ['knows', 'works_at', 'located_in', 'part_of', 'mentioned_with', 'depends_on']
+
+
+class SyntheticGraph:
+    """Seeded generator of entity/relation data of a given shape"""
+
+    def __init__(self, size: int, observations: int, relations_per_entity: float, seed: int):
+        self.size = size
+        self.observations = observations
+        self.relations_per_entity = relations_per_entity
+        self.rng = random.Random(seed)
+        self.words = self._vocabulary(2000)
+        self.names = [self._name(i) for i in range(size)]
+
+    def _vocabulary(self, count: int) -> List[str]:
+        words = set()
+        while len(words) < count:
+            words.add(''.join(self.rng.choice(SYLLABLES) for _ in range(self.rng.randint(2, 4))))
+        return sorted(words)
+
+    def _name(self, i: int) -> str:
+        return f"{self.rng.choice(self.words).title()} {self.rng.choice(self.words).title()} {i}"
+
+    def sentence(self, length: int = 8) -> str:
+        return ' '.join(self.rng.choice(self.words) for _ in range(length))
+
+    def entity(self, name: str) -> Entity:
+        # Observation counts vary around the mean so some entities are much larger
+        count = self.rng.randint(0, 2 * self.observations)
+        return Entity(
+            name=name,
+            entityType=self.rng.choice(ENTITY_TYPES),
+            observations=[self.sentence() for _ in range(count)],
+            weight=self.rng.randint(0, 20)
+        )
+
+    def graph(self) -> KnowledgeGraph:
+        entities = [self.entity(name) for name in self.names]
+        relations = {}
+        for _ in range(int(self.size * self.relations_per_entity)):
+            relation = Relation(
+                from_entity=self.rng.choice(self.names),
+                to_entity=self.rng.choice(self.names),
+                relationType=self.rng.choice(RELATION_TYPES)
+            )
+            relations[(relation.from_entity, relation.to_entity, relation.relationType)] = relation
+        return KnowledgeGraph(entities=entities, relations=list(relations.values()))
+
+    def queries(self, count: int) -> List[str]:
+        """Mix of whole words, word fragments, name lookups and misses"""
+        queries = []
+        for i in range(count):
+            kind = i % 4
+            if kind == 0:
+                queries.append(self.rng.choice(self.words))
+            elif kind == 1:
+                word = self.rng.choice(self.words)
+                queries.append(word[1:4])
+            elif kind == 2:
+                queries.append(self.rng.choice(self.names))
+            else:
+                queries.append('zzqx' + str(i))
+        return queries
+
+    def conversation(self, lines: int = 40) -> str:
+        people = [f"{self.rng.choice(self.words).title()} {self.rng.choice(self.words).title()}" for _ in range(5)]
+        keywords = ['office', 'team', 'project', 'meeting', 'company', 'city', 'plan', 'problem']
+        text = []
+        for _ in range(lines):
+            text.append(f"{self.rng.choice(people)}: {self.sentence(6)} {self.rng.choice(keywords)} "
+                        f"{self.sentence(4)}")
+        return '\n'.join(text)
+
+
+def summarize(latencies: List[float], items_per_call: int = 1) -> dict:
+    """Latency distribution (ms) and throughput for a list of per-call seconds"""
+    ordered = sorted(latencies)
+    total = sum(ordered)
+
+    def percentile(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000
+
+    return {
+        'calls': len(ordered),
+        'total_s': round(total, 6),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 4),
+        'p50_ms': round(percentile(0.50), 4),
+        'p95_ms': round(percentile(0.95), 4),
+        'p99_ms': round(percentile(0.99), 4),
+        'max_ms': round(ordered[-1] * 1000, 4),
+        'ops_per_s': round(len(ordered) / total, 2) if total else None,
+        'items_per_s': round(len(ordered) * items_per_call / total, 2) if total else None,
+    }
+
+
+def timed(calls: List[Callable[[], object]]) -> List[float]:
+    latencies = []
+    for call in calls:
+        start = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def peak_memory(call: Callable[[], object]) -> int:
+    """Peak bytes allocated by Python while running call once"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        call()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+class BackendRun:
+    """One benchmarked graph on one storage backend, in its own scratch directory"""
+
+    def __init__(self, backend: str, directory: str, track_access: bool, binary_snapshot: bool = False,
+                 result_cache_size: int = 0):
+        self.backend = backend
+        self.path = os.path.join(directory, 'memory.db' if backend == 'sqlite' else 'memory.jsonl')
+        self.track_access = track_access
+        self.store_options = {'binary_snapshot': True} if binary_snapshot and backend == 'jsonl' else {}
+        self.result_cache_size = result_cache_size
+        self.managers: List[KnowledgeGraphManager] = []
+
+    def manager(self) -> KnowledgeGraphManager:
+        manager = KnowledgeGraphManager(self.path, store=create_store(self.backend, self.path, **self.store_options),
+                                        track_access=self.track_access, result_cache_size=self.result_cache_size)
+        self.managers.append(manager)
+        return manager
+
+    def close(self) -> None:
+        for manager in self.managers:
+            manager.close()
+        self.managers = []
+
+
+def bench_size(backend: str, gen: SyntheticGraph, args, directory: str) -> List[dict]:
+    """Run every selected operation for one graph size; returns result rows"""
+    run = BackendRun(backend, directory, track_access=not args.no_track_access,
+                     binary_snapshot=args.binary_snapshot, result_cache_size=args.result_cache_size)
+    rows = []
+    graph = gen.graph()
+
+    def record(operation: str, latencies: List[float], items_per_call: int = 1,
+               memory_call: Optional[Callable[[], object]] = None, **extra) -> None:
+        row = {
+            'operation': operation,
+            'backend': backend,
+            'entities': gen.size,
+            'relations': len(graph.relations),
+            **summarize(latencies, items_per_call),
+            **extra
+        }
+        if memory_call is not None and not args.no_memory:
+            row['peak_memory_bytes'] = peak_memory(memory_call)
+        rows.append(row)
+        print(f"  {backend:6} {gen.size:>9} {operation:30} p50 {row['p50_ms']:>10.3f} ms"
+              f"  {row['ops_per_s'] or 0:>10.1f} ops/s", file=sys.stderr)
+
+    selected = set(args.operations)
+    try:
+        writer = run.manager()
+        # save_graph is always run: it puts the synthetic graph on disk for the rest
+        latencies = timed([lambda: writer.save_graph(graph)] * args.repeat)
+        if 'save_graph' in selected:
+            record('save_graph', latencies, gen.size, memory_call=lambda: writer.save_graph(graph),
+                   file_bytes=os.path.getsize(run.path))
+        writer.close()
+
+        if 'load_graph' in selected:
+            # Cold load: a fresh manager reading the whole store into memory
+            latencies = timed([lambda: run.manager().load_graph() for _ in range(args.repeat)])
+            run.close()
+            record('load_graph', latencies, gen.size, memory_call=lambda: run.manager().load_graph())
+            run.close()
+
+        manager = run.manager()
+        manager.load_graph()
+
+        if 'search_nodes' in selected:
+            queries = gen.queries(args.queries)
+            latencies = timed([lambda q=q: manager.search_nodes(q, args.search_limit) for q in queries])
+            record('search_nodes', latencies, memory_call=lambda: manager.search_nodes(queries[0], args.search_limit),
+                   limit=args.search_limit)
+
+        if 'open_nodes' in selected:
+            batches = [gen.rng.sample(gen.names, min(args.batch, gen.size)) for _ in range(args.queries)]
+            latencies = timed([lambda b=b: manager.open_nodes(b) for b in batches])
+            record('open_nodes', latencies, args.batch, memory_call=lambda: manager.open_nodes(batches[0]))
+
+        if 'create_entities' in selected:
+            batches = [[gen.entity(f"New Entity {i} {j}") for j in range(args.batch)] for i in range(args.repeat + 1)]
+            latencies = timed([lambda b=b: manager.create_entities(b) for b in batches[1:]])
+            record('create_entities', latencies, args.batch,
+                   memory_call=lambda: manager.create_entities(batches[0]))
+
+        if 'delete_entities' in selected:
+            # Cascade: deleting entities also removes their relations
+            victims = gen.rng.sample(gen.names, min(gen.size, args.batch * (args.repeat + 1)))
+            batches = [victims[i:i + args.batch] for i in range(0, len(victims), args.batch)]
+            latencies = timed([lambda b=b: manager.delete_entities(b) for b in batches[1:]])
+            record('delete_entities', latencies, args.batch,
+                   memory_call=lambda: manager.delete_entities(batches[0]))
+
+        if 'prune_entities' in selected:
+            # Each call removes the next weight band (synthetic weights are 0..20)
+            thresholds = list(range(1, args.repeat + 2))
+            latencies = timed([lambda t=t: manager.prune_entities(t) for t in thresholds[:-1]])
+            record('prune_entities', latencies,
+                   memory_call=lambda: manager.prune_entities(thresholds[-1]))
+
+        if 'review_conversation_analysis' in selected:
+            conversations = [gen.conversation(args.conversation_lines) for _ in range(args.repeat + 1)]
+
+            def review(text: str) -> dict:
+                return asyncio.run(memory_server.review_conversation_analysis(text, manager))
+
+            latencies = timed([lambda c=c: review(c) for c in conversations[1:]])
+            record('review_conversation_analysis', latencies,
+                   memory_call=lambda: review(conversations[0]),
+                   conversation_bytes=len(conversations[0].encode('utf-8')))
+        if 'add_observations_full_cache' in selected:
+            # Write latency when every write has to invalidate against a full result cache
+            cached = BackendRun(backend, directory, track_access=False, binary_snapshot=args.binary_snapshot,
+                                result_cache_size=FULL_CACHE_SIZE).manager()
+            for query in gen.queries(FULL_CACHE_SIZE):
+                cached.search_nodes(query, args.search_limit)
+            writes = [[{'entityName': gen.rng.choice(gen.names), 'observation': gen.sentence()}
+                       for _ in range(args.batch)] for _ in range(args.repeat + 1)]
+            latencies = timed([lambda w=w: cached.add_observations(w) for w in writes[1:]])
+            record('add_observations_full_cache', latencies, args.batch,
+                   memory_call=lambda: cached.add_observations(writes[0]),
+                   cached_results=cached.stats()['result_cache']['entries'])
+            cached.close()
+    finally:
+        run.close()
+    return rows
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=Path(__file__).resolve().parent, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'json_codec': memory_server.JSON_CODEC,
+    }
+
+
+def compare(baseline_path: str, candidate_path: str, threshold: float) -> int:
+    """Print p50/throughput changes between two result files; non-zero exit on regressions"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(candidate_path) as f:
+        candidate = json.load(f)
+
+    def key(row: dict):
+        return row['operation'], row['backend'], row['entities']
+
+    before = {key(row): row for row in baseline['results']}
+    regressions = 0
+    print(f"{'operation':30} {'backend':7} {'entities':>9} {'p50 before':>12} {'p50 after':>12} {'change':>8}")
+    for row in candidate['results']:
+        old = before.get(key(row))
+        if old is None or not old['p50_ms']:
+            continue
+        change = row['p50_ms'] / old['p50_ms'] - 1
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        print(f"{row['operation']:30} {row['backend']:7} {row['entities']:>9} "
+              f"{old['p50_ms']:>12.3f} {row['p50_ms']:>12.3f} {change:>+8.1%}{flag}")
+    return 1 if regressions else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark KnowledgeGraphManager tool paths")
+    parser.add_argument('--sizes', default='1000,10000',
+                        help="Comma-separated entity counts (e.g. 1000,10000,100000,1000000)")
+    parser.add_argument('--backends', default='jsonl,sqlite', help="Comma-separated storage backends")
+    parser.add_argument('--operations', default=','.join(OPERATIONS), help="Comma-separated operations to run")
+    parser.add_argument('--observations', type=int, default=3, help="Mean observations per entity")
+    parser.add_argument('--relations-per-entity', type=float, default=2.0, help="Relation density")
+    parser.add_argument('--repeat', type=int, default=5, help="Calls per bulk operation")
+    parser.add_argument('--queries', type=int, default=200, help="search_nodes/open_nodes calls")
+    parser.add_argument('--batch', type=int, default=50, help="Entities per create/delete/open call")
+    parser.add_argument('--search-limit', type=int, default=None, help="limit passed to search_nodes")
+    parser.add_argument('--conversation-lines', type=int, default=40)
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--no-memory', action='store_true', help="Skip tracemalloc peak memory runs")
+    parser.add_argument('--no-track-access', action='store_true', help="Run reads with track_access off")
+    parser.add_argument('--binary-snapshot', action='store_true', help="Keep a binary snapshot next to JSONL files")
+    parser.add_argument('--result-cache-size', type=int, default=0,
+                        help="Result cache entries (default: 0, so repeated queries are measured uncached)")
+    parser.add_argument('--output', help="Write JSON results here (default: stdout)")
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CANDIDATE'),
+                        help="Compare two result files instead of running")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="Relative p50 slowdown reported as a regression by --compare")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return compare(*args.compare, args.threshold)
+
+    args.operations = [op for op in args.operations.split(',') if op]
+    unknown = set(args.operations) - set(OPERATIONS)
+    if unknown:
+        parser.error(f"Unknown operations: {', '.join(sorted(unknown))}")
+
+    results = []
+    for size in (int(s) for s in args.sizes.split(',')):
+        for backend in args.backends.split(','):
+            directory = tempfile.mkdtemp(dir=_scratch_dir)
+            gen = SyntheticGraph(size, args.observations, args.relations_per_entity, args.seed)
+            try:
+                results.extend(bench_size(backend, gen, args, directory))
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+
+    report = {
+        'environment': environment(),
+        'parameters': {
+            'sizes': args.sizes, 'backends': args.backends, 'observations': args.observations,
+            'relations_per_entity': args.relations_per_entity, 'repeat': args.repeat,
+            'queries': args.queries, 'batch': args.batch, 'search_limit': args.search_limit,
+            'seed': args.seed, 'track_access': not args.no_track_access,
+            'binary_snapshot': args.binary_snapshot, 'result_cache_size': args.result_cache_size,
+        },
+        'results': results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    try:
+        sys.exit(main())
+    finally:
+        memory_server.knowledge_graph_manager.close()
+        shutil.rmtree(_scratch_dir, ignore_errors=True)
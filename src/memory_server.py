@@ -1,446 +1,4123 @@
 #!/usr/bin/env python3
 
+import asyncio
+import bisect
+import functools
+import heapq
+import itertools
 import json
+import logging
+import math
+import mmap
+import multiprocessing
 import os
-from dataclasses import dataclass, asdict
+import re
+import signal
+import sqlite3
+import struct
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Optional
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
-# Data classes for the knowledge graph
-@dataclass
+# Optional faster JSON codecs, preferred in this order when installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# stdout carries the MCP stdio transport, so diagnostics go through logging (stderr)
+logger = logging.getLogger("memory-server")
+
+
+# Data classes for the knowledge graph. Slotted: a resident graph holds
+# one instance per entity and relation, and __dict__ would dwarf the fields.
+@dataclass(slots=True)
 class Entity:
     name: str
     entityType: str
     observations: List[str]
     weight: int = 0
+    last_accessed: float = 0.0  # Unix time of the last access or creation; 0 if unknown
 
 
-@dataclass 
+@dataclass(slots=True)
 class Relation:
     from_entity: str  # renamed from 'from' (Python keyword)
     to_entity: str    # renamed from 'to' (Python keyword) 
     relationType: str
 
 
-@dataclass
+# Words used for ranking search results
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+@dataclass(slots=True)
 class KnowledgeGraph:
     entities: List[Entity]
     relations: List[Relation]
 
 
-class KnowledgeGraphManager:
-    def __init__(self, memory_file_path: str):
+@dataclass(slots=True)
+class GraphChanges:
+    graph_id: str  # Changes when the graph is replaced (e.g. on restart); pass it back with version
+    version: int  # Pass back to get the changes after this point
+    snapshot: bool  # True: records are the whole graph, to replace what the client holds
+    records: List[dict]  # Storage records, oldest first; changes also carry their own version
+
+
+@dataclass(slots=True)
+class GraphPage:
+    entities: List[Entity]
+    relations: List[Relation]
+    next_cursor: Optional[str]  # Pass back as cursor to fetch the following page
+    total: int  # Entities matching the filter across all pages
+
+
+class SearchIndex:
+    """Inverted index over entity text for search_nodes.
+    
+    Trigram postings narrow a substring query down to candidate entities
+    without scanning the graph; token postings reward whole-word matches
+    when ranking. Both map a key to {entity name: number of fields}, so
+    removing one observation only drops what no other field still holds.
+    """
+    
+    def __init__(self):
+        self._grams: Dict[str, Dict[str, int]] = {}
+        self._tokens: Dict[str, Dict[str, int]] = {}
+    
+    @staticmethod
+    def _grams_of(text: str) -> set:
+        # Texts shorter than a trigram are indexed whole so short queries still find them
+        if len(text) < 3:
+            return {text} if text else set()
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+    
+    @staticmethod
+    def _post(postings: Dict[str, Dict[str, int]], keys: set, name: str, delta: int) -> None:
+        for key in keys:
+            posting = postings.setdefault(key, {})
+            count = posting.get(name, 0) + delta
+            if count > 0:
+                posting[name] = count
+            else:
+                posting.pop(name, None)
+                if not posting:
+                    del postings[key]
+    
+    def add(self, name: str, text: str) -> None:
+        text = text.lower()
+        self._post(self._grams, self._grams_of(text), name, 1)
+        self._post(self._tokens, set(TOKEN_PATTERN.findall(text)), name, 1)
+    
+    def remove(self, name: str, text: str) -> None:
+        text = text.lower()
+        self._post(self._grams, self._grams_of(text), name, -1)
+        self._post(self._tokens, set(TOKEN_PATTERN.findall(text)), name, -1)
+    
+    def add_entity(self, entity: 'Entity') -> None:
+        for text in (entity.name, entity.entityType, *entity.observations):
+            self.add(entity.name, text)
+    
+    def remove_entity(self, entity: 'Entity') -> None:
+        for text in (entity.name, entity.entityType, *entity.observations):
+            self.remove(entity.name, text)
+    
+    def candidates(self, query_lower: str) -> Optional[set]:
+        """Names of entities that may contain query_lower; None means every entity"""
+        if not query_lower:
+            return None
+        if len(query_lower) < 3:
+            found = set()
+            for gram, posting in self._grams.items():
+                if query_lower in gram:
+                    found.update(posting)
+            return found
+        
+        postings = sorted((self._grams.get(gram, {}) for gram in self._grams_of(query_lower)), key=len)
+        found = set(postings[0])
+        for posting in postings[1:]:
+            if not found:
+                break
+            found.intersection_update(posting)
+        return found
+    
+    def score(self, entity: 'Entity', query_lower: str) -> float:
+        """Relevance of entity for query_lower, 0 if it does not actually match"""
+        name_lower = entity.name.lower()
+        score = 0.0
+        if query_lower == name_lower:
+            score += 10
+        elif query_lower in name_lower:
+            score += 5
+        if query_lower in entity.entityType.lower():
+            score += 3
+        score += sum(1 for obs in entity.observations if query_lower in obs.lower())
+        
+        # Prefer whole-word hits over matches inside longer words
+        tokens = TOKEN_PATTERN.findall(query_lower)
+        if score and tokens and self._has_tokens(entity, tokens):
+            score += 2
+        return score
+    
+    def _has_tokens(self, entity: 'Entity', tokens: List[str]) -> bool:
+        return all(entity.name in self._tokens.get(token, ()) for token in tokens)
+
+
+class StoreSearchIndex(SearchIndex):
+    """SearchIndex that leaves candidate lookup to the store's own full-text index"""
+    
+    def __init__(self, store: 'GraphStore'):
+        super().__init__()
+        self._store = store
+    
+    def add(self, name: str, text: str) -> None:
+        pass
+    
+    def remove(self, name: str, text: str) -> None:
+        pass
+    
+    def candidates(self, query_lower: str) -> Optional[set]:
+        return self._store.search(query_lower) if query_lower else None
+    
+    def _has_tokens(self, entity: 'Entity', tokens: List[str]) -> bool:
+        words = set()
+        for text in (entity.name, entity.entityType, *entity.observations):
+            words.update(TOKEN_PATTERN.findall(text.lower()))
+        return all(token in words for token in tokens)
+
+
+class SnapshotSearchIndex(SearchIndex):
+    """SearchIndex over a graph loaded from a binary snapshot.
+    
+    Postings of the entities as the snapshot holds them are read from the
+    mapped file. An entity is moved into the in-memory postings the first
+    time it changes, so the mapped ones never go stale.
+    """
+    
+    def __init__(self, snapshot: 'BinarySnapshot', entities: Dict[str, 'Entity']):
+        super().__init__()
+        self._snapshot = snapshot
+        self._names = snapshot.names
+        # Entities still served from the snapshot, by their ordinal in it
+        self._ordinals = {name: ordinal for ordinal, name in enumerate(self._names)}
+        self._entities = entities
+        # Ranking checks the query tokens once per candidate
+        self._token_posting = functools.lru_cache(maxsize=256)(snapshot.tokens.get)
+    
+    def _detach(self, name: str) -> bool:
+        """Stop serving name from the snapshot; False if it was not served from there"""
+        return self._ordinals.pop(name, None) is not None
+    
+    # The manager calls these after changing the entity, so a detached
+    # entity is indexed as it is now, which already includes the change
+    def add(self, name: str, text: str) -> None:
+        if self._detach(name):
+            super().add_entity(self._entities[name])
+        else:
+            super().add(name, text)
+    
+    def remove(self, name: str, text: str) -> None:
+        if self._detach(name):
+            super().add_entity(self._entities[name])
+        else:
+            super().remove(name, text)
+    
+    def add_entity(self, entity: 'Entity') -> None:
+        self._detach(entity.name)
+        super().add_entity(entity)
+    
+    def remove_entity(self, entity: 'Entity') -> None:
+        if not self._detach(entity.name):
+            super().remove_entity(entity)
+    
+    def candidates(self, query_lower: str) -> Optional[set]:
+        found = super().candidates(query_lower)
+        if found is None:
+            return None
+        grams = self._snapshot.grams
+        if len(query_lower) < 3:
+            ordinals = set()
+            for gram, posting in grams.items():
+                if query_lower in gram:
+                    ordinals.update(posting)
+        else:
+            postings = sorted((grams.get(gram) for gram in self._grams_of(query_lower)), key=len)
+            ordinals = set(postings[0])
+            for posting in postings[1:]:
+                if not ordinals:
+                    break
+                ordinals.intersection_update(posting)
+        names = self._names
+        found.update(names[ordinal] for ordinal in ordinals if self._ordinals.get(names[ordinal]) == ordinal)
+        return found
+    
+    def _has_tokens(self, entity: 'Entity', tokens: List[str]) -> bool:
+        ordinal = self._ordinals.get(entity.name)
+        if ordinal is None:
+            return super()._has_tokens(entity, tokens)
+        for token in tokens:
+            posting = self._token_posting(token)
+            i = bisect.bisect_left(posting, ordinal)
+            if i == len(posting) or posting[i] != ordinal:
+                return False
+        return True
+
+
+def _fsync_directory(path: Path) -> None:
+    """Flush a rename in path to disk (not supported on Windows)"""
+    if os.name == 'nt':
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class InterProcessLock:
+    """Exclusive advisory lock on a file, shared by every server process using the
+    same storage. Reentrant within a process; threads of one process take turns."""
+    
+    def __init__(self, path: Path):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+    
+    def __enter__(self) -> 'InterProcessLock':
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                self._file = self._acquire()
+            except BaseException:
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self._depth -= 1
+        if self._depth == 0 and self._file is not None:
+            try:
+                if fcntl is not None:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+                else:
+                    self._file.seek(0)
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            finally:
+                self._file.close()
+                self._file = None
+        self._thread_lock.release()
+    
+    def _acquire(self):
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            f = open(self.path, 'a+b')
+        except OSError as e:
+            # Read-only location: nobody else can write there either
+            logger.debug("Running without lock file %s: %s", self.path, e)
+            return None
+        try:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        pass  # LK_LOCK gives up after ~10 seconds; keep waiting
+        except BaseException:
+            f.close()
+            raise
+        return f
+
+
+# JSON codec for the storage log and tool responses. orjson or msgspec write
+# the same values as the json module, only with non-ASCII text as UTF-8
+# (all of them leave out optional whitespace); whatever they refuse to encode
+# or decode (e.g. lone surrogates) is left to the json module, so files
+# written by any codec stay readable by all of them.
+def _json_default(obj):
+    """Encode graph dataclasses field by field, without asdict()'s deep copy"""
+    fields = getattr(type(obj), '__dataclass_fields__', None)
+    if fields is None:
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+    return {field: getattr(obj, field) for field in fields}
+
+
+_JSON_ENCODER = json.JSONEncoder(default=_json_default, separators=(',', ':'))
+
+if orjson is not None:
+    JSON_CODEC = 'orjson'
+    _fast_dumpb = functools.partial(orjson.dumps, default=_json_default)
+    _fast_loads = orjson.loads
+    _FAST_ERRORS: Tuple[type, ...] = (TypeError, ValueError)
+elif msgspec is not None:
+    JSON_CODEC = 'msgspec'
+    _fast_dumpb = msgspec.json.Encoder(enc_hook=_json_default).encode
+    _fast_loads = msgspec.json.Decoder().decode
+    _FAST_ERRORS = (TypeError, ValueError, msgspec.MsgspecError)
+else:
+    JSON_CODEC = 'json'
+    _fast_dumpb = _fast_loads = None
+    _FAST_ERRORS = ()
+
+
+def json_loads(data):
+    """Decode JSON text or UTF-8 bytes; raises ValueError if it is not valid JSON"""
+    if _fast_loads is not None:
+        try:
+            return _fast_loads(data)
+        except _FAST_ERRORS:
+            pass
+    return json.loads(data)
+
+
+def json_dumpb(obj) -> bytes:
+    """Encode obj (graph dataclasses included) as UTF-8 JSON"""
+    if _fast_dumpb is not None:
+        try:
+            return _fast_dumpb(obj)
+        except _FAST_ERRORS:
+            pass
+    return _JSON_ENCODER.encode(obj).encode('utf-8')
+
+
+def json_dumps(obj) -> str:
+    """Encode obj (graph dataclasses included) as JSON text"""
+    if _fast_dumpb is not None:
+        try:
+            return _fast_dumpb(obj).decode('utf-8')
+        except _FAST_ERRORS:
+            pass
+    return _JSON_ENCODER.encode(obj)
+
+
+# Responses that reuse already encoded JSON (e.g. cached entities) are spliced
+# together by these, in the same compact format json_dumps writes
+def json_members(obj: dict) -> str:
+    """The members of obj as json_dumps writes them, without the enclosing braces"""
+    return json_dumps(obj)[1:-1]
+
+
+def json_object(*parts) -> str:
+    """JSON object of the members of parts, in order: dicts to encode, json_members()
+    text, or (key, JSON text) pairs for values encoded earlier"""
+    members = []
+    for part in parts:
+        if isinstance(part, dict):
+            part = json_members(part)
+        elif isinstance(part, tuple):
+            part = json_dumps(part[0]) + ':' + part[1]
+        if part:
+            members.append(part)
+    return '{' + ','.join(members) + '}'
+
+
+def json_array(items: Iterable[str]) -> str:
+    """JSON array of already encoded items"""
+    return '[' + ','.join(items) + ']'
+
+
+# Required fields of every record type in the storage log. 'entity' and
+# 'relation' are also the snapshot records; the rest are deltas.
+RECORD_FIELDS = {
+    'entity': ('name', 'entityType', 'observations'),
+    'relation': ('from_entity', 'to_entity', 'relationType'),
+    'delete_entity': ('name',),
+    'add_observation': ('entityName', 'observation'),
+    'delete_observation': ('entityName', 'observation'),
+    'weight': ('name', 'delta'),
+    'delete_relation': ('from_entity', 'to_entity', 'relationType'),
+    'batch': ('records',),  # Records of one manager.batch(), applied all or nothing
+}
+
+
+def _valid_record(item) -> bool:
+    """Check that a decoded record can be applied (unknown types are ignored, not invalid)"""
+    if not isinstance(item, dict):
+        return False
+    fields = RECORD_FIELDS.get(item.get('type'))
+    if fields is None:
+        return True
+    if any(field not in item for field in fields):
+        return False
+    if item['type'] == 'entity' and not isinstance(item['observations'], list):
+        return False
+    if item['type'] == 'batch':
+        return isinstance(item['records'], list) and all(_valid_record(record) for record in item['records'])
+    return True
+
+
+class GraphStore:
+    """Persistence behind KnowledgeGraphManager.
+    
+    The manager keeps the graph in memory and hands every mutation to the
+    store as a list of records (see RECORD_FIELDS). A store replays those
+    records back to the manager on load and whenever another process has
+    changed the underlying storage.
+    """
+    
+    def attach(self, snapshot_source: Callable[[], List[dict]]) -> None:
+        """Register the callable returning the full graph as snapshot records"""
+        self.snapshot_source = snapshot_source
+    
+    def poll(self) -> Optional[Tuple[bool, List[dict]]]:
+        """Return None if nothing changed since the last poll, else (reset, records).
+        
+        With reset set, the records describe the whole graph and replace
+        the resident state; otherwise they are applied on top of it.
+        """
+        raise NotImplementedError
+    
+    def has_changes(self) -> bool:
+        """Cheap check whether poll() would return anything"""
+        return True
+    
+    def invalidate(self) -> None:
+        """Make the next poll() return the whole stored graph again"""
+        raise NotImplementedError
+    
+    def exclusive(self):
+        """Context manager held around every write so that concurrent processes
+        sharing the storage cannot interleave read-modify-write cycles"""
+        return nullcontext()
+    
+    def append(self, records: List[dict]) -> None:
+        """Persist mutation records"""
+        raise NotImplementedError
+    
+    def write_snapshot(self, items: List[dict]) -> None:
+        """Replace the stored graph with the given snapshot records"""
+        raise NotImplementedError
+    
+    def compact(self) -> None:
+        """Reclaim space taken by superseded records"""
+    
+    def search(self, query_lower: str) -> Optional[set]:
+        """Names of entities that may contain query_lower, or None if the store cannot tell"""
+        return None
+    
+    def snapshot_index(self) -> Optional[Tuple['BinarySnapshot', int]]:
+        """Binary snapshot the last reset poll() was loaded from, and how many of
+        its leading records it covers; None otherwise. Only returned once."""
+        return None
+    
+    def stats(self) -> dict:
+        """Storage size and I/O counters for server_stats"""
+        return {}
+    
+    def close(self) -> None:
+        """Release files and connections"""
+
+
+# Binary snapshot: optional sidecar of the JSONL file ('<file>.snap') holding
+# the graph of its snapshot part plus the search postings for it, so a cold
+# start maps the file instead of parsing JSON and rebuilding the index.
+# Sections start 8-byte aligned; integers use the writer's byte order.
+#
+#   header        _SNAPSHOT_HEADER (JSONL offset covered, inode and fingerprint, counts)
+#   strings       (n_strings + 1) x u64 offsets into the UTF-8 data that follows
+#   entities      n_entities x _SNAPSHOT_ENTITY (name, entityType, weight, first/count
+#                 observation, last_accessed)
+#   observations  u32 string ids
+#   relations     n_relations x u32 (from_entity, to_entity, relationType) string ids
+#   grams, tokens postings tables: _SNAPSHOT_POSTINGS counts, keys as u32
+#                 (string id, first, count), an open-addressing hash table of
+#                 u32 key numbers + 1 (0 is empty), and the u32 entity ordinals
+_SNAPSHOT_MAGIC = b'MEMSNAP2'
+_SNAPSHOT_FINGERPRINT = 64  # JSONL bytes compared at each end of the covered part
+_SNAPSHOT_HEADER = struct.Struct('<8s8sQQ64s64sQQQQQQ')
+_SNAPSHOT_ENTITY = struct.Struct('=IIqIId')
+_SNAPSHOT_POSTINGS = struct.Struct('=QQQ')
+
+
+def _pad8(n: int) -> int:
+    return -n % 8
+
+
+def _snapshot_hash(key: bytes) -> int:
+    return zlib.crc32(key)
+
+
+def _encode_text(text: str) -> bytes:
+    # surrogatepass: observations may hold lone surrogates that JSON escapes allow
+    return text.encode('utf-8', 'surrogatepass')
+
+
+def write_binary_snapshot(f, items: List[dict], jsonl_offset: int, jsonl_inode: int,
+                          head: bytes, tail: bytes) -> None:
+    """Write snapshot records (entity and relation items) and their postings in binary form"""
+    string_ids: Dict[str, int] = {}
+    
+    def string_id(text: str) -> int:
+        sid = string_ids.get(text)
+        if sid is None:
+            sid = string_ids[text] = len(string_ids)
+        return sid
+    
+    entities = bytearray()
+    observations = array('I')
+    relations = array('I')
+    grams: Dict[str, array] = {}
+    tokens: Dict[str, array] = {}
+    ordinal = 0
+    for item in items:
+        if item['type'] == 'entity':
+            entities += _SNAPSHOT_ENTITY.pack(string_id(item['name']), string_id(item['entityType']),
+                                              item.get('weight', 0), len(observations), len(item['observations']),
+                                              item.get('last_accessed', 0.0))
+            observations.extend(string_id(text) for text in item['observations'])
+            # One posting per entity and key, taken from all its fields at
+            # once. Grams spanning the NUL separator only add candidates,
+            # which scoring rejects, and they cover fields shorter than a gram.
+            text = '\0'.join((item['name'], item['entityType'], *item['observations'])).lower()
+            for key in {text[i:i + 3] for i in range(len(text) - 2)}:
+                grams.setdefault(key, array('I')).append(ordinal)
+            for key in set(TOKEN_PATTERN.findall(text)):
+                tokens.setdefault(key, array('I')).append(ordinal)
+            ordinal += 1
+        elif item['type'] == 'relation':
+            relations.extend((string_id(item['from_entity']), string_id(item['to_entity']),
+                              string_id(item['relationType'])))
+    
+    def postings_table(postings: Dict[str, array]) -> List[bytes]:
+        slots = array('I', [0]) * max(8, 1 << (2 * len(postings)).bit_length())
+        mask = len(slots) - 1
+        keys = array('I')
+        ids = array('I')
+        for number, (key, ordinals) in enumerate(postings.items()):
+            keys.extend((string_id(key), len(ids), len(ordinals)))
+            ids.extend(ordinals)
+            slot = _snapshot_hash(_encode_text(key)) & mask
+            while slots[slot]:
+                slot = (slot + 1) & mask
+            slots[slot] = number + 1
+        return [_SNAPSHOT_POSTINGS.pack(len(postings), len(slots), len(ids)),
+                keys.tobytes(), slots.tobytes(), ids.tobytes()]
+    
+    gram_table = postings_table(grams)
+    token_table = postings_table(tokens)
+    data = [_encode_text(text) for text in string_ids]
+    offsets = array('Q', [0])
+    for encoded in data:
+        offsets.append(offsets[-1] + len(encoded))
+    
+    sections = [
+        [_SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, sys.byteorder.encode('ascii'), jsonl_offset, jsonl_inode,
+                               head, tail, len(data), offsets[-1], len(entities) // _SNAPSHOT_ENTITY.size,
+                               len(observations), len(relations) // 3, 0)],
+        [offsets.tobytes()] + data,
+        [bytes(entities)],
+        [observations.tobytes()],
+        [relations.tobytes()],
+    ] + [[part] for part in gram_table] + [[part] for part in token_table]
+    for parts in sections:
+        size = 0
+        for part in parts:
+            f.write(part)
+            size += len(part)
+        f.write(b'\0' * _pad8(size))
+
+
+class _MappedPostings:
+    """Read-only view of one postings table in a binary snapshot"""
+    
+    def __init__(self, snapshot: 'BinarySnapshot', view: memoryview, offset: int):
+        count, slots, ids = _SNAPSHOT_POSTINGS.unpack_from(view, offset)
+        offset += _SNAPSHOT_POSTINGS.size
+        self._snapshot = snapshot
+        self._keys = view[offset:offset + 12 * count].cast('I')
+        offset += 12 * count + _pad8(12 * count)
+        self._slots = view[offset:offset + 4 * slots].cast('I')
+        offset += 4 * slots + _pad8(4 * slots)
+        self._ids = view[offset:offset + 4 * ids].cast('I')
+        self.end = offset + 4 * ids + _pad8(4 * ids)
+        self._count = count
+    
+    def get(self, key: str):
+        """Sorted entity ordinals posted under key"""
+        encoded = _encode_text(key)
+        mask = len(self._slots) - 1
+        slot = _snapshot_hash(encoded) & mask
+        while True:
+            number = self._slots[slot]
+            if not number:
+                return ()
+            sid, first, count = self._keys[3 * number - 3:3 * number]
+            if self._snapshot.raw_string(sid) == encoded:
+                return self._ids[first:first + count]
+            slot = (slot + 1) & mask
+    
+    def items(self) -> Iterator[Tuple[str, memoryview]]:
+        for number in range(self._count):
+            sid, first, count = self._keys[3 * number:3 * number + 3]
+            yield self._snapshot.string(sid), self._ids[first:first + count]
+
+
+class BinarySnapshot:
+    """A binary snapshot file, memory-mapped so only the pages actually read
+    are loaded. Raises ValueError if the file is not a complete snapshot."""
+    
+    def __init__(self, path: Path):
+        with open(path, 'rb') as f:
+            self.size = size = os.fstat(f.fileno()).st_size
+            if size < _SNAPSHOT_HEADER.size:
+                raise ValueError("truncated snapshot header")
+            if os.name == 'nt':
+                # A mapped file cannot be replaced on Windows; read it instead
+                buffer = f.read()
+            else:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(buffer)
+        (magic, byteorder, self.jsonl_offset, self.jsonl_inode, head, tail, strings, string_bytes,
+         self.entity_count, observations, self.relation_count, _) = _SNAPSHOT_HEADER.unpack_from(view, 0)
+        if magic != _SNAPSHOT_MAGIC or byteorder.rstrip(b'\0') != sys.byteorder.encode('ascii'):
+            raise ValueError("not a binary snapshot written on this platform")
+        fingerprint = min(_SNAPSHOT_FINGERPRINT, self.jsonl_offset)
+        self.head = head[:fingerprint]
+        self.tail = tail[:fingerprint]
+        
+        offset = _SNAPSHOT_HEADER.size + _pad8(_SNAPSHOT_HEADER.size)
+        try:
+            self._offsets = view[offset:offset + 8 * (strings + 1)].cast('Q')
+            offset += 8 * (strings + 1)
+            self._data_start = offset
+            offset += string_bytes + _pad8(8 * (strings + 1) + string_bytes)
+            self._entities = view[offset:offset + _SNAPSHOT_ENTITY.size * self.entity_count]
+            offset += len(self._entities) + _pad8(len(self._entities))
+            self._observations = view[offset:offset + 4 * observations].cast('I')
+            offset += 4 * observations + _pad8(4 * observations)
+            self._relations = view[offset:offset + 12 * self.relation_count].cast('I')
+            offset += 12 * self.relation_count + _pad8(12 * self.relation_count)
+            self.grams = _MappedPostings(self, view, offset)
+            self.tokens = _MappedPostings(self, view, self.grams.end)
+        except (TypeError, struct.error):
+            raise ValueError("truncated snapshot")
+        if self.tokens.end != size:
+            raise ValueError("snapshot size does not match its header")
+        self._view = view
+        self.names: List[str] = []  # Entity name by ordinal, filled by records()
+    
+    def raw_string(self, sid: int) -> memoryview:
+        return self._view[self._data_start + self._offsets[sid]:self._data_start + self._offsets[sid + 1]]
+    
+    def string(self, sid: int) -> str:
+        return str(self.raw_string(sid), 'utf-8', 'surrogatepass')
+    
+    def records(self) -> List[dict]:
+        """Decode the graph as snapshot records, the same ones its JSONL part holds"""
+        strings: Dict[int, str] = {}
+        
+        def string(sid: int) -> str:
+            text = strings.get(sid)
+            if text is None:
+                text = strings[sid] = self.string(sid)
+            return text
+        
+        records = []
+        observations = self._observations
+        for name, entity_type, weight, first, count, last_accessed in _SNAPSHOT_ENTITY.iter_unpack(self._entities):
+            records.append({
+                'name': string(name),
+                'entityType': string(entity_type),
+                'observations': [string(sid) for sid in observations[first:first + count]],
+                'weight': weight,
+                'last_accessed': last_accessed,
+                'type': 'entity'
+            })
+        self.names = [record['name'] for record in records]
+        relations = self._relations
+        for i in range(0, len(relations), 3):
+            records.append({
+                'from_entity': string(relations[i]),
+                'to_entity': string(relations[i + 1]),
+                'relationType': string(relations[i + 2]),
+                'type': 'relation'
+            })
+        return records
+
+
+class JsonlStore(GraphStore):
+    """JSONL file holding a snapshot followed by appended delta records"""
+    
+    def __init__(self, memory_file_path: str, compaction_ratio: float = 1.0,
+                 compaction_min_bytes: int = 64 * 1024, fsync: bool = False,
+                 binary_snapshot: bool = False):
         self.memory_file_path = Path(memory_file_path)
+        # Keep a binary copy of every snapshot next to the file; full loads
+        # map it and only parse the JSONL records appended after it
+        self.binary_snapshot = binary_snapshot
+        self._binary_path = self.memory_file_path.with_name(self.memory_file_path.name + '.snap')
+        self._binary_stale = False  # Loaded without a usable binary snapshot; write one soon
+        self._loaded_snapshot: Optional[Tuple[BinarySnapshot, int]] = None
+        self._binary_job: Optional[tuple] = None
+        self._binary_thread: Optional[threading.Thread] = None
+        # Snapshots are always fsync'ed before they replace the file; appends
+        # only when fsync is set, as a crash can at worst tear the last record.
+        self.fsync = fsync
+        # Mutations are appended to the file as delta records; once the log part
+        # outgrows compaction_ratio x the snapshot part, the file is rewritten.
+        self.compaction_ratio = compaction_ratio
+        self.compaction_min_bytes = compaction_min_bytes
+        self.snapshot_source: Callable[[], List[dict]] = list
+        self._polled = False
+        self._file_state: Optional[Tuple[int, int, int]] = None  # (inode, size, mtime_ns)
+        self._file_offset = 0  # Bytes of the file already handed to the manager
+        self._tail_fingerprint = b''  # Last bytes before _file_offset
+        self._snapshot_bytes = 0  # Bytes of plain entity/relation records
+        self._log_bytes = 0  # Bytes of records appended since the last snapshot
+        # Guards file state against the background compaction thread; the
+        # process lock is always taken first
+        self._io_lock = threading.RLock()
+        self._process_lock = InterProcessLock(
+            self.memory_file_path.with_name(self.memory_file_path.name + '.lock')
+        )
+        self._compacting = False
+        self._compaction_backlog: List[bytes] = []
+        self._snapshot_generation = 0
+        self._compaction_thread: Optional[threading.Thread] = None
+        # I/O counters for stats()
+        self._bytes_read = 0
+        self._bytes_written = 0
+        self._full_loads = 0
+        self._binary_loads = 0
+        self._snapshots_written = 0
     
-    def load_graph(self) -> KnowledgeGraph:
-        """Load knowledge graph from JSONL file"""
-        entities = []
-        relations = []
+    def exclusive(self) -> InterProcessLock:
+        return self._process_lock
+    
+    def stats(self) -> dict:
+        return {
+            'backend': 'jsonl',
+            'file_bytes': self._file_state[1] if self._file_state is not None else 0,
+            'snapshot_bytes': self._snapshot_bytes,
+            'log_bytes': self._log_bytes,
+            'bytes_read': self._bytes_read,
+            'bytes_written': self._bytes_written,
+            'full_loads': self._full_loads,
+            'binary_snapshot_loads': self._binary_loads,
+            'snapshots_written': self._snapshots_written
+        }
+    
+    def _stat_state(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = self.memory_file_path.stat()
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    
+    def has_changes(self) -> bool:
+        return not self._polled or self._stat_state() != self._file_state
+    
+    def invalidate(self) -> None:
+        with self._io_lock:
+            self._reset()
+            self._polled = False
+    
+    def poll(self) -> Optional[Tuple[bool, List[dict]]]:
+        with self._process_lock, self._io_lock:
+            try:
+                stat = self.memory_file_path.stat()
+            except FileNotFoundError:
+                if not self._polled or self._file_state is not None:
+                    self._reset()
+                    self._polled = True
+                    return True, []
+                return None
+            
+            state = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+            if self._polled and state == self._file_state:
+                return None
+            
+            # Another writer appended to the file we already know: read only the tail
+            if (self._polled and self._file_state is not None
+                    and stat.st_ino == self._file_state[0]
+                    and stat.st_size > self._file_offset
+                    and self._tail_unchanged()):
+                result = self._read_from(self._file_offset)
+            else:
+                self._reset()
+                result = self._read_binary_snapshot() or self._read_from(0)
+            self._polled = True
+            return result
+    
+    def snapshot_index(self) -> Optional[Tuple['BinarySnapshot', int]]:
+        loaded, self._loaded_snapshot = self._loaded_snapshot, None
+        return loaded
+    
+    def _reset(self) -> None:
+        self._file_state = None
+        self._file_offset = 0
+        self._tail_fingerprint = b''
+        self._snapshot_bytes = 0
+        self._log_bytes = 0
+        # The file changed underneath us; an in-flight compaction is now stale
+        self._snapshot_generation += 1
+        self._compacting = False
+        self._compaction_backlog = []
+        self._loaded_snapshot = None
+    
+    def _read_binary_snapshot(self) -> Optional[Tuple[bool, List[dict]]]:
+        """Full load from the binary snapshot plus the JSONL records after it, if it is current"""
+        if not self.binary_snapshot:
+            return None
+        try:
+            snapshot = BinarySnapshot(self._binary_path)
+            with open(self.memory_file_path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                current = (snapshot.jsonl_inode == stat.st_ino & 0xFFFFFFFFFFFFFFFF
+                           and stat.st_size >= snapshot.jsonl_offset
+                           and f.read(len(snapshot.head)) == snapshot.head)
+                if current:
+                    f.seek(snapshot.jsonl_offset - len(snapshot.tail))
+                    current = f.read(len(snapshot.tail)) == snapshot.tail
+        except (OSError, ValueError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logger.debug("Ignoring binary snapshot %s: %s", self._binary_path, e)
+            current = False
+        if not current:
+            # Written by the next compaction
+            self._binary_stale = True
+            return None
+        
+        records = snapshot.records()
+        self._binary_loads += 1
+        self._bytes_read += snapshot.size
+        self._snapshot_bytes = snapshot.jsonl_offset
+        self._tail_fingerprint = snapshot.tail
+        reset, appended = self._read_from(snapshot.jsonl_offset)
+        if reset:
+            return reset, appended  # The appended part was unreadable and the whole file was read
+        self._loaded_snapshot = (snapshot, len(records))
+        return True, records + appended
+    
+    def _tail_unchanged(self) -> bool:
+        """Check that the bytes we last read are still in place (i.e. file was only appended to)"""
+        if not self._tail_fingerprint:
+            return True
+        start = self._file_offset - len(self._tail_fingerprint)
+        with open(self.memory_file_path, 'rb') as f:
+            f.seek(start)
+            return f.read(len(self._tail_fingerprint)) == self._tail_fingerprint
+    
+    def _read_from(self, offset: int) -> Tuple[bool, List[dict]]:
+        """Decode complete JSONL records from offset to the end of the file"""
+        try:
+            with open(self.memory_file_path, 'rb') as f:
+                f.seek(offset)
+                data = f.read()
+                stat = os.fstat(f.fileno())
+        except FileNotFoundError:
+            self._reset()
+            return True, []
+        self._bytes_read += len(data)
+        if not offset:
+            self._full_loads += 1
+        
+        # A trailing line without newline may still be in the middle of being
+        # written by someone else; only a full load deals with it.
+        end = data.rfind(b'\n') + 1
+        records = []
+        good_lines = []
+        bad_lines = []
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            item = self._decode_line(line, snapshot=offset == 0)
+            if item is None:
+                if offset:
+                    # The appended tail is unreadable; fall back to a full reload
+                    self._reset()
+                    return self._read_from(0)
+                bad_lines.append(line)
+            else:
+                records.append(item)
+                good_lines.append(line)
+        
+        torn_line = b''
+        if offset == 0 and end < len(data) and data[end:].strip():
+            item = self._decode_line(data[end:], snapshot=True)
+            if item is None:
+                torn_line = data[end:]
+            else:
+                # A complete record that just lacks the final newline
+                records.append(item)
+                good_lines.append(data[end:])
+                end = len(data)
         
-        if not self.memory_file_path.exists():
-            return KnowledgeGraph(entities=[], relations=[])
+        if offset and self._compacting:
+            # Another process appended while our compaction runs; keep its records
+            self._compaction_backlog.append(data[:end])
+        self._file_offset = offset + end
+        self._file_state = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        self._tail_fingerprint = data[max(0, end - 64):end] if end else self._tail_fingerprint
         
+        if bad_lines or torn_line:
+            self._recover(good_lines, bad_lines, torn_line)
+        return offset == 0, records
+    
+    def _decode_line(self, line: bytes, snapshot: bool) -> Optional[dict]:
+        """Decode one raw JSONL line; return None if it is unreadable"""
         try:
-            with open(self.memory_file_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    
-                    item = json.loads(line)
-                    if item.get('type') == 'entity':
-                        entity = Entity(
-                            name=item['name'],
-                            entityType=item['entityType'],
-                            observations=item['observations'],
-                            weight=item.get('weight', 0)  # Default to 0 for backward compatibility
-                        )
-                        entities.append(entity)
-                    elif item.get('type') == 'relation':
-                        relation = Relation(
-                            from_entity=item['from_entity'],
-                            to_entity=item['to_entity'],
-                            relationType=item['relationType']
-                        )
-                        relations.append(relation)
-        except (FileNotFoundError, json.JSONDecodeError) as e:
-            print(f"Warning: Could not load memory file: {e}")
-            return KnowledgeGraph(entities=[], relations=[])
-        
-        return KnowledgeGraph(entities=entities, relations=relations)
+            item = json_loads(line)
+        except ValueError:
+            return None
+        if not _valid_record(item):
+            return None
+        
+        if snapshot and item.get('type') in ('entity', 'relation'):
+            self._snapshot_bytes += len(line) + 1
+        else:
+            self._log_bytes += len(line) + 1
+        return item
     
-    def save_graph(self, graph: KnowledgeGraph) -> None:
-        """Save knowledge graph to JSONL file"""
-        # Create directory if it doesn't exist
+    def _recover(self, good_lines: List[bytes], bad_lines: List[bytes], torn_line: bytes) -> None:
+        """Move unreadable lines to a quarantine file and rewrite the file without them"""
+        quarantine_path = self.memory_file_path.with_name(self.memory_file_path.name + '.corrupt')
+        try:
+            with open(quarantine_path, 'ab') as f:
+                for line in bad_lines + ([torn_line] if torn_line else []):
+                    f.write(line.rstrip(b'\r\n') + b'\n')
+            logger.warning(
+                "Quarantined %d unreadable line(s)%s from %s to %s",
+                len(bad_lines) + bool(torn_line),
+                " including a torn trailing line" if torn_line else "",
+                self.memory_file_path, quarantine_path
+            )
+            self._snapshot_generation += 1
+            self._compaction_backlog = []
+            self._replace_file([line.rstrip(b'\r\n') + b'\n' for line in good_lines],
+                               self._snapshot_generation)
+        except OSError as e:
+            logger.warning("Could not recover memory file %s: %s", self.memory_file_path, e)
+    
+    def append(self, records: List[dict]) -> None:
+        """Persist delta records by appending them to the JSONL file"""
+        if not records:
+            return
+        data = b''.join(json_dumpb(record) + b'\n' for record in records)
+        
+        with self._process_lock, self._io_lock:
+            if self._file_state is None:
+                # Nothing on disk yet: start the file with a full snapshot
+                self.write_snapshot(self.snapshot_source())
+                return
+            if self._tail_fingerprint and not self._tail_fingerprint.endswith(b'\n'):
+                data = b'\n' + data  # Never glue a record onto an unterminated last line
+            with open(self.memory_file_path, 'ab') as f:
+                f.write(data)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+                stat = os.fstat(f.fileno())
+            self._file_offset = stat.st_size
+            self._file_state = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+            self._tail_fingerprint = (self._tail_fingerprint + data)[-64:]
+            self._log_bytes += len(data)
+            self._bytes_written += len(data)
+            if self._compacting:
+                self._compaction_backlog.append(data)
+            elif (self._binary_stale or
+                  self._log_bytes > self.compaction_ratio * max(self._snapshot_bytes, self.compaction_min_bytes)):
+                self._start_compaction()
+    
+    def write_snapshot(self, items: List[dict]) -> None:
+        """Rewrite the JSONL file as a plain snapshot"""
+        with self._process_lock, self._io_lock:
+            # Supersedes any background compaction still in flight
+            self._snapshot_generation += 1
+            self._compaction_backlog = []
+            self._replace_file(self._encode_items(items), self._snapshot_generation, items)
+    
+    @staticmethod
+    def _encode_items(items: List[dict]) -> Iterator[bytes]:
+        for item in items:
+            yield json_dumpb(item) + b'\n'
+    
+    def _replace_file(self, lines: Iterable[bytes], generation: int,
+                      items: Optional[List[dict]] = None) -> None:
+        """Write snapshot lines plus any backlog appended meanwhile, and swap the file in.
+        With the items the lines encode, the binary snapshot is replaced as well."""
         self.memory_file_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(prefix=self.memory_file_path.name + '.',
+                                        suffix='.tmp', dir=self.memory_file_path.parent)
+        try:
+            snapshot_bytes = 0
+            last_line = b''
+            head = tail = b''
+            with os.fdopen(fd, 'wb') as f:
+                for line in lines:
+                    f.write(line)
+                    snapshot_bytes += len(line)
+                    last_line = line
+                    if len(head) < _SNAPSHOT_FINGERPRINT:
+                        head = (head + line)[:_SNAPSHOT_FINGERPRINT]
+                    tail = line[-_SNAPSHOT_FINGERPRINT:] if len(line) >= _SNAPSHOT_FINGERPRINT \
+                        else (tail + line)[-_SNAPSHOT_FINGERPRINT:]
+                
+                with self._process_lock, self._io_lock:
+                    if generation != self._snapshot_generation:
+                        return  # A newer snapshot was written meanwhile
+                    if self._file_state is not None and self._stat_state() != self._file_state:
+                        return  # Another process wrote to the file; its records are not in ours
+                    # Records appended while we were writing are carried over
+                    for data in self._compaction_backlog:
+                        f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                    os.replace(tmp_name, self.memory_file_path)
+                    _fsync_directory(self.memory_file_path.parent)
+                    stat = os.fstat(f.fileno())
+                    
+                    self._tail_fingerprint = (last_line + b''.join(self._compaction_backlog))[-64:]
+                    self._file_offset = stat.st_size
+                    self._file_state = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+                    self._snapshot_bytes = snapshot_bytes
+                    self._log_bytes = stat.st_size - snapshot_bytes
+                    self._bytes_written += stat.st_size
+                    self._snapshots_written += 1
+                    self._compaction_backlog = []
+                    self._compacting = False
+                    if self.binary_snapshot and items is not None and snapshot_bytes:
+                        self._start_binary_snapshot((items, snapshot_bytes, stat.st_ino, head, tail))
+        finally:
+            if os.path.exists(tmp_name):
+                os.remove(tmp_name)
+    
+    def _start_binary_snapshot(self, job: tuple) -> None:
+        """Queue the binary snapshot of a freshly written file; only the latest one is written"""
+        with self._io_lock:
+            self._binary_job = job
+            if self._binary_thread is None:
+                self._binary_thread = threading.Thread(target=self._binary_snapshot_worker,
+                                                       name='memory-binary-snapshot', daemon=True)
+                self._binary_thread.start()
+    
+    def _binary_snapshot_worker(self) -> None:
+        while True:
+            with self._io_lock:
+                job, self._binary_job = self._binary_job, None
+                if job is None:
+                    self._binary_thread = None
+                    return
+            self._write_binary_snapshot(*job)
+    
+    def _write_binary_snapshot(self, items: List[dict], jsonl_offset: int, jsonl_inode: int,
+                               head: bytes, tail: bytes) -> None:
+        fd, tmp_name = tempfile.mkstemp(prefix=self._binary_path.name + '.',
+                                        suffix='.tmp', dir=self._binary_path.parent)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write_binary_snapshot(f, items, jsonl_offset, jsonl_inode & 0xFFFFFFFFFFFFFFFF, head, tail)
+                f.flush()
+                os.fsync(f.fileno())
+                self._bytes_written += f.tell()
+            with self._process_lock, self._io_lock:
+                # Pointless if the file it describes has been replaced meanwhile
+                if self._file_state is not None and self._file_state[0] == jsonl_inode:
+                    os.replace(tmp_name, self._binary_path)
+        except (OSError, struct.error, OverflowError) as e:
+            # The JSONL file is complete without it; loads just take the slow path
+            logger.warning("Could not write binary snapshot %s: %s", self._binary_path, e)
+        finally:
+            if os.path.exists(tmp_name):
+                os.remove(tmp_name)
+    
+    def _start_compaction(self) -> None:
+        """Rewrite the file as a snapshot on a background thread"""
+        items = self.snapshot_source()
+        self._snapshot_generation += 1
+        generation = self._snapshot_generation
+        self._compacting = True
+        self._compaction_backlog = []
+        self._binary_stale = False
         
-        with open(self.memory_file_path, 'w', encoding='utf-8') as f:
-            # Write entities
-            for entity in graph.entities:
-                entity_dict = asdict(entity)
-                entity_dict['type'] = 'entity'
-                f.write(json.dumps(entity_dict) + '\n')
-            
-            # Write relations
-            for relation in graph.relations:
-                relation_dict = asdict(relation)
-                relation_dict['type'] = 'relation'
-                f.write(json.dumps(relation_dict) + '\n')
+        def run():
+            try:
+                self._replace_file(self._encode_items(items), generation, items)
+            except OSError as e:
+                logger.warning("Could not compact memory file %s: %s", self.memory_file_path, e)
+            finally:
+                with self._io_lock:
+                    if generation == self._snapshot_generation:
+                        self._compacting = False
+        
+        self._compaction_thread = threading.Thread(target=run, name='memory-compaction', daemon=True)
+        self._compaction_thread.start()
     
-    # Entity Operations
-    def create_entities(self, entities: List[Entity]) -> None:
-        """Create new entities, ignore duplicates"""
-        graph = self.load_graph()
-        existing_names = {entity.name for entity in graph.entities}
+    def compact(self) -> None:
+        """Rewrite the JSONL file as a snapshot now, dropping replayed delta records"""
+        self.write_snapshot(self.snapshot_source())
+    
+    def close(self) -> None:
+        if self._compaction_thread is not None:
+            self._compaction_thread.join()
+        binary_thread = self._binary_thread
+        if binary_thread is not None:
+            binary_thread.join()
+
+
+SQLITE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entities (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    entityType TEXT NOT NULL,
+    weight INTEGER NOT NULL DEFAULT 0,
+    last_accessed REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS observations (
+    id INTEGER PRIMARY KEY,
+    entity_id INTEGER NOT NULL REFERENCES entities(id) ON DELETE CASCADE,
+    text TEXT NOT NULL,
+    UNIQUE (entity_id, text)
+);
+CREATE TABLE IF NOT EXISTS relations (
+    id INTEGER PRIMARY KEY,
+    from_entity TEXT NOT NULL,
+    to_entity TEXT NOT NULL,
+    relationType TEXT NOT NULL,
+    UNIQUE (from_entity, to_entity, relationType)
+);
+CREATE INDEX IF NOT EXISTS relations_to_entity ON relations (to_entity);
+CREATE INDEX IF NOT EXISTS relations_type ON relations (relationType);
+
+-- Trigram full-text indexes give substring matching for search_nodes
+CREATE VIRTUAL TABLE IF NOT EXISTS entities_fts USING fts5(
+    name, entityType, content='entities', content_rowid='id', tokenize='trigram'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS observations_fts USING fts5(
+    text, content='observations', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS entities_ai AFTER INSERT ON entities BEGIN
+    INSERT INTO entities_fts (rowid, name, entityType) VALUES (new.id, new.name, new.entityType);
+END;
+CREATE TRIGGER IF NOT EXISTS entities_ad AFTER DELETE ON entities BEGIN
+    INSERT INTO entities_fts (entities_fts, rowid, name, entityType)
+    VALUES ('delete', old.id, old.name, old.entityType);
+END;
+CREATE TRIGGER IF NOT EXISTS entities_au AFTER UPDATE OF name, entityType ON entities BEGIN
+    INSERT INTO entities_fts (entities_fts, rowid, name, entityType)
+    VALUES ('delete', old.id, old.name, old.entityType);
+    INSERT INTO entities_fts (rowid, name, entityType) VALUES (new.id, new.name, new.entityType);
+END;
+CREATE TRIGGER IF NOT EXISTS observations_ai AFTER INSERT ON observations BEGIN
+    INSERT INTO observations_fts (rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS observations_ad AFTER DELETE ON observations BEGIN
+    INSERT INTO observations_fts (observations_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+'''
+
+
+class SqliteStore(GraphStore):
+    """SQLite database (WAL mode) with one row per entity, observation and relation"""
+    
+    def __init__(self, db_path: str):
+        self.db_path = Path(db_path)
+        self.snapshot_source: Callable[[], List[dict]] = list
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._data_version: Optional[int] = None
+        # Counters for stats(); rows are not sized, so these count records
+        self._records_read = 0
+        self._records_written = 0
+        self._full_loads = 0
+    
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            # Autocommit mode; transactions are opened explicitly
+            conn = sqlite3.connect(str(self.db_path), isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            conn.executescript(SQLITE_SCHEMA)
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(entities)')}
+            if 'last_accessed' not in columns:
+                # Databases created before access times were kept
+                conn.execute('ALTER TABLE entities ADD COLUMN last_accessed REAL NOT NULL DEFAULT 0')
+            self._conn = conn
+        return self._conn
+    
+    def has_changes(self) -> bool:
+        with self._lock:
+            return self._conn is None or \
+                self._connection().execute('PRAGMA data_version').fetchone()[0] != self._data_version
+    
+    def invalidate(self) -> None:
+        with self._lock:
+            self._data_version = None
+    
+    def poll(self) -> Optional[Tuple[bool, List[dict]]]:
+        with self._lock:
+            conn = self._connection()
+            # data_version only moves when another connection commits
+            version = conn.execute('PRAGMA data_version').fetchone()[0]
+            if version == self._data_version:
+                return None
+            self._data_version = version
+            records = self._load_records(conn)
+            self._records_read += len(records)
+            self._full_loads += 1
+            return True, records
+    
+    @staticmethod
+    def _load_records(conn: sqlite3.Connection) -> List[dict]:
+        observations: Dict[int, List[str]] = {}
+        for entity_id, text in conn.execute('SELECT entity_id, text FROM observations ORDER BY id'):
+            observations.setdefault(entity_id, []).append(text)
         
-        for entity in entities:
-            if entity.name not in existing_names:
-                graph.entities.append(entity)
-                existing_names.add(entity.name)
+        records = []
+        for entity_id, name, entity_type, weight, last_accessed in conn.execute(
+                'SELECT id, name, entityType, weight, last_accessed FROM entities ORDER BY id'):
+            records.append({
+                'type': 'entity',
+                'name': name,
+                'entityType': entity_type,
+                'observations': observations.get(entity_id, []),
+                'weight': weight,
+                'last_accessed': last_accessed
+            })
+        for from_entity, to_entity, relation_type in conn.execute(
+                'SELECT from_entity, to_entity, relationType FROM relations ORDER BY id'):
+            records.append({
+                'type': 'relation',
+                'from_entity': from_entity,
+                'to_entity': to_entity,
+                'relationType': relation_type
+            })
+        return records
+    
+    def append(self, records: List[dict]) -> None:
+        """Apply mutation records as row-level changes in a single transaction"""
+        if not records:
+            return
+        with self._lock:
+            conn = self._connection()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                for record in records:
+                    self._execute_record(conn, record)
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            self._records_written += len(records)
+    
+    @staticmethod
+    def _execute_record(conn: sqlite3.Connection, record: dict) -> None:
+        record_type = record.get('type')
+        if record_type == 'entity':
+            conn.execute('DELETE FROM entities WHERE name = ?', (record['name'],))
+            cursor = conn.execute(
+                'INSERT INTO entities (name, entityType, weight, last_accessed) VALUES (?, ?, ?, ?)',
+                (record['name'], record['entityType'], record.get('weight', 0), record.get('last_accessed', 0.0))
+            )
+            conn.executemany(
+                'INSERT OR IGNORE INTO observations (entity_id, text) VALUES (?, ?)',
+                [(cursor.lastrowid, text) for text in record['observations']]
+            )
+        elif record_type == 'relation':
+            conn.execute(
+                'INSERT OR IGNORE INTO relations (from_entity, to_entity, relationType) VALUES (?, ?, ?)',
+                (record['from_entity'], record['to_entity'], record['relationType'])
+            )
+        elif record_type == 'delete_entity':
+            conn.execute('DELETE FROM entities WHERE name = ?', (record['name'],))
+            conn.execute('DELETE FROM relations WHERE from_entity = ? OR to_entity = ?',
+                         (record['name'], record['name']))
+        elif record_type == 'add_observation':
+            conn.execute(
+                'INSERT OR IGNORE INTO observations (entity_id, text) '
+                'SELECT id, ? FROM entities WHERE name = ?',
+                (record['observation'], record['entityName'])
+            )
+        elif record_type == 'delete_observation':
+            conn.execute(
+                'DELETE FROM observations WHERE text = ? '
+                'AND entity_id = (SELECT id FROM entities WHERE name = ?)',
+                (record['observation'], record['entityName'])
+            )
+        elif record_type == 'weight':
+            conn.execute('UPDATE entities SET weight = weight + ?, last_accessed = MAX(last_accessed, ?) '
+                         'WHERE name = ?', (record['delta'], record.get('at', 0.0), record['name']))
+        elif record_type == 'delete_relation':
+            conn.execute(
+                'DELETE FROM relations WHERE from_entity = ? AND to_entity = ? AND relationType = ?',
+                (record['from_entity'], record['to_entity'], record['relationType'])
+            )
+        elif record_type == 'batch':
+            for nested in record['records']:
+                SqliteStore._execute_record(conn, nested)
+    
+    def write_snapshot(self, items: List[dict]) -> None:
+        with self._lock:
+            conn = self._connection()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute('DELETE FROM relations')
+                conn.execute('DELETE FROM observations')
+                conn.execute('DELETE FROM entities')
+                for item in items:
+                    self._execute_record(conn, item)
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            self._records_written += len(items)
+    
+    def stats(self) -> dict:
+        file_bytes = 0
+        for path in (self.db_path, self.db_path.with_name(self.db_path.name + '-wal')):
+            try:
+                file_bytes += path.stat().st_size
+            except OSError:
+                pass
+        return {
+            'backend': 'sqlite',
+            'file_bytes': file_bytes,
+            'records_read': self._records_read,
+            'records_written': self._records_written,
+            'full_loads': self._full_loads
+        }
+    
+    def compact(self) -> None:
+        with self._lock:
+            conn = self._connection()
+            conn.execute("INSERT INTO entities_fts (entities_fts) VALUES ('optimize')")
+            conn.execute("INSERT INTO observations_fts (observations_fts) VALUES ('optimize')")
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    
+    def search(self, query_lower: str) -> Optional[set]:
+        # The trigram tokenizer cannot match fewer than three characters
+        if len(query_lower) < 3:
+            return None
+        phrase = '"' + query_lower.replace('"', '""') + '"'
+        with self._lock:
+            conn = self._connection()
+            rows = conn.execute(
+                'SELECT name FROM entities WHERE id IN '
+                '(SELECT rowid FROM entities_fts WHERE entities_fts MATCH ?) '
+                'UNION SELECT e.name FROM observations o JOIN entities e ON e.id = o.entity_id '
+                'WHERE o.id IN (SELECT rowid FROM observations_fts WHERE observations_fts MATCH ?)',
+                (phrase, phrase)
+            )
+            return {name for (name,) in rows}
+    
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+                self._data_version = None
+
+
+def create_store(backend: str, path: str, **options) -> GraphStore:
+    """Build the storage backend named by MEMORY_BACKEND"""
+    if backend == 'jsonl':
+        return JsonlStore(path, **options)
+    if backend == 'sqlite':
+        return SqliteStore(path)
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+class ReadWriteLock:
+    """Lets any number of readers or a single writer in at a time.
+    
+    Waiting writers block new readers so they cannot be starved. Both sides
+    are reentrant for the thread holding them, and the writer may also take
+    the read side; upgrading from read to write is not allowed.
+    """
+    
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer: Optional[int] = None
+        self._write_depth = 0
+        self._waiting_writers = 0
+        self._local = threading.local()
+    
+    @contextmanager
+    def read(self):
+        depth = getattr(self._local, 'read_depth', 0)
+        if depth or self._writer == threading.get_ident():
+            self._local.read_depth = depth + 1
+            try:
+                yield
+            finally:
+                self._local.read_depth = depth
+            return
         
-        self.save_graph(graph)
+        with self._cond:
+            while self._writer is not None or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        self._local.read_depth = 1
+        try:
+            yield
+        finally:
+            self._local.read_depth = 0
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+    
+    def reading(self) -> bool:
+        """Whether the current thread holds the read side"""
+        return bool(getattr(self._local, 'read_depth', 0))
     
-    def delete_entities(self, entity_names: List[str]) -> None:
-        """Remove entities and cascade delete relations"""
-        graph = self.load_graph()
+    @contextmanager
+    def write(self):
+        me = threading.get_ident()
+        if self._writer == me:
+            self._write_depth += 1
+            try:
+                yield
+            finally:
+                self._write_depth -= 1
+            return
+        if self.reading():
+            raise RuntimeError("Cannot upgrade a read lock to a write lock")
         
-        # Remove entities
-        graph.entities = [e for e in graph.entities if e.name not in entity_names]
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer is not None or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = me
+            self._write_depth = 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._write_depth -= 1
+                if not self._write_depth:
+                    self._writer = None
+                    self._cond.notify_all()
+
+
+def reader(method):
+    """Run a KnowledgeGraphManager method under the shared lock, after syncing with storage"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self._store.has_changes():
+            with self._rwlock.write(), self._store.exclusive():
+                self._refresh()
+        with self._rwlock.read():
+            result = method(self, *args, **kwargs)
+        # Access counts are persisted as a write, once the read side is released
+        if self._flush_due and not self._rwlock.reading() and self._batch_records is None:
+            self.flush_weights()
+        return result
+    return wrapper
+
+
+def writer(method):
+    """Run a KnowledgeGraphManager method under the exclusive lock (in-process and
+    across processes sharing the storage), after syncing with storage"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._rwlock.write(), self._store.exclusive():
+            self._refresh()
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+# Below this many observations a linear duplicate check beats keeping a set
+OBSERVATION_SET_MIN = 16
+# Orders entities are evicted / pruned in: fewest accesses, least recently
+# accessed, or lowest weight decayed by the time since the last access
+RANK_ORDERS = ('lfu', 'lru', 'decayed')
+# Rough JSON overhead of a snapshot record and of one observation in it, on top
+# of the strings themselves; used to estimate the graph's size for max_file_bytes
+ENTITY_RECORD_BYTES = 110
+RELATION_RECORD_BYTES = 75
+OBSERVATION_BYTES = 3
+
+
+# Results with more entities than this are not worth holding in the result cache
+RESULT_CACHE_MAX_ENTITIES = 1000
+
+
+class ResultCache:
+    """LRU cache of search_nodes / open_nodes results.
+    
+    Entries are dropped precisely when a mutation touches what they depend
+    on: any entry holding the changed entity, and a search whose query the
+    changed text contains (only those entities can enter, leave or move in
+    its results) or, for a query of several words, whose words it shares,
+    since those raise whole-word scores. The changed text is an added or
+    removed observation, or a created or deleted entity's whole text, so a
+    write costs what it changes, not the size of the entity. Weights are not
+    part of the cached content, so access tracking does not invalidate
+    anything. Cached queries are posted under their first trigram (or first
+    character, if shorter), so a change only tests the queries whose key
+    occurs in its text rather than every cached one.
+    """
+    
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[tuple, list]' = OrderedDict()  # Least recently used first
+        self._by_query: Dict[str, set] = {}  # Query -> keys of its cached searches
+        self._by_gram: Dict[str, set] = {}  # _query_gram() -> queries in _by_query
+        self._by_word: Dict[str, set] = {}  # Word -> queries of several words holding it
+        self._by_name: Dict[str, set] = {}  # Entity name -> keys of cached results holding it
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+    
+    def get(self, key: tuple) -> Optional[list]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+    
+    def put(self, key: tuple, entry: list, query: Optional[str] = None, names: Iterable[str] = ()) -> None:
+        """Cache entry under key, dropped when an entity containing query or named in names changes"""
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = entry
+            if query is not None:
+                if query not in self._by_query:
+                    self._by_query[query] = set()
+                    self._by_gram.setdefault(self._query_gram(query), set()).add(query)
+                    for word in self._query_words(query):
+                        self._by_word.setdefault(word, set()).add(query)
+                self._by_query[query].add(key)
+            for name in names:
+                self._by_name.setdefault(name, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+    
+    def _drop(self, key: tuple) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        # Keys are ('search', query, ...) holding [(entity, score)] or ('open', names)
+        if key[0] == 'search':
+            query = key[1]
+            keys = self._by_query[query]
+            keys.discard(key)
+            if not keys:
+                del self._by_query[query]
+                self._unpost(self._by_gram, self._query_gram(query), query)
+                for word in self._query_words(query):
+                    self._unpost(self._by_word, word, query)
+            names = [entity.name for entity, _ in entry[0]]
+        else:
+            names = key[1]
+        for name in names:
+            self._unpost(self._by_name, name, key)
+    
+    @staticmethod
+    def _unpost(postings: Dict[str, set], key: str, item) -> None:
+        items = postings.get(key)
+        if items is not None:
+            items.discard(item)
+            if not items:
+                del postings[key]
+    
+    def invalidate(self, name: str, text: str) -> None:
+        """Drop entries that a change to entity name may affect; text is what it gained or lost"""
+        if not self._entries:
+            return
+        with self._lock:
+            keys = set(self._by_name.get(name, ()))
+            if self._by_query:
+                text = text.lower()
+                queries = set(self._queries_in(text))
+                if self._by_word:
+                    for word in set(TOKEN_PATTERN.findall(text)):
+                        queries.update(self._by_word.get(word, ()))
+                for query in queries:
+                    keys.update(self._by_query[query])
+            for key in keys:
+                self._drop(key)
+            self.invalidations += len(keys)
+    
+    @staticmethod
+    def _query_gram(query: str) -> str:
+        return query[:3] if len(query) >= 3 else query[:1]
+    
+    @staticmethod
+    def _query_words(query: str) -> List[str]:
+        """Words of a query whose whole-word bonus a change can give or take without containing it"""
+        words = TOKEN_PATTERN.findall(query)
+        return [] if words == [query] else words
+    
+    def _queries_in(self, text: str) -> List[str]:
+        """Cached queries that occur in text"""
+        if len(self._by_gram) < len(text):
+            # Fewer keys than text positions: a substring test per key is cheaper than the text's trigrams
+            candidates = [query for gram, queries in self._by_gram.items() if gram in text for query in queries]
+        else:
+            grams = {text[i:i + 3] for i in range(len(text) - 2)}
+            grams.update(text)  # Keys of queries shorter than a trigram
+            grams.add('')  # The empty query
+            candidates = [query for gram in grams for query in self._by_gram.get(gram, ())]
+        return [query for query in candidates if query in text]
+    
+    def clear(self) -> None:
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._by_query.clear()
+            self._by_gram.clear()
+            self._by_word.clear()
+            self._by_name.clear()
+    
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'evictions': self.evictions
+            }
+
+
+# Hops traverse follows when no max_depth is given, through the API and the tool alike
+TRAVERSE_DEPTH = 1
+
+
+def check_paging(offset, limit) -> None:
+    """Reject read_graph_page arguments that cannot describe a page"""
+    if isinstance(offset, bool) or not isinstance(offset, int) or offset < 0:
+        raise ValueError(f"offset must be a non-negative integer, not {offset!r}")
+    if limit is not None and (isinstance(limit, bool) or not isinstance(limit, int) or limit < 1):
+        raise ValueError(f"limit must be a positive integer, not {limit!r}")
+
+
+def check_prune(threshold, count) -> None:
+    """Reject prune_entities arguments that are not a weight and an entity count"""
+    if threshold is not None and (isinstance(threshold, bool) or not isinstance(threshold, (int, float))):
+        raise ValueError(f"threshold must be a number, not {threshold!r}")
+    if count is not None and (isinstance(count, bool) or not isinstance(count, int) or count < 0):
+        raise ValueError(f"count must be a non-negative integer, not {count!r}")
+
+
+class KnowledgeGraphManager:
+    def __init__(self, memory_file_path: str, compaction_ratio: float = 1.0,
+                 compaction_min_bytes: int = 64 * 1024, fsync: bool = False,
+                 store: Optional[GraphStore] = None, track_access: bool = True,
+                 weight_flush_interval: float = 5.0, weight_flush_threshold: int = 100,
+                 weight_half_life: Optional[float] = None, max_entities: int = 0,
+                 max_observations: int = 0, max_file_bytes: int = 0, eviction_policy: str = 'lfu',
+                 result_cache_size: int = 256, change_log_size: int = 10000):
+        self.memory_file_path = Path(memory_file_path)
+        # search_nodes/open_nodes bump weights in memory at once but only
+        # persist them in coalesced batches: after weight_flush_interval
+        # seconds, after weight_flush_threshold increments, or on close().
+        # With track_access off, reads leave weights alone entirely.
+        self.track_access = track_access
+        self.weight_flush_interval = weight_flush_interval
+        self.weight_flush_threshold = weight_flush_threshold
+        self._pending_weights: Dict[str, Tuple[int, float]] = {}  # name -> (count, last access)
+        self._pending_count = 0
+        self._flush_due = False
+        self._flush_timer: Optional[threading.Timer] = None
+        # With a half-life (seconds), pruning and search ties rank entities by
+        # weight * 2 ** (-age / half_life), age being the time since last access.
+        # Entities stored without an access time count as used when we started.
+        self.weight_half_life = weight_half_life or None
+        self._epoch = time.time()
+        # Heaps of (rank key, name) per RANK_ORDERS entry, built when pruning or
+        # eviction first needs them and then kept up to date with pushes;
+        # superseded entries are skipped when popped
+        self._rank_heaps: Dict[str, List[Tuple[tuple, str]]] = {}
+        # Capacity (0 = unlimited). Writes that grow the graph past max_entities
+        # or max_file_bytes (estimated snapshot size) evict the lowest ranked
+        # entities in eviction_policy order, and an entity past max_observations
+        # drops its oldest observations.
+        if eviction_policy not in RANK_ORDERS:
+            raise ValueError(f"Unknown eviction policy: {eviction_policy}")
+        if eviction_policy == 'decayed' and self.weight_half_life is None:
+            raise ValueError("The decayed eviction policy needs a weight half-life")
+        self.max_entities = max_entities
+        self.max_observations = max_observations
+        self.max_file_bytes = max_file_bytes
+        self.eviction_policy = eviction_policy
+        self._graph_bytes = 0
+        # Readers share the graph; writers (and reloads) get it exclusively.
+        # Access weight bumps happen under the read side, so they have their own lock.
+        self._rwlock = ReadWriteLock()
+        self._access_lock = threading.RLock()
+        # Persistence only; defaults to the JSONL file at memory_file_path
+        if store is None:
+            store = JsonlStore(memory_file_path, compaction_ratio=compaction_ratio,
+                               compaction_min_bytes=compaction_min_bytes, fsync=fsync)
+        self._store = store
+        self._store.attach(self._snapshot_items)
+        # Resident graph, loaded once and then served from memory. The store is
+        # only persistence; external edits are picked up by _refresh().
+        self._entities: Dict[str, Entity] = {}
+        self._relations: Dict[Tuple[str, str, str], Relation] = {}
+        # Adjacency maps over the same Relation objects, keyed by entity name
+        # (from / to) and by relationType, so cascades and walks are O(degree)
+        self._outgoing: Dict[str, Dict[Tuple[str, str, str], Relation]] = {}
+        self._incoming: Dict[str, Dict[Tuple[str, str, str], Relation]] = {}
+        self._by_type: Dict[str, Dict[Tuple[str, str, str], Relation]] = {}
+        self._index = self._new_index()
+        self._order: Dict[str, int] = {}  # Insertion rank, used to break score ties
+        self._next_order = 0
+        # Observation sets of entities with at least OBSERVATION_SET_MIN observations
+        self._observation_sets: Dict[str, set] = {}
+        self._batch_records: Optional[List[dict]] = None  # Collected by an open batch()
+        # Repeated searches and open_nodes calls are served from here (0 disables)
+        self._result_cache = ResultCache(result_cache_size) if result_cache_size > 0 else None
+        # Change feed: every persisted record gets the next version, and the last
+        # change_log_size of them are kept for changes_since(). Reloads and
+        # save_graph() start a new stretch of versions that older ones cannot
+        # be brought forward from (_changes_floor).
+        self.graph_id = uuid.uuid4().hex
+        self._version = 0
+        self._changes: deque = deque(maxlen=change_log_size)  # (version, record)
+        self._changes_floor = 0
+    
+    def _new_index(self) -> 'SearchIndex':
+        # Stores with their own full-text index spare us the in-memory postings
+        if type(self._store).search is not GraphStore.search:
+            return StoreSearchIndex(self._store)
+        return SearchIndex()
+    
+    def _refresh(self) -> None:
+        """Bring the resident graph up to date with the store"""
+        changes = self._store.poll()
+        if changes is None:
+            return
         
-        # Remove relations that reference deleted entities
-        graph.relations = [
-            r for r in graph.relations 
-            if r.from_entity not in entity_names and r.to_entity not in entity_names
-        ]
+        reset, records = changes
+        if reset:
+            self._reset()
+            mapped = self._store.snapshot_index()
+            if mapped is not None:
+                # The leading records come with their search postings; only
+                # the ones after them are indexed here
+                snapshot, covered = mapped
+                self._index = SnapshotSearchIndex(snapshot, self._entities)
+                for item in records[:covered]:
+                    self._apply_record(item, index=False)
+                records = records[covered:]
+        for item in records:
+            self._apply_record(item)
+        if not reset:
+            self._log_changes(records)  # Written by another process
         
-        self.save_graph(graph)
+        if reset:
+            # Access counts not flushed yet are not in storage; keep them
+            for name, (delta, at) in list(self._pending_weights.items()):
+                if name in self._entities:
+                    self._bump_weight(self._entities[name], delta, at)
+                else:
+                    del self._pending_weights[name]
+    
+    def _reset(self) -> None:
+        self._entities = {}
+        self._relations = {}
+        self._outgoing = {}
+        self._incoming = {}
+        self._by_type = {}
+        self._index = self._new_index()
+        self._order = {}
+        self._observation_sets = {}
+        self._rank_heaps = {}
+        self._graph_bytes = 0
+        if self._result_cache is not None:
+            self._result_cache.clear()
+        self._version += 1
+        self._changes = deque(maxlen=self._changes.maxlen)
+        self._changes_floor = self._version
+    
+    def _apply_record(self, item: dict, index: bool = True) -> None:
+        """Apply a single storage record (snapshot or delta) to the resident graph;
+        index=False leaves entity records out of the search index"""
+        record_type = item.get('type')
+        if record_type == 'entity':
+            entity = Entity(
+                name=item['name'],
+                entityType=item['entityType'],
+                observations=item['observations'],
+                weight=item.get('weight', 0),  # Default to 0 for backward compatibility
+                last_accessed=item.get('last_accessed', 0.0)
+            )
+            self._put_entity(entity, index)
+        elif record_type == 'relation':
+            relation = Relation(
+                from_entity=item['from_entity'],
+                to_entity=item['to_entity'],
+                relationType=item['relationType']
+            )
+            self._add_relation(relation)
+        elif record_type == 'delete_entity':
+            self._remove_entities({item['name']})
+        elif record_type == 'add_observation':
+            entity = self._entities.get(item['entityName'])
+            if entity is not None:
+                self._add_observation(entity, item['observation'])
+        elif record_type == 'delete_observation':
+            entity = self._entities.get(item['entityName'])
+            if entity is not None:
+                self._remove_observation(entity, item['observation'])
+        elif record_type == 'weight':
+            entity = self._entities.get(item['name'])
+            if entity is not None:
+                self._bump_weight(entity, item['delta'], item.get('at', 0.0))
+        elif record_type == 'delete_relation':
+            self._remove_relation((item['from_entity'], item['to_entity'], item['relationType']))
+        elif record_type == 'batch':
+            for record in item['records']:
+                self._apply_record(record)
     
-    def add_observations(self, observations: List[dict]) -> None:
-        """Add new observations to existing entities"""
-        graph = self.load_graph()
-        entity_map = {entity.name: entity for entity in graph.entities}
+    # Graph state mutations, shared by live operations and log replay so that
+    # the search index always mirrors the entities
+    def _put_entity(self, entity: Entity, index: bool = True) -> None:
+        self._dedupe_observations(entity)
+        # Interned, so relation endpoints and index postings share one string per name
+        entity.name = sys.intern(entity.name)
+        entity.entityType = sys.intern(entity.entityType)
+        previous = self._entities.get(entity.name)
+        if previous is not None:
+            self._touch(previous)
+            if index:
+                self._index.remove_entity(previous)
+            self._pending_weights.pop(entity.name, None)
+            self._observation_sets.pop(entity.name, None)
+            self._graph_bytes -= self._entity_bytes(previous)
+        else:
+            self._order[entity.name] = self._next_order
+            self._next_order += 1
+        self._entities[entity.name] = entity
+        self._graph_bytes += self._entity_bytes(entity)
+        if index:
+            self._index.add_entity(entity)
+        self._track_rank(entity)
+        self._touch(entity)
+    
+    @staticmethod
+    def _dedupe_observations(entity: Entity) -> None:
+        # An entity holds each observation once, as add_observations and the SQLite store keep them
+        observations = entity.observations
+        if len(observations) > 1 and len(set(observations)) < len(observations):
+            entity.observations = list(dict.fromkeys(observations))
+    
+    def _touch(self, entity: Entity, text: Optional[str] = None) -> None:
+        """Note a change to an entity's content (not its weight): text is what it gained
+        or lost, by default all of it (for a created or deleted entity)"""
+        if self._result_cache is not None:
+            if text is None:
+                text = '\0'.join((entity.name, entity.entityType, *entity.observations))
+            self._result_cache.invalidate(entity.name, text)
+    
+    @staticmethod
+    def _entity_bytes(entity: Entity) -> int:
+        return ENTITY_RECORD_BYTES + len(entity.name) + len(entity.entityType) \
+            + sum(len(observation) for observation in entity.observations) \
+            + OBSERVATION_BYTES * len(entity.observations)
+    
+    def _bump_weight(self, entity: Entity, delta: int, at: float) -> None:
+        entity.weight += delta
+        if at > entity.last_accessed:
+            entity.last_accessed = at
+        self._track_rank(entity)
+    
+    def _rank_key(self, entity: Entity, order: str) -> tuple:
+        """Position of an entity in one of the RANK_ORDERS, lowest evicted / pruned first"""
+        accessed = entity.last_accessed or self._epoch
+        if order == 'lfu':
+            return (entity.weight, accessed)
+        if order == 'lru':
+            return (accessed, entity.weight)
+        # Decayed: log2 of the decayed weight, plus now / half_life, which is the same
+        # for every entity, so the order holds until the entity is next touched
+        if entity.weight > 0:
+            return (math.log2(entity.weight) + accessed / self.weight_half_life, entity.weight, accessed)
+        return (-math.inf, entity.weight, accessed)
+    
+    def _rank_heap(self, order: str) -> List[Tuple[tuple, str]]:
+        heap = self._rank_heaps.get(order)
+        if heap is None:
+            heap = [(self._rank_key(entity, order), name) for name, entity in self._entities.items()]
+            heapq.heapify(heap)
+            self._rank_heaps[order] = heap
+        return heap
+    
+    def _pop_lowest(self, order: str, seen: set) -> Optional[Tuple[tuple, Entity]]:
+        """Pop the lowest ranked entity not in seen (adding it); callers push back what they keep"""
+        heap = self._rank_heap(order)
+        while heap:
+            key, name = heapq.heappop(heap)
+            entity = self._entities.get(name)
+            if entity is not None and name not in seen and self._rank_key(entity, order) == key:
+                seen.add(name)
+                return key, entity
+            # Otherwise superseded by a later push
+        return None
+    
+    def _track_rank(self, entity: Entity) -> None:
+        for order, heap in list(self._rank_heaps.items()):
+            if len(heap) > 2 * len(self._entities) + 1024:
+                del self._rank_heaps[order]  # Mostly superseded entries; rebuilt when next needed
+            else:
+                heapq.heappush(heap, (self._rank_key(entity, order), entity.name))
+    
+    def _add_observation(self, entity: Entity, observation: str) -> bool:
+        observations = entity.observations
+        if len(observations) < OBSERVATION_SET_MIN:
+            if observation in observations:
+                return False
+        else:
+            # Long lists get a set on the side for O(1) duplicate checks
+            seen = self._observation_sets.get(entity.name)
+            if seen is None:
+                seen = self._observation_sets[entity.name] = set(observations)
+            if observation in seen:
+                return False
+            seen.add(observation)
+        observations.append(observation)
+        self._touch(entity, observation)
+        self._index.add(entity.name, observation)
+        self._graph_bytes += len(observation) + OBSERVATION_BYTES
+        return True
+    
+    def _remove_observation(self, entity: Entity, observation: str) -> bool:
+        try:
+            entity.observations.remove(observation)
+        except ValueError:
+            return False  # Observation not found, ignore
+        self._touch(entity, observation)
+        seen = self._observation_sets.get(entity.name)
+        if seen is not None:
+            seen.discard(observation)
+        self._index.remove(entity.name, observation)
+        self._graph_bytes -= len(observation) + OBSERVATION_BYTES
+        return True
+    
+    def _add_relation(self, relation: Relation) -> bool:
+        relation.from_entity = sys.intern(relation.from_entity)
+        relation.to_entity = sys.intern(relation.to_entity)
+        relation.relationType = sys.intern(relation.relationType)
+        key = (relation.from_entity, relation.to_entity, relation.relationType)
+        if key in self._relations:
+            return False
+        self._relations[key] = relation
+        self._outgoing.setdefault(relation.from_entity, {})[key] = relation
+        self._incoming.setdefault(relation.to_entity, {})[key] = relation
+        self._by_type.setdefault(relation.relationType, {})[key] = relation
+        self._graph_bytes += RELATION_RECORD_BYTES + len(relation.from_entity) + len(relation.to_entity) \
+            + len(relation.relationType)
+        return True
+    
+    def _remove_relation(self, key: Tuple[str, str, str]) -> bool:
+        if self._relations.pop(key, None) is None:
+            return False
+        from_entity, to_entity, relation_type = key
+        for adjacency, node in ((self._outgoing, from_entity), (self._incoming, to_entity),
+                                (self._by_type, relation_type)):
+            edges = adjacency[node]
+            del edges[key]
+            if not edges:
+                del adjacency[node]
+        self._graph_bytes -= RELATION_RECORD_BYTES + len(from_entity) + len(to_entity) + len(relation_type)
+        return True
+    
+    def _remove_entities(self, names: set) -> set:
+        """Drop entities and the relations referencing them; return names that changed anything"""
+        changed = set()
+        for name in names:
+            entity = self._entities.pop(name, None)
+            if entity is not None:
+                self._touch(entity)
+                self._index.remove_entity(entity)
+                self._graph_bytes -= self._entity_bytes(entity)
+                del self._order[name]
+                self._pending_weights.pop(name, None)
+                self._observation_sets.pop(name, None)
+                changed.add(name)
+            
+            # Remove relations that reference deleted entities
+            edges = list(self._outgoing.get(name, {})) + list(self._incoming.get(name, {}))
+            for key in edges:
+                if self._remove_relation(key):
+                    changed.add(name)
+        return changed
+    
+    def _over_capacity(self) -> bool:
+        return bool(self.max_entities and len(self._entities) > self.max_entities
+                    or self.max_file_bytes and self._graph_bytes > self.max_file_bytes)
+    
+    def _check_fits(self, count: int, size: int) -> None:
+        """Refuse a write whose own entities (count of them, size estimated bytes) exceed
+        the caps: they are never evicted, so evicting the rest could not make room"""
+        if self.max_entities and count > self.max_entities:
+            raise ValueError(f"The write holds {count} entities, more than max_entities ({self.max_entities})")
+        if self.max_file_bytes and size > self.max_file_bytes:
+            raise ValueError(f"The written entities take {size} bytes, more than max_file_bytes "
+                             f"({self.max_file_bytes})")
+    
+    def _check_observations_fit(self, observations: List[dict]) -> None:
+        """_check_fits for the entities add_observations would grow"""
+        texts: Dict[str, dict] = {}
+        for obs in observations:
+            entity_name = obs.get('entityName')
+            if entity_name in self._entities and obs.get('observation'):
+                texts.setdefault(entity_name, {})[obs['observation']] = None
+        size = 0
+        for entity_name, new in texts.items():
+            entity = self._entities[entity_name]
+            existing = set(entity.observations)
+            kept = entity.observations + [text for text in new if text not in existing]
+            if self.max_observations:
+                kept = kept[-self.max_observations:]
+            size += self._entity_bytes(Entity(entity_name, entity.entityType, kept))
+        self._check_fits(0, size)  # Growing entities does not add any
+    
+    def _evict(self, written: Iterable[str] = ()) -> List[dict]:
+        """Remove the lowest ranked entities while over capacity; returns their delete records.
+        Entities the current write touched (written) are kept, even if that leaves the graph
+        over capacity."""
+        if not self._over_capacity():
+            return []
+        written = set(written)
+        victims, spared, seen = [], [], set()
+        while self._over_capacity():
+            popped = self._pop_lowest(self.eviction_policy, seen)
+            if popped is None:
+                break  # Only the written entities are left
+            if popped[1].name in written:
+                spared.append(popped)
+                continue
+            self._remove_entities({popped[1].name})
+            victims.append(popped[1].name)
+        for key, entity in spared:
+            heapq.heappush(self._rank_heaps[self.eviction_policy], (key, entity.name))
+        return [{'type': 'delete_entity', 'name': name} for name in victims]
+    
+    def _cap_observations(self, entity: Entity) -> List[dict]:
+        """Drop an entity's oldest observations past max_observations; returns their delete records"""
+        records = []
+        while self.max_observations and len(entity.observations) > self.max_observations:
+            observation = entity.observations[0]
+            self._remove_observation(entity, observation)
+            records.append({'type': 'delete_observation', 'entityName': entity.name, 'observation': observation})
+        return records
+    
+    def _append(self, records: List[dict]) -> None:
+        """Persist mutation records through the store (or hold them for the open batch)"""
+        if self._batch_records is not None:
+            self._batch_records.extend(records)
+        elif records:
+            self._store.append(records)
+            self._log_changes(records)
+    
+    def _log_changes(self, records: List[dict]) -> None:
+        for record in records:
+            if record['type'] == 'batch':
+                self._log_changes(record['records'])
+            else:
+                self._version += 1
+                self._changes.append((self._version, record))
+    
+    @contextmanager
+    def batch(self):
+        """Make the mutations inside the block one atomic update.
+        
+        The block runs under a single write lock and storage sync, and all of
+        its changes are persisted together as one record when it exits. If the
+        block raises, nothing is persisted and the graph is reloaded from storage.
+        """
+        with self._rwlock.write(), self._store.exclusive():
+            if self._batch_records is not None:
+                yield self  # Nested: part of the enclosing batch
+                return
+            self._refresh()
+            self._batch_records = []
+            pending_weights = dict(self._pending_weights)
+            try:
+                yield self
+            except BaseException:
+                self._batch_records = None
+                # Deletes in the block dropped their entities' unflushed access counts
+                with self._access_lock:
+                    self._pending_weights = pending_weights
+                changes = self._version, self._changes, self._changes_floor
+                self._store.invalidate()
+                self._refresh()
+                # Storage stayed locked throughout, so this reloaded the graph as of before
+                # the batch, which logged nothing: the change feed carries on from there
+                self._version, self._changes, self._changes_floor = changes
+                raise
+            if self._flush_due:
+                self._flush_pending()  # Access counts held back while the batch was open
+            records, self._batch_records = self._batch_records, None
+            if len(records) > 1:
+                records = [{'type': 'batch', 'records': records}]
+            self._append(records)
+    
+    def _snapshot_items(self) -> List[dict]:
+        """Shallow copy of the graph as plain records, safe to serialize on another thread"""
+        with self._access_lock:
+            # Unflushed access counts stay pending and are appended as deltas
+            # later, so a snapshot that is abandoned loses nothing
+            return self._snapshot_records(self._pending_weights)
+    
+    def _snapshot_records(self, pending: Optional[Dict[str, Tuple[int, float]]] = None) -> List[dict]:
+        pending = pending or {}
+        items = [self._entity_record(entity, entity.weight - pending.get(entity.name, (0,))[0])
+                 for entity in self._entities.values()]
+        items.extend(self._relation_record(relation) for relation in self._relations.values())
+        return items
+    
+    # Built field by field: asdict() would run every observation through
+    # copy.deepcopy just to get a list the serializer reads once
+    @staticmethod
+    def _entity_record(entity: Entity, weight: int) -> dict:
+        return {
+            'name': entity.name,
+            'entityType': entity.entityType,
+            'observations': list(entity.observations),
+            'weight': weight,
+            'last_accessed': entity.last_accessed,
+            'type': 'entity'
+        }
+    
+    @staticmethod
+    def _relation_record(relation: Relation) -> dict:
+        return {
+            'from_entity': relation.from_entity,
+            'to_entity': relation.to_entity,
+            'relationType': relation.relationType,
+            'type': 'relation'
+        }
+    
+    def _record_access(self, entities: List[Entity]) -> None:
+        """Bump weights of entities returned by a read and schedule persisting them"""
+        if not self.track_access or not entities:
+            return
+        now = time.time()
+        with self._access_lock:
+            for entity in entities:
+                self._bump_weight(entity, 1, now)
+                self._pending_weights[entity.name] = (self._pending_weights.get(entity.name, (0,))[0] + 1, now)
+            self._pending_count += len(entities)
+            
+            if self._pending_count >= self.weight_flush_threshold or self.weight_flush_interval <= 0:
+                self._flush_due = True  # Flushed by the reader wrapper
+            elif self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.weight_flush_interval, self.flush_weights)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+    
+    def _flush_pending(self) -> None:
+        with self._access_lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            records = [{'type': 'weight', 'name': name, 'delta': delta, 'at': at}
+                       for name, (delta, at) in self._pending_weights.items()]
+            self._pending_weights = {}
+            self._pending_count = 0
+            self._flush_due = False
+            self._append(records)
+    
+    @writer
+    def flush_weights(self) -> None:
+        """Persist access counts accumulated by search_nodes/open_nodes"""
+        self._flush_pending()
+    
+    @writer
+    def compact(self) -> None:
+        """Rewrite storage as a snapshot now, dropping replayed delta records"""
+        self._check_no_batch('compact')
+        self._store.compact()
+    
+    def _check_no_batch(self, operation: str) -> None:
+        # A snapshot taken mid-batch would already contain the batch's changes
+        if self._batch_records is not None:
+            raise RuntimeError(f"{operation} cannot be used inside a batch")
+    
+    def close(self) -> None:
+        """Flush pending weights, wait for background work and release the store"""
+        self.flush_weights()
+        self._store.close()
+    
+    def stats(self) -> dict:
+        """Size of the resident graph and its storage, without reloading either"""
+        return {
+            'entities': len(self._entities),
+            'relations': len(self._relations),
+            'graph_bytes': self._graph_bytes,
+            'pending_weight_updates': self._pending_count,
+            'version': self._version,
+            'result_cache': self._result_cache.stats() if self._result_cache is not None else {},
+            'store': self._store.stats()
+        }
+    
+    @reader
+    def load_graph(self) -> KnowledgeGraph:
+        """Return the knowledge graph, reloading from storage only if it changed"""
+        return KnowledgeGraph(
+            entities=list(self._entities.values()),
+            relations=list(self._relations.values())
+        )
+    
+    @writer
+    def save_graph(self, graph: KnowledgeGraph) -> None:
+        """Replace the resident graph and save it as a snapshot"""
+        self._check_no_batch('save_graph')
+        self._reset()
+        for entity in graph.entities:
+            self._put_entity(entity)
+        for relation in graph.relations:
+            self._add_relation(relation)
+        self._store.write_snapshot(self._snapshot_items())
+    
+    # Entity Operations
+    @writer
+    def create_entities(self, entities: List[Entity]) -> List[str]:
+        """Create new entities, ignore duplicates; returns names created"""
+        records = []
+        now = time.time()
+        
+        new_entities = {}
+        for entity in entities:
+            if entity.name not in self._entities and entity.name not in new_entities:
+                self._dedupe_observations(entity)
+                if self.max_observations and len(entity.observations) > self.max_observations:
+                    entity.observations = entity.observations[-self.max_observations:]
+                new_entities[entity.name] = entity
+        if self.max_entities or self.max_file_bytes:
+            self._check_fits(len(new_entities), sum(map(self._entity_bytes, new_entities.values())))
+        
+        for entity in new_entities.values():
+            if not entity.last_accessed:
+                entity.last_accessed = now
+            self._put_entity(entity)
+            records.append(self._entity_record(entity, entity.weight))
+        
+        created = [record['name'] for record in records]
+        self._append(records + self._evict(created))
+        return created
+    
+    @writer
+    def delete_entities(self, entity_names: List[str]) -> List[str]:
+        """Remove entities and cascade delete relations; returns names that changed anything"""
+        changed = self._remove_entities(set(entity_names))
+        records = [{'type': 'delete_entity', 'name': name} for name in dict.fromkeys(entity_names) if name in changed]
+        self._append(records)
+        return [record['name'] for record in records]
+    
+    @writer
+    def add_observations(self, observations: List[dict]) -> int:
+        """Add new observations to existing entities; returns how many were added"""
+        records = []
+        added = []
+        if self.max_file_bytes:
+            self._check_observations_fit(observations)
         
         for obs in observations:
             entity_name = obs.get('entityName')
             observation = obs.get('observation')
             
-            if entity_name in entity_map and observation:
-                if observation not in entity_map[entity_name].observations:
-                    entity_map[entity_name].observations.append(observation)
+            if entity_name in self._entities and observation:
+                entity = self._entities[entity_name]
+                if self._add_observation(entity, observation):
+                    records.append({'type': 'add_observation', 'entityName': entity_name, 'observation': observation})
+                    records.extend(self._cap_observations(entity))
+                    added.append(entity_name)
         
-        self.save_graph(graph)
+        self._append(records + self._evict(added))
+        return len(added)
     
-    def delete_observations(self, deletions: List[dict]) -> None:
-        """Remove specific observations from entities"""
-        graph = self.load_graph()
-        entity_map = {entity.name: entity for entity in graph.entities}
+    @writer
+    def delete_observations(self, deletions: List[dict]) -> int:
+        """Remove specific observations from entities; returns how many were removed"""
+        records = []
         
         for deletion in deletions:
             entity_name = deletion.get('entityName')
             observation = deletion.get('observation')
             
-            if entity_name in entity_map and observation:
-                try:
-                    entity_map[entity_name].observations.remove(observation)
-                except ValueError:
-                    pass  # Observation not found, ignore
+            if entity_name in self._entities and observation:
+                if self._remove_observation(self._entities[entity_name], observation):
+                    records.append({'type': 'delete_observation', 'entityName': entity_name, 'observation': observation})
         
-        self.save_graph(graph)
+        self._append(records)
+        return len(records)
     
     # Relation Operations
-    def create_relations(self, relations: List[Relation]) -> None:
-        """Create new relations, ignore duplicates"""
-        graph = self.load_graph()
-        existing_relations = {
-            (r.from_entity, r.to_entity, r.relationType) for r in graph.relations
-        }
+    @writer
+    def create_relations(self, relations: List[Relation]) -> int:
+        """Create new relations, ignore duplicates; returns how many were created"""
+        records = []
+        endpoints = []
         
         for relation in relations:
-            relation_key = (relation.from_entity, relation.to_entity, relation.relationType)
-            if relation_key not in existing_relations:
-                graph.relations.append(relation)
-                existing_relations.add(relation_key)
+            if self._add_relation(relation):
+                records.append(self._relation_record(relation))
+                endpoints += (relation.from_entity, relation.to_entity)
         
-        self.save_graph(graph)
+        created = len(records)
+        self._append(records + self._evict(endpoints))
+        return created
     
-    def delete_relations(self, relations: List[dict]) -> None:
-        """Remove specific relations"""
-        graph = self.load_graph()
+    @writer
+    def delete_relations(self, relations: List[dict]) -> int:
+        """Remove specific relations; returns how many were removed"""
+        records = []
         
-        # Create set of relations to delete for efficient lookup
-        relations_to_delete = {
-            (r.get('from_entity'), r.get('to_entity'), r.get('relationType'))
-            for r in relations
-        }
-        
-        # Filter out matching relations
-        graph.relations = [
-            r for r in graph.relations
-            if (r.from_entity, r.to_entity, r.relationType) not in relations_to_delete
-        ]
+        for r in relations:
+            key = (r.get('from_entity'), r.get('to_entity'), r.get('relationType'))
+            if self._remove_relation(key):
+                records.append({'type': 'delete_relation', 'from_entity': key[0], 'to_entity': key[1], 'relationType': key[2]})
         
-        self.save_graph(graph)
+        self._append(records)
+        return len(records)
     
     # Graph Operations
     def read_graph(self) -> KnowledgeGraph:
         """Return entire graph"""
         return self.load_graph()
     
-    def search_nodes(self, query: str) -> List[Entity]:
+    @reader
+    def changes_since(self, version: int, graph_id: Optional[str] = None) -> GraphChanges:
+        """Records persisted after version of graph_id, each with its version, or a
+        snapshot of the whole graph if those are no longer all held (or graph_id
+        is not this graph's). Access counts show up once flushed."""
+        oldest = self._changes[0][0] if self._changes else self._version + 1
+        if graph_id == self.graph_id and max(self._changes_floor, oldest - 1) <= version <= self._version:
+            records = [{**record, 'version': number}
+                       for number, record in itertools.islice(self._changes, version - oldest + 1, None)]
+            return GraphChanges(graph_id=self.graph_id, version=self._version, snapshot=False, records=records)
+        with self._access_lock:
+            # Unflushed access counts are left out, as they arrive later as weight changes
+            records = self._snapshot_records(self._pending_weights)
+        return GraphChanges(graph_id=self.graph_id, version=self._version, snapshot=True, records=records)
+    
+    @reader
+    def change_version(self) -> Tuple[str, int]:
+        """(graph_id, version) of the graph as changes_since reports them"""
+        return self.graph_id, self._version
+    
+    @reader
+    def read_graph_page(self, offset: int = 0, limit: Optional[int] = None, cursor: Optional[str] = None,
+                        entity_types: Optional[List[str]] = None,
+                        relation_types: Optional[List[str]] = None) -> GraphPage:
+        """Return one page of entities (in graph order) with their outgoing relations.
+        
+        cursor is the next_cursor of a previous page and continues after it;
+        offset skips further entities from there. Without any paging or
+        entity filter, every relation is returned, as read_graph does.
+        """
+        check_paging(offset, limit)
+        if cursor and not (isinstance(cursor, str) and cursor.isdigit()):
+            raise ValueError(f"Invalid cursor: {cursor}")
+        type_filter = set(entity_types) if entity_types else None
+        relation_filter = set(relation_types) if relation_types else None
+        after = int(cursor) if cursor else -1
+        
+        entities = []
+        total = 0
+        skipped = 0
+        next_cursor = None
+        for name, entity in self._entities.items():
+            if type_filter is not None and entity.entityType not in type_filter:
+                continue
+            total += 1
+            if self._order[name] <= after:
+                continue
+            if skipped < offset:
+                skipped += 1
+            elif limit is None or len(entities) < limit:
+                entities.append(entity)
+            elif next_cursor is None and entities:
+                next_cursor = str(self._order[entities[-1].name])
+        
+        if limit is None and not offset and cursor is None and type_filter is None:
+            if relation_filter is None:
+                relations = list(self._relations.values())
+            else:
+                relations = [r for t in relation_filter for r in self._by_type.get(t, {}).values()]
+        else:
+            relations = [
+                r for entity in entities for r in self._outgoing.get(entity.name, {}).values()
+                if relation_filter is None or r.relationType in relation_filter
+            ]
+        return GraphPage(entities=entities, relations=relations, next_cursor=next_cursor, total=total)
+    
+    def search_nodes(self, query: str, limit: Optional[int] = None) -> List[Entity]:
         """Search entities by name/type/observations + increment weights"""
-        graph = self.load_graph()
+        return [entity for entity, _ in self.search_nodes_scored(query, limit)]
+    
+    @reader
+    def search_nodes_scored(self, query: str, limit: Optional[int] = None,
+                            record_access: bool = True) -> List[Tuple[Entity, float]]:
+        """Search entities, best matches first, returning (entity, score) + increment weights"""
+        scored = list(self._search(query, limit)[0])
+        
+        # Increment weight for accessed entities
+        if record_access:
+            self._record_access([entity for entity, _ in scored])
+        
+        return scored
+    
+    @reader
+    def search_nodes_json(self, query: str, limit: Optional[int] = None,
+                          include_scores: bool = False) -> Tuple[str, int]:
+        """search_nodes as a JSON array of entities (with scores if asked) and their count,
+        reusing cached serializations + increment weights"""
+        entry = self._search(query, limit)
+        scored = entry[0]
+        if entry[1] is None:
+            entry[1] = [entity_json_body(entity) for entity, _ in scored]
+        entities = [entity for entity, _ in scored]
+        self._record_access(entities)
+        scores = [score for _, score in scored] if include_scores else None
+        return entities_json(entities, entry[1], scores), len(entities)
+    
+    def _search(self, query: str, limit: Optional[int]) -> list:
+        """[(entity, score) best first, their entity_json_body or None], from the result cache if there"""
         query_lower = query.lower()
-        matching_entities = []
+        # With decay, equal scores are ordered by weights that change with time
+        cache = self._result_cache if self.weight_half_life is None else None
+        key = ('search', query_lower, limit)
+        if cache is not None:
+            entry = cache.get(key)
+            if entry is not None:
+                return entry
         
-        for entity in graph.entities:
-            # Search in name, type, and observations
-            if (query_lower in entity.name.lower() or 
-                query_lower in entity.entityType.lower() or
-                any(query_lower in obs.lower() for obs in entity.observations)):
-                
-                # Increment weight for accessed entity
-                entity.weight += 1
-                matching_entities.append(entity)
+        candidates = self._index.candidates(query_lower)
+        if candidates is None:
+            candidates = self._entities.keys()
         
-        # Save updated weights
-        if matching_entities:
-            self.save_graph(graph)
+        scored = []
+        for name in candidates:
+            entity = self._entities[name]
+            score = self._index.score(entity, query_lower)
+            if score:
+                scored.append((entity, score))
+        # Best score first; equal scores keep graph (insertion) order, or with
+        # decay put the more (and more recently) used entities first
+        if self.weight_half_life is None:
+            scored.sort(key=lambda pair: (-pair[1], self._order[pair[0].name]))
+        else:
+            now = time.time()
+            scored.sort(key=lambda pair: (-pair[1], -self.effective_weight(pair[0], now),
+                                          self._order[pair[0].name]))
+        if limit is not None:
+            scored = scored[:max(limit, 0)]
         
-        return matching_entities
+        entry = [scored, None]
+        # Inside a batch a store's own full-text index does not see the batch's changes yet
+        if cache is not None and self._batch_records is None and len(scored) <= RESULT_CACHE_MAX_ENTITIES:
+            cache.put(key, entry, query=query_lower, names=[entity.name for entity, _ in scored])
+        return entry
     
+    @reader
     def open_nodes(self, names: List[str]) -> List[Entity]:
         """Get specific entities + increment weights"""
-        graph = self.load_graph()
-        entity_map = {entity.name: entity for entity in graph.entities}
         found_entities = []
         
         for name in names:
-            if name in entity_map:
-                entity = entity_map[name]
-                entity.weight += 1
-                found_entities.append(entity)
+            if name in self._entities:
+                found_entities.append(self._entities[name])
         
-        # Save updated weights
-        if found_entities:
-            self.save_graph(graph)
+        # Increment weight for accessed entities
+        self._record_access(found_entities)
         
         return found_entities
     
-    # New Operations
-    def prune_entities(self, threshold: int) -> List[str]:
-        """Remove entities with weight < threshold"""
-        graph = self.load_graph()
-        
-        # Find entities to prune
-        entities_to_prune = [
-            entity.name for entity in graph.entities 
-            if entity.weight < threshold
-        ]
+    @reader
+    def open_nodes_json(self, names: List[str]) -> Tuple[str, int]:
+        """open_nodes as a JSON array of entities and their count, reusing cached
+        serializations + increment weights"""
+        key = ('open', tuple(names))
+        entry = self._result_cache.get(key) if self._result_cache is not None else None
+        if entry is None:
+            found = [self._entities[name] for name in names if name in self._entities]
+            entry = [found, [entity_json_body(entity) for entity in found]]
+            if self._result_cache is not None and len(found) <= RESULT_CACHE_MAX_ENTITIES:
+                self._result_cache.put(key, entry, names=key[1])
+        self._record_access(entry[0])
+        return entities_json(entry[0], entry[1]), len(entry[0])
+    
+    @reader
+    def get_entities(self, names: List[str]) -> List[Entity]:
+        """Entities by name, like open_nodes but without counting as an access"""
+        return [self._entities[name] for name in names if name in self._entities]
+    
+    @reader
+    def get_neighbors(self, name: str, relation_types: Optional[List[str]] = None,
+                      direction: str = 'both') -> List[Relation]:
+        """Relations touching an entity, optionally filtered by type and direction ('out', 'in', 'both')"""
+        return self._edges(name, set(relation_types) if relation_types else None, direction)
+    
+    def _edges(self, name: str, relation_types: Optional[set], direction: str) -> List[Relation]:
+        if direction not in ('out', 'in', 'both'):
+            raise ValueError(f"Invalid direction: {direction}")
+        edges = []
+        if direction in ('out', 'both'):
+            edges.extend(self._outgoing.get(name, {}).values())
+        if direction in ('in', 'both'):
+            edges.extend(r for r in self._incoming.get(name, {}).values()
+                         if direction == 'in' or r.from_entity != name)  # Self-loops only once
+        if relation_types is not None:
+            edges = [r for r in edges if r.relationType in relation_types]
+        return edges
+    
+    @reader
+    def relations_touching(self, names: List[str], relation_types: Optional[List[str]] = None,
+                           direction: str = 'both') -> List[Relation]:
+        """Distinct relations touching any of names, as get_neighbors finds them for each"""
+        type_filter = set(relation_types) if relation_types else None
+        found: Dict[Tuple[str, str, str], Relation] = {}
+        for name in names:
+            for relation in self._edges(name, type_filter, direction):
+                found[(relation.from_entity, relation.to_entity, relation.relationType)] = relation
+        return list(found.values())
+    
+    @reader
+    def traverse(self, start_names: List[str], max_depth: int = TRAVERSE_DEPTH,
+                 relation_types: Optional[List[str]] = None, direction: str = 'both',
+                 max_entities: Optional[int] = None) -> Tuple[KnowledgeGraph, Dict[str, int]]:
+        """Breadth-first walk from start_names up to max_depth hops.
         
-        if entities_to_prune:
-            # Remove low-weight entities and their relations
-            self.delete_entities(entities_to_prune)
+        Returns the subgraph of reached entities and traversed relations,
+        plus the hop distance of every reached name.
+        """
+        type_filter = set(relation_types) if relation_types else None
+        depths = {name: 0 for name in start_names if name in self._entities}
+        relations: Dict[Tuple[str, str, str], Relation] = {}
+        frontier = list(depths)
         
-        return entities_to_prune
+        depth = 0
+        while frontier and depth < max_depth:
+            depth += 1
+            next_frontier = []
+            for name in frontier:
+                for relation in self._edges(name, type_filter, direction):
+                    neighbor = relation.to_entity if relation.from_entity == name else relation.from_entity
+                    if neighbor not in depths:
+                        if max_entities is not None and len(depths) >= max_entities:
+                            continue
+                        depths[neighbor] = depth
+                        next_frontier.append(neighbor)
+                    relations[(relation.from_entity, relation.to_entity, relation.relationType)] = relation
+            frontier = next_frontier
+        
+        subgraph = KnowledgeGraph(
+            entities=[self._entities[name] for name in depths if name in self._entities],
+            relations=list(relations.values())
+        )
+        return subgraph, depths
+    
+    # New Operations
+    def effective_weight(self, entity: Entity, now: Optional[float] = None) -> float:
+        """Weight of an entity decayed by the time since its last access (as is without a half-life)"""
+        if self.weight_half_life is None:
+            return entity.weight
+        age = (now or time.time()) - (entity.last_accessed or self._epoch)
+        return entity.weight * 2 ** (-max(age, 0.0) / self.weight_half_life)
+    
+    def _lowest_entities(self, threshold: Optional[float], count: Optional[int],
+                         now: float) -> List[Tuple[tuple, Entity]]:
+        """Pop the entities prune_entities would remove off the rank heap, lowest weight first"""
+        check_prune(threshold, count)
+        order = 'lfu' if self.weight_half_life is None else 'decayed'
+        victims, kept, seen = [], [], set()
+        try:
+            while count is None or len(victims) < count:
+                popped = self._pop_lowest(order, seen)
+                if popped is None:
+                    break
+                key, entity = popped
+                if threshold is not None and self.effective_weight(entity, now) >= threshold:
+                    kept.append((key, entity.name))
+                    if entity.weight >= 0:
+                        break  # Everything after it weighs at least as much
+                    continue  # Negative weights decay towards 0, so a later one may still qualify
+                victims.append(popped)
+        except BaseException:
+            self._rank_heaps = {}  # Popped entries of entities that still exist
+            raise
+        for entry in kept:
+            heapq.heappush(self._rank_heaps[order], entry)
+        return victims
     
+    @writer
+    def prune_entities(self, threshold: Optional[float] = None, count: Optional[int] = None) -> List[str]:
+        """Remove entities with (decayed) weight < threshold, at most count of them,
+        lowest weight first; with only count, the count lowest. Returns names removed"""
+        if threshold is None and count is None:
+            return []
+        victims = [entity.name for _, entity in self._lowest_entities(threshold, count, time.time())]
+        if victims:
+            victims.sort(key=self._order.__getitem__)
+            try:
+                # Remove low-weight entities and their relations
+                self.delete_entities(victims)
+            except BaseException:
+                self._rank_heaps = {}  # Popped entries of entities that may still exist
+                raise
+        return victims
+    
+    @writer
+    def prune_candidates(self, threshold: Optional[float] = None,
+                         count: Optional[int] = None) -> List[Tuple[float, str]]:
+        """(effective weight, name) of the entities prune_entities would remove,
+        lowest first, without removing them"""
+        if threshold is None and count is None:
+            return []
+        now = time.time()
+        victims = self._lowest_entities(threshold, count, now)
+        heap = self._rank_heap('lfu' if self.weight_half_life is None else 'decayed')
+        for key, entity in victims:
+            heapq.heappush(heap, (key, entity.name))
+        return [(self.effective_weight(entity, now), entity.name) for _, entity in victims]
+    
+    @writer
     def increment_weights(self, entity_names: List[str]) -> None:
         """Increment weight for specified entities"""
-        graph = self.load_graph()
-        entity_map = {entity.name: entity for entity in graph.entities}
+        records = []
+        now = time.time()
         
-        updated = False
         for name in entity_names:
-            if name in entity_map:
-                entity_map[name].weight += 1
-                updated = True
+            if name in self._entities:
+                self._bump_weight(self._entities[name], 1, now)
+                records.append({'type': 'weight', 'name': name, 'delta': 1, 'at': now})
         
-        if updated:
-            self.save_graph(graph)
+        self._append(records)
 
 
 # Initialize the knowledge graph manager
 MEMORY_FILE_PATH = os.getenv('MEMORY_FILE_PATH', 'memory.jsonl')
-knowledge_graph_manager = KnowledgeGraphManager(MEMORY_FILE_PATH)
+# Rewrite the file once appended delta records exceed this multiple of the snapshot size
+MEMORY_COMPACTION_RATIO = float(os.getenv('MEMORY_COMPACTION_RATIO', '1.0'))
+# fsync every appended record, not just snapshots (slower, survives power loss)
+MEMORY_FSYNC = os.getenv('MEMORY_FSYNC', '').lower() in ('1', 'true', 'yes')
+# Keep a memory-mapped binary copy of each snapshot ('<file>.snap') for fast cold starts
+MEMORY_BINARY_SNAPSHOT = os.getenv('MEMORY_BINARY_SNAPSHOT', '').lower() in ('1', 'true', 'yes')
+# Access tracking by search_nodes/open_nodes: off makes reads non-mutating;
+# otherwise weight increments are persisted every interval seconds or
+# after threshold increments, whichever comes first
+MEMORY_TRACK_ACCESS = os.getenv('MEMORY_TRACK_ACCESS', '1').lower() not in ('0', 'false', 'no')
+MEMORY_WEIGHT_FLUSH_INTERVAL = float(os.getenv('MEMORY_WEIGHT_FLUSH_INTERVAL', '5'))
+MEMORY_WEIGHT_FLUSH_THRESHOLD = int(os.getenv('MEMORY_WEIGHT_FLUSH_THRESHOLD', '100'))
+# Halve weights for every this many days since an entity was last accessed when
+# pruning and ranking equal search scores (0 ranks by raw access counts)
+MEMORY_WEIGHT_HALF_LIFE_DAYS = float(os.getenv('MEMORY_WEIGHT_HALF_LIFE_DAYS', '0'))
+# Capacity (0 = unlimited): entities, observations per entity, and the graph's
+# approximate size as a snapshot. Writes past a cap evict entities in
+# MEMORY_EVICTION_POLICY order ('lfu', 'lru' or 'decayed') or drop the oldest observations.
+MEMORY_MAX_ENTITIES = int(os.getenv('MEMORY_MAX_ENTITIES', '0'))
+MEMORY_MAX_OBSERVATIONS = int(os.getenv('MEMORY_MAX_OBSERVATIONS', '0'))
+MEMORY_MAX_FILE_BYTES = int(os.getenv('MEMORY_MAX_FILE_BYTES', '0'))
+MEMORY_EVICTION_POLICY = os.getenv('MEMORY_EVICTION_POLICY', 'lfu').lower()
+# Rewrite this file with server_stats output every interval seconds, as 'json'
+# or 'prometheus' text (e.g. for node_exporter's textfile collector)
+MEMORY_STATS_FILE = os.getenv('MEMORY_STATS_FILE', '')
+MEMORY_STATS_INTERVAL = float(os.getenv('MEMORY_STATS_INTERVAL', '60'))
+MEMORY_STATS_FORMAT = os.getenv('MEMORY_STATS_FORMAT', 'json').lower()
+# Graphs of the tools' namespace argument: one file each in this directory, of
+# which at most MEMORY_MAX_NAMESPACES are kept loaded at a time
+MEMORY_NAMESPACE_DIR = os.getenv('MEMORY_NAMESPACE_DIR', str(Path(MEMORY_FILE_PATH).with_name('namespaces')))
+MEMORY_MAX_NAMESPACES = int(os.getenv('MEMORY_MAX_NAMESPACES', '16'))
+# Repeated search_nodes / open_nodes calls answered from an LRU cache of this
+# many results, kept exact by dropping the ones a mutation affects (0 = off)
+MEMORY_RESULT_CACHE_SIZE = int(os.getenv('MEMORY_RESULT_CACHE_SIZE', '256'))
+# Recent changes kept for get_changes_since; clients further behind get a snapshot
+MEMORY_CHANGE_LOG_SIZE = int(os.getenv('MEMORY_CHANGE_LOG_SIZE', '10000'))
+# Split the default graph across this many worker processes (0 or 1 = off), each
+# owning the entities whose name hashes to it in '<stem>.shard-<i>-of-<n><suffix>'
+MEMORY_SHARDS = int(os.getenv('MEMORY_SHARDS', '0'))
+# Storage backend: 'jsonl' (MEMORY_FILE_PATH) or 'sqlite' (MEMORY_DB_PATH)
+MEMORY_BACKEND = os.getenv('MEMORY_BACKEND', 'jsonl').lower()
+MEMORY_DB_PATH = os.getenv('MEMORY_DB_PATH', str(Path(MEMORY_FILE_PATH).with_suffix('.db')))
+
+
+def create_manager(backend: str = MEMORY_BACKEND, path: Optional[str] = None, **overrides) -> KnowledgeGraphManager:
+    """Build a manager for the configured backend, on path instead of MEMORY_FILE_PATH / MEMORY_DB_PATH
+    if given; keyword arguments override the configured KnowledgeGraphManager options"""
+    manager_options = dict(
+        track_access=MEMORY_TRACK_ACCESS,
+        weight_flush_interval=MEMORY_WEIGHT_FLUSH_INTERVAL,
+        weight_flush_threshold=MEMORY_WEIGHT_FLUSH_THRESHOLD,
+        weight_half_life=MEMORY_WEIGHT_HALF_LIFE_DAYS * 86400 or None,
+        max_entities=MEMORY_MAX_ENTITIES,
+        max_observations=MEMORY_MAX_OBSERVATIONS,
+        max_file_bytes=MEMORY_MAX_FILE_BYTES,
+        eviction_policy=MEMORY_EVICTION_POLICY,
+        result_cache_size=MEMORY_RESULT_CACHE_SIZE,
+        change_log_size=MEMORY_CHANGE_LOG_SIZE
+    )
+    manager_options.update(overrides)
+    if backend == 'sqlite':
+        path = path or MEMORY_DB_PATH
+        return KnowledgeGraphManager(path, store=create_store('sqlite', path), **manager_options)
+    path = path or MEMORY_FILE_PATH
+    return KnowledgeGraphManager(
+        path, store=create_store(
+            backend, path, compaction_ratio=MEMORY_COMPACTION_RATIO, fsync=MEMORY_FSYNC,
+            binary_snapshot=MEMORY_BINARY_SNAPSHOT
+        ), **manager_options
+    )
+
+
+def copy_graph(source: GraphStore, target: GraphStore) -> Tuple[int, int]:
+    """Copy the whole graph between storage backends; returns (entities, relations) copied"""
+    graph = KnowledgeGraphManager('', store=source).read_graph()
+    target_manager = KnowledgeGraphManager('', store=target)
+    target_manager.save_graph(graph)
+    source.close()
+    target_manager.close()
+    return len(graph.entities), len(graph.relations)
+
+
+# Namespace names double as file names under MEMORY_NAMESPACE_DIR
+NAMESPACE_PATTERN = re.compile(r'[A-Za-z0-9_-][A-Za-z0-9_.-]{0,63}')
+
+
+class NamespaceManagers:
+    """Managers of the named graphs, each stored in its own file under directory
+    and loaded on first use. At most max_loaded are kept; loading another closes
+    the least recently used one that no call is using (flushing its weights)."""
+    
+    def __init__(self, directory: str, backend: str = MEMORY_BACKEND, max_loaded: int = 16):
+        self.directory = Path(directory)
+        self.backend = backend
+        self.max_loaded = max_loaded
+        self._lock = threading.Lock()
+        self._managers: Dict[str, KnowledgeGraphManager] = {}  # Least recently used first
+        self._in_use: Dict[str, int] = {}
+        self._loads = 0
+        self._evictions = 0
+    
+    def path(self, namespace: str) -> Path:
+        if not isinstance(namespace, str) or not NAMESPACE_PATTERN.fullmatch(namespace):
+            raise ValueError(f"Invalid namespace: {namespace!r} (use up to 64 letters, digits, '_', '-' or '.')")
+        return self.directory / (namespace + ('.db' if self.backend == 'sqlite' else '.jsonl'))
+    
+    def acquire(self, namespace: str) -> KnowledgeGraphManager:
+        """Manager of a namespace, held until the matching release()"""
+        path = self.path(namespace)
+        with self._lock:
+            manager = self._managers.pop(namespace, None)
+            if manager is None:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                manager = create_manager(self.backend, str(path))  # The graph itself loads lazily
+                self._loads += 1
+            self._managers[namespace] = manager
+            self._in_use[namespace] = self._in_use.get(namespace, 0) + 1
+            evicted = self._evict_idle()
+        self._close(evicted)
+        return manager
+    
+    def release(self, namespace: str) -> None:
+        with self._lock:
+            self._in_use[namespace] -= 1
+            if not self._in_use[namespace]:
+                del self._in_use[namespace]
+            evicted = self._evict_idle()
+        self._close(evicted)
+    
+    @contextmanager
+    def use(self, namespace: str):
+        manager = self.acquire(namespace)
+        try:
+            yield manager
+        finally:
+            self.release(namespace)
+    
+    def _evict_idle(self) -> List[KnowledgeGraphManager]:
+        # Managers in use stay loaded, even if that means holding more than max_loaded for now
+        evicted = []
+        for namespace in list(self._managers):
+            if len(self._managers) <= self.max_loaded:
+                break
+            if namespace not in self._in_use:
+                evicted.append(self._managers.pop(namespace))
+        self._evictions += len(evicted)
+        return evicted
+    
+    @staticmethod
+    def _close(managers: List[KnowledgeGraphManager]) -> None:
+        # Outside the registry lock: closing flushes weights and waits for compactions
+        for manager in managers:
+            try:
+                manager.close()
+            except OSError as e:
+                logger.warning("Could not close namespace graph %s: %s", manager.memory_file_path, e)
+    
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'loaded': len(self._managers),
+                'max_loaded': self.max_loaded,
+                'loads': self._loads,
+                'evictions': self._evictions
+            }
+    
+    def close(self) -> None:
+        """Close every loaded manager"""
+        with self._lock:
+            managers, self._managers = list(self._managers.values()), {}
+        self._close(managers)
+
+
+def shard_path(path: str, index: int, count: int) -> str:
+    """File of shard index out of count, next to path (memory.jsonl -> memory.shard-0-of-4.jsonl)"""
+    path = Path(path)
+    return str(path.with_name(f"{path.stem}.shard-{index}-of-{count}{path.suffix}"))
+
+
+def _shard_worker(conn, backend: str, path: str, options: dict) -> None:
+    """Serve one shard's KnowledgeGraphManager to its ShardedGraph over a pipe.
+    
+    Requests are (method, args, kwargs) tuples answered with (True, result) or
+    (False, exception); 'begin_batch' / 'end_batch' hold a batch open in between.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Shutdown is up to the coordinator
+    manager = create_manager(backend, path, **options)
+    batch = None
+    while True:
+        try:
+            method, args, kwargs = conn.recv()
+        except EOFError:
+            break  # Coordinator gone
+        try:
+            if method == 'begin_batch':
+                batch = manager.batch()
+                batch.__enter__()
+                result = None
+            elif method == 'end_batch':
+                current, batch = batch, None
+                if current is None:
+                    pass  # begin_batch failed here
+                elif kwargs.get('failed'):
+                    # Rolls the shard back, like an exception raised inside the block
+                    error = RuntimeError("Batch failed")
+                    current.__exit__(RuntimeError, error, None)
+                else:
+                    current.__exit__(None, None, None)
+                result = None
+            else:
+                result = getattr(manager, method)(*args, **kwargs)
+            reply = (True, result)
+        except Exception as e:
+            reply = (False, e)
+        try:
+            conn.send(reply)
+        except Exception as e:  # Unpicklable result or exception
+            conn.send((False, RuntimeError(f"Shard {path}: {method} failed: {e}")))
+        if method == 'close':
+            return
+    manager.close()
+
+
+class ShardedGraph:
+    """KnowledgeGraphManager look-alike whose entities are partitioned by name
+    hash across worker processes, each running a manager on its own shard file.
+    
+    Calls on named entities are routed to their shard; searches, pages, prunes
+    and incoming-relation lookups fan out to all shards in parallel and are
+    merged here. A relation is stored on the shard of its from_entity, so
+    outgoing relations stay local and deletes cascade across shards.
+    Workers are started on first use.
+    """
+    
+    def __init__(self, path: str, shards: int, backend: str = MEMORY_BACKEND, **options):
+        if shards < 1:
+            raise ValueError("shards must be at least 1")
+        self.memory_file_path = Path(path)
+        self.shards = shards
+        self.backend = backend
+        self.options = options
+        # Batches hold the write side so no other call lands inside them
+        self._lock = ReadWriteLock()
+        self._start_lock = threading.Lock()
+        self._pipe_locks = [threading.Lock() for _ in range(shards)]
+        self._pipes = []
+        self._processes = []
+        self._in_batch = False
+    
+    def _start(self) -> None:
+        with self._start_lock:
+            if self._pipes:
+                return
+            # spawn: forking a process that runs threads (flush timers, compactions) is unsafe
+            context = multiprocessing.get_context('spawn')
+            for index in range(self.shards):
+                parent, child = context.Pipe()
+                process = context.Process(
+                    target=_shard_worker, name=f"memory-shard-{index}", daemon=True,
+                    args=(child, self.backend, shard_path(str(self.memory_file_path), index, self.shards),
+                          self.options)
+                )
+                process.start()
+                child.close()
+                self._pipes.append(parent)
+                self._processes.append(process)
+    
+    def shard_of(self, name) -> int:
+        """Shard owning an entity (and the relations from it)"""
+        if not isinstance(name, str):
+            return 0
+        return zlib.crc32(name.encode('utf-8', 'surrogatepass')) % self.shards
+    
+    def _request(self, calls: Dict[int, Tuple[str, tuple, dict]]) -> Dict[int, object]:
+        """Send one call to each of several shards, so they run in parallel, then
+        collect the results; raises the first shard's error, if any"""
+        self._start()
+        shards = sorted(calls)  # Locked in a fixed order, so concurrent fan-outs cannot deadlock
+        with self._lock.read():
+            for shard in shards:
+                self._pipe_locks[shard].acquire()
+            try:
+                for shard in shards:
+                    self._pipes[shard].send(calls[shard])
+                replies = {}
+                for shard in shards:
+                    try:
+                        replies[shard] = self._pipes[shard].recv()
+                    except EOFError:
+                        replies[shard] = (False, RuntimeError(f"Shard worker {shard} exited"))
+            finally:
+                for shard in shards:
+                    self._pipe_locks[shard].release()
+        for ok, value in replies.values():
+            if not ok:
+                raise value
+        return {shard: value for shard, (_, value) in replies.items()}
+    
+    def _all(self, method: str, *args, **kwargs) -> List:
+        """Call a method on every shard; results in shard order"""
+        call = (method, args, kwargs)
+        results = self._request({shard: call for shard in range(self.shards)})
+        return [results[shard] for shard in range(self.shards)]
+    
+    def _routed(self, method: str, items: list, key: Callable, *args, **kwargs) -> Dict[int, object]:
+        """Call a method on each shard with the items it owns by key(item)"""
+        groups: Dict[int, list] = {}
+        for item in items:
+            groups.setdefault(self.shard_of(key(item)), []).append(item)
+        return self._request({shard: (method, (group,) + args, kwargs) for shard, group in groups.items()})
+    
+    @contextmanager
+    def batch(self):
+        """Open a batch on every shard for the block. Each shard commits or rolls
+        back its part atomically; a crash between shard commits can leave some applied."""
+        with self._lock.write():
+            if self._in_batch:
+                yield self  # Nested: part of the enclosing batch
+                return
+            try:
+                self._all('begin_batch')
+            except BaseException:
+                self._all('end_batch', failed=True)  # Roll back the shards that did begin
+                raise
+            self._in_batch = True
+            try:
+                yield self
+            except BaseException:
+                self._in_batch = False
+                self._all('end_batch', failed=True)
+                raise
+            self._in_batch = False
+            self._all('end_batch')
+    
+    def create_entities(self, entities: List[Entity]) -> List[str]:
+        results = self._routed('create_entities', entities, lambda entity: entity.name)
+        created = set().union(*results.values())
+        return [name for name in dict.fromkeys(entity.name for entity in entities) if name in created]
+    
+    def delete_entities(self, entity_names: List[str]) -> List[str]:
+        # Every shard, as relations into the entities may be stored on any of them
+        changed = set().union(*self._all('delete_entities', entity_names))
+        return [name for name in dict.fromkeys(entity_names) if name in changed]
+    
+    def add_observations(self, observations: List[dict]) -> int:
+        return sum(self._routed('add_observations', observations, lambda obs: obs.get('entityName')).values())
+    
+    def delete_observations(self, deletions: List[dict]) -> int:
+        return sum(self._routed('delete_observations', deletions, lambda obs: obs.get('entityName')).values())
+    
+    def create_relations(self, relations: List[Relation]) -> int:
+        return sum(self._routed('create_relations', relations, lambda relation: relation.from_entity).values())
+    
+    def delete_relations(self, relations: List[dict]) -> int:
+        return sum(self._routed('delete_relations', relations, lambda relation: relation.get('from_entity')).values())
+    
+    def increment_weights(self, entity_names: List[str]) -> None:
+        self._routed('increment_weights', entity_names, lambda name: name)
+    
+    def open_nodes(self, names: List[str]) -> List[Entity]:
+        found = {entity.name: entity
+                 for entities in self._routed('open_nodes', list(dict.fromkeys(names)), lambda name: name).values()
+                 for entity in entities}
+        return [found[name] for name in names if name in found]
+    
+    def search_nodes_json(self, query: str, limit: Optional[int] = None,
+                          include_scores: bool = False) -> Tuple[str, int]:
+        scored = self.search_nodes_scored(query, limit)
+        scores = [score for _, score in scored] if include_scores else None
+        return entities_json([entity for entity, _ in scored], scores=scores), len(scored)
+    
+    def open_nodes_json(self, names: List[str]) -> Tuple[str, int]:
+        entities = self.open_nodes(names)
+        return entities_json(entities), len(entities)
+    
+    def get_entities(self, names: List[str]) -> List[Entity]:
+        found = {entity.name: entity
+                 for entities in self._routed('get_entities', list(dict.fromkeys(names)), lambda name: name).values()
+                 for entity in entities}
+        return [found[name] for name in names if name in found]
+    
+    def read_graph(self) -> KnowledgeGraph:
+        page = self.read_graph_page()
+        return KnowledgeGraph(entities=page.entities, relations=page.relations)
+    
+    def read_graph_page(self, offset: int = 0, limit: Optional[int] = None, cursor: Optional[str] = None,
+                        entity_types: Optional[List[str]] = None,
+                        relation_types: Optional[List[str]] = None) -> GraphPage:
+        """Like KnowledgeGraphManager.read_graph_page, with the graph ordered shard
+        by shard and cursors of the form '<shard>:<shard cursor>'"""
+        check_paging(offset, limit)
+        if limit is None and not offset and cursor is None and not entity_types:
+            pages = self._all('read_graph_page', relation_types=relation_types)
+            return GraphPage(entities=[entity for page in pages for entity in page.entities],
+                             relations=[relation for page in pages for relation in page.relations],
+                             next_cursor=None, total=sum(page.total for page in pages))
+        
+        shard, local_cursor = 0, None
+        if cursor:
+            if not isinstance(cursor, str):
+                raise ValueError(f"Invalid cursor: {cursor}")
+            shard_text, _, local_cursor = cursor.partition(':')
+            if not shard_text.isdigit() or int(shard_text) >= self.shards:
+                raise ValueError(f"Invalid cursor: {cursor}")
+            shard, local_cursor = int(shard_text), local_cursor or None
+        totals = [page.total for page in self._all('read_graph_page', limit=1, entity_types=entity_types)]
+        
+        entities, relations = [], []
+        next_cursor = None
+        skip = offset
+        while shard < self.shards:
+            page = self._request({shard: ('read_graph_page', (), dict(
+                limit=None if limit is None else skip + limit - len(entities), cursor=local_cursor,
+                entity_types=entity_types, relation_types=relation_types
+            ))})[shard]
+            taken = page.entities[skip:]
+            skip = max(skip - len(page.entities), 0)
+            entities.extend(taken)
+            names = {entity.name for entity in taken}
+            relations.extend(relation for relation in page.relations if relation.from_entity in names)
+            if limit is not None and len(entities) >= limit:
+                if page.next_cursor is not None:
+                    next_cursor = f"{shard}:{page.next_cursor}"
+                elif any(totals[shard + 1:]):
+                    next_cursor = f"{shard + 1}:"
+                break
+            shard, local_cursor = shard + 1, None
+        return GraphPage(entities=entities, relations=relations, next_cursor=next_cursor, total=sum(totals))
+    
+    def search_nodes(self, query: str, limit: Optional[int] = None) -> List[Entity]:
+        return [entity for entity, _ in self.search_nodes_scored(query, limit)]
+    
+    def search_nodes_scored(self, query: str, limit: Optional[int] = None,
+                            record_access: bool = True) -> List[Tuple[Entity, float]]:
+        """Best matches across all shards; equal scores keep shard order"""
+        results = self._all('search_nodes_scored', query, limit, record_access=False)
+        scored = list(heapq.merge(*results, key=lambda pair: -pair[1]))
+        if limit is not None:
+            scored = scored[:max(limit, 0)]
+        if record_access and scored:
+            # Only the entities actually returned count as accessed
+            touched = {entity.name: entity for entities in self._routed(
+                'open_nodes', [entity.name for entity, _ in scored], lambda name: name
+            ).values() for entity in entities}
+            scored = [(touched.get(entity.name, entity), score) for entity, score in scored]
+        return scored
+    
+    def get_neighbors(self, name: str, relation_types: Optional[List[str]] = None,
+                      direction: str = 'both') -> List[Relation]:
+        if direction not in ('out', 'in', 'both'):
+            raise ValueError(f"Invalid direction: {direction}")
+        edges = []
+        if direction in ('out', 'both'):
+            owner = self.shard_of(name)
+            edges.extend(self._request({owner: ('get_neighbors', (name, relation_types, 'out'), {})})[owner])
+        if direction in ('in', 'both'):
+            # Incoming relations are stored with their from_entity, on any shard
+            edges.extend(relation for relations in self._all('get_neighbors', name, relation_types, 'in')
+                         for relation in relations if direction == 'in' or relation.from_entity != name)
+        return edges
+    
+    def traverse(self, start_names: List[str], max_depth: int = TRAVERSE_DEPTH,
+                 relation_types: Optional[List[str]] = None, direction: str = 'both',
+                 max_entities: Optional[int] = None) -> Tuple[KnowledgeGraph, Dict[str, int]]:
+        """Breadth-first walk as KnowledgeGraphManager.traverse, one fan-out per hop"""
+        if direction not in ('out', 'in', 'both'):
+            raise ValueError(f"Invalid direction: {direction}")
+        depths = {entity.name: 0 for entity in self.get_entities(start_names)}
+        relations: Dict[Tuple[str, str, str], Relation] = {}
+        frontier = list(depths)
+        
+        depth = 0
+        while frontier and depth < max_depth:
+            depth += 1
+            edges: Dict[str, List[Relation]] = {}
+            for found in self._all('relations_touching', frontier, relation_types, direction):
+                for relation in found:
+                    if direction != 'in':
+                        edges.setdefault(relation.from_entity, []).append(relation)
+                    if direction == 'in' or (direction == 'both' and relation.to_entity != relation.from_entity):
+                        edges.setdefault(relation.to_entity, []).append(relation)
+            next_frontier = []
+            for name in frontier:
+                for relation in edges.get(name, ()):
+                    neighbor = relation.to_entity if relation.from_entity == name else relation.from_entity
+                    if neighbor not in depths:
+                        if max_entities is not None and len(depths) >= max_entities:
+                            continue
+                        depths[neighbor] = depth
+                        next_frontier.append(neighbor)
+                    relations[(relation.from_entity, relation.to_entity, relation.relationType)] = relation
+            frontier = next_frontier
+        
+        subgraph = KnowledgeGraph(entities=self.get_entities(list(depths)), relations=list(relations.values()))
+        return subgraph, depths
+    
+    def prune_entities(self, threshold: Optional[float] = None, count: Optional[int] = None) -> List[str]:
+        """Remove the globally lowest (decayed) weight entities, as KnowledgeGraphManager.prune_entities"""
+        check_prune(threshold, count)
+        if threshold is None and count is None:
+            return []
+        with self._lock.write():
+            candidates = sorted(itertools.chain(*self._all('prune_candidates', threshold, count)))
+            victims = [name for _, name in candidates[:count]]
+            return self.delete_entities(victims) if victims else []
+    
+    def flush_weights(self) -> None:
+        if self._pipes:
+            self._all('flush_weights')
+    
+    def compact(self) -> None:
+        self._all('compact')
+    
+    def changes_since(self, version: int, graph_id: Optional[str] = None) -> GraphChanges:
+        """Like KnowledgeGraphManager.changes_since, but with snapshots only: the shards'
+        changes cannot be put back in one order, so any change means a new snapshot"""
+        current = self._combined_version(self._all('change_version'))
+        if (graph_id, version) == current:
+            return GraphChanges(graph_id=graph_id, version=version, snapshot=False, records=[])
+        parts = self._all('changes_since', -1)
+        graph_id, version = self._combined_version([(part.graph_id, part.version) for part in parts])
+        return GraphChanges(graph_id=graph_id, version=version, snapshot=True,
+                            records=[record for part in parts for record in part.records])
+    
+    @staticmethod
+    def _combined_version(versions: List[Tuple[str, int]]) -> Tuple[str, int]:
+        # Shard versions only grow, so their sum changes whenever any of them does
+        return '-'.join(graph_id for graph_id, _ in versions), sum(version for _, version in versions)
+    
+    def stats(self) -> dict:
+        """Shard stats summed, with the store reported as the shards' backend"""
+        totals = {'shards': self.shards}
+        for shard_stats in self._all('stats'):
+            self._sum_stats(totals, shard_stats)
+        return totals
+    
+    @staticmethod
+    def _sum_stats(totals: dict, stats: dict) -> None:
+        for name, value in stats.items():
+            if isinstance(value, dict):
+                ShardedGraph._sum_stats(totals.setdefault(name, {}), value)
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                totals[name] = totals.get(name, 0) + value
+            else:
+                totals.setdefault(name, value)
+    
+    def close(self) -> None:
+        """Close every shard's manager (flushing weights) and stop the workers"""
+        with self._start_lock:
+            pipes, processes = self._pipes, self._processes
+            self._pipes, self._processes = [], []
+        for shard, pipe in enumerate(pipes):
+            with self._pipe_locks[shard]:
+                try:
+                    pipe.send(('close', (), {}))
+                    pipe.recv()
+                except (EOFError, OSError) as e:
+                    logger.warning("Could not close shard %d: %s", shard, e)
+                pipe.close()
+        for process in processes:
+            process.join()
+
+
+def create_graph(backend: str = MEMORY_BACKEND, shards: int = MEMORY_SHARDS):
+    """The server's default graph: one manager, or with shards > 1 a ShardedGraph"""
+    if shards <= 1:
+        return create_manager(backend)
+    # Capacity caps on the whole graph are split evenly between the shards
+    caps = {name: -(-cap // shards) for name, cap in (('max_entities', MEMORY_MAX_ENTITIES),
+                                                       ('max_file_bytes', MEMORY_MAX_FILE_BYTES)) if cap}
+    return ShardedGraph(MEMORY_DB_PATH if backend == 'sqlite' else MEMORY_FILE_PATH, shards, backend, **caps)
+
+
+knowledge_graph_manager = create_graph()
+namespaces = NamespaceManagers(MEMORY_NAMESPACE_DIR, MEMORY_BACKEND, MEMORY_MAX_NAMESPACES)
+
+
+# Conversation review patterns. Persons are capitalized first + last name
+# pairs; the other categories are recognised by keyword, first mention only.
+# (Same as r'\b[A-Z][a-z]+\s+[A-Z][a-z]+\b', but starting with a character class
+# lets the regex engine skip ahead instead of trying every position.)
+PERSON_PATTERN = re.compile(r'[A-Z](?<!\w[A-Z])[a-z]+\s+[A-Z][a-z]+\b')
+MAX_PERSONS = 10  # Limit to avoid overwhelming
+REVIEW_CHUNK_SIZE = 1024 * 1024  # Characters read at a time from a transcript file
+# Chunked review sessions left idle this many seconds are dropped
+REVIEW_SESSION_TIMEOUT = float(os.getenv('MEMORY_REVIEW_SESSION_TIMEOUT', '3600'))
+# Processes extracting entities for review_conversations (0 = one per CPU)
+REVIEW_WORKERS = int(os.getenv('MEMORY_REVIEW_WORKERS', '0'))
+KEYWORD_CATEGORIES = [
+    ('location', ['office', 'building', 'city', 'street', 'room', 'floor']),
+    ('organization', ['company', 'corporation', 'inc', 'ltd', 'organization', 'team', 'department']),
+    ('concept', ['project', 'meeting', 'task', 'goal', 'plan', 'idea', 'problem']),
+]
+
+
+def _trie_regex(words: List[str]) -> str:
+    """Alternation shaped like a trie, so each position follows one branch per character"""
+    branches: Dict[str, List[str]] = {}
+    terminal = False
+    for word in words:
+        if word:
+            branches.setdefault(word[0], []).append(word[1:])
+        else:
+            terminal = True
+    parts = [re.escape(char) + _trie_regex(rest) for char, rest in sorted(branches.items())]
+    if not parts:
+        return ''
+    if len(parts) == 1 and not terminal:
+        return parts[0]
+    return '(?:' + '|'.join(parts) + ')' + ('?' if terminal else '')
+
+
+_KEYWORDS = [keyword for _, keywords in KEYWORD_CATEGORIES for keyword in keywords]
+# Matches the longest keyword at a position; _KEYWORD_PREFIXES lists every
+# keyword it covers. Scans resume one character after each match start so
+# overlapping keywords are all seen.
+_KEYWORD_PATTERN = re.compile(_trie_regex(_KEYWORDS))
+_KEYWORD_PREFIXES = {
+    keyword: [other for other in _KEYWORDS if keyword.startswith(other)] for keyword in _KEYWORDS
+}
+_KEYWORD_MAX = max(map(len, _KEYWORDS))
+
+
+def _keyword_context(line: str, line_lower: str, keyword: str, position: int) -> Optional[str]:
+    """Up to two words either side of the first word of line containing keyword"""
+    words = line.split()
+    index = None
+    if len(line_lower) == len(line):
+        # The word holding the match: count words that start before it
+        index = len(line[:position].split())
+        if position and not line[position - 1].isspace():
+            index -= 1
+        if not 0 <= index < len(words) or keyword not in words[index].lower():
+            index = None
+    if index is None:
+        # Lowercasing changed the line length; look the word up directly
+        index = next((i for i, word in enumerate(words) if keyword in word.lower()), None)
+        if index is None:
+            return None
+    return ' '.join(words[max(0, index - 2):index + 3]).strip()[:100]
+
+
+# An unfinished line longer than this is compacted (see ConversationExtractor._compact_line_tail)
+_LINE_TAIL_LIMIT = 4096
+# Characters of a word that can show in a keyword context, which is cut at 100
+_CONTEXT_WORD_CHARS = 100
+_WORD = re.compile(r'\S+')
+
+
+def _keywords_in(text_lower: str) -> List[str]:
+    """Every keyword occurring in text_lower, in order of first occurrence"""
+    found: Dict[str, None] = {}
+    match = _KEYWORD_PATTERN.search(text_lower)
+    while match is not None:
+        found.update(dict.fromkeys(_KEYWORD_PREFIXES[match.group()]))
+        match = _KEYWORD_PATTERN.search(text_lower, match.start() + 1)
+    return list(found)
+
+
+# Text at the end of a chunk that may still grow into a person match
+_PERSON_PREFIX = re.compile(r'[A-Z](?<!\w[A-Z])[a-z]*(?:\s+(?:[A-Z][a-z]*)?)?\Z')
+
+
+class ConversationExtractor:
+    """Incremental form of extract_conversation_entities: feed() the text in
+    chunks of any size, then finish(). Only a bounded window of the current
+    (incomplete) line and a person name in progress are held between chunks,
+    and scanning stops once every person slot and keyword has been found."""
+    
+    def __init__(self):
+        self.characters = 0
+        self._persons: List[str] = []
+        # Context of the first line mentioning each keyword (None if no single word holds it)
+        self._contexts: Dict[str, Optional[str]] = {}
+        self._person_tail = ''  # Text not scanned for persons yet
+        self._person_start = 0  # Where scanning _person_tail starts (its first char may be lookbehind context)
+        self._line_tail = ''  # Incomplete last line
+    
+    def feed(self, chunk: str) -> None:
+        self.characters += len(chunk)
+        self._scan_persons(chunk, final=False)
+        self._scan_keywords(chunk, final=False)
+    
+    def finish(self) -> List[dict]:
+        """Return dicts with name, type and observations: persons first (in order of
+        appearance), then one entity per keyword found, in KEYWORD_CATEGORIES order."""
+        self._scan_persons('', final=True)
+        self._scan_keywords('', final=True)
+        extracted = [
+            {'name': person, 'type': 'person', 'observations': ['mentioned in conversation']}
+            for person in self._persons
+        ]
+        for entity_type, keywords in KEYWORD_CATEGORIES:
+            for keyword in keywords:
+                context = self._contexts.get(keyword)
+                if context is not None:
+                    extracted.append({
+                        'name': f"{keyword} from conversation",
+                        'type': entity_type,
+                        'observations': [context]
+                    })
+        return extracted
+    
+    def _scan_persons(self, chunk: str, final: bool) -> None:
+        if len(self._persons) == MAX_PERSONS:
+            return
+        text = self._person_tail + chunk if self._person_tail else chunk
+        position = self._person_start
+        for match in PERSON_PATTERN.finditer(text, position):
+            if match.end() == len(text) and not final:
+                # The name may continue in the next chunk
+                position = match.start()
+                break
+            self._persons.append(match.group().strip())
+            position = match.end()
+            if len(self._persons) == MAX_PERSONS:
+                break
+        else:
+            partial = None if final else _PERSON_PREFIX.search(text, position)
+            position = partial.start() if partial else len(text)
+        
+        if final or len(self._persons) == MAX_PERSONS:
+            self._person_tail = ''
+            return
+        # Keep one character before the resume point for the pattern's lookbehind
+        keep = max(position - 1, 0)
+        self._person_tail = text[keep:]
+        self._person_start = position - keep
+    
+    def _scan_keywords(self, chunk: str, final: bool) -> None:
+        if len(self._contexts) == len(_KEYWORD_PREFIXES):
+            self._line_tail = ''
+            return
+        text = self._line_tail + chunk if self._line_tail else chunk
+        # Keywords and their context never cross lines: scan complete lines only
+        end = len(text) if final else text.rfind('\n') + 1
+        self._line_tail = text[end:]
+        if end:
+            self._scan_lines(text[:end])
+        if len(self._line_tail) > _LINE_TAIL_LIMIT:
+            self._compact_line_tail()
+    
+    def _compact_line_tail(self) -> None:
+        """Shrink the unfinished line to a stand-in with the same outcome.
+        
+        Words followed by two complete words have their full context, so they
+        are scanned now. A keyword context only depends on the words, and on
+        at most the first 100 characters of each, so the tail is rebuilt from
+        the last four complete words and the partial one, single spaced. A
+        long word keeps its first 100 characters plus the keywords it holds
+        (and, for the partial word, its last characters, which may still start
+        one), separated by NULs so they cannot join into other keywords.
+        """
+        tail = self._line_tail
+        words = [(match.start(), match.group()) for match in _WORD.finditer(tail)]
+        partial = words.pop()[1] if words and words[-1][0] + len(words[-1][1]) == len(tail) else None
+        if len(words) > 2:
+            self._scan_lines(tail, limit=len(tail[:words[-2][0]].lower()))
+        
+        def compact(word: str, keep_end: int = 0) -> str:
+            if len(word) <= _CONTEXT_WORD_CHARS + _LINE_TAIL_LIMIT // 32:
+                return word
+            parts = [word[:_CONTEXT_WORD_CHARS], *_keywords_in(word.lower())]
+            if keep_end:
+                parts.append(word[-keep_end:])
+            return '\0'.join(parts)
+        
+        kept = [compact(word) for _, word in words[-4:]]
+        if partial is not None:
+            kept.append(compact(partial, _KEYWORD_MAX - 1))
+        self._line_tail = ' '.join(kept) + ('' if partial is not None else ' ')
+    
+    def _scan_lines(self, text: str, limit: Optional[int] = None) -> None:
+        """Record keywords found in complete lines of text (before position
+        limit of the lowercased text, if given) not already seen, with their context"""
+        contexts = self._contexts
+        text_lower = text.lower()
+        if len(text_lower) == len(text):
+            # One scan of the whole text; offsets line up with the original
+            parts = [(text, text_lower)]
+        else:
+            parts = [(line, line.lower()) for line in text.split('\n')]
+        for part, part_lower in parts:
+            match = _KEYWORD_PATTERN.search(part_lower)
+            while match is not None and len(contexts) < len(_KEYWORD_PREFIXES):
+                position = match.start()
+                if limit is not None and position >= limit:
+                    break
+                keywords = [keyword for keyword in _KEYWORD_PREFIXES[match.group()] if keyword not in contexts]
+                if keywords:
+                    line_start = part_lower.rfind('\n', 0, position) + 1
+                    line_end = part_lower.find('\n', position)
+                    if line_end < 0:
+                        line_end = len(part_lower)
+                    line, line_lower = part[line_start:line_end], part_lower[line_start:line_end]
+                    for keyword in keywords:
+                        contexts[keyword] = _keyword_context(line, line_lower, keyword, position - line_start)
+                match = _KEYWORD_PATTERN.search(part_lower, position + 1)
+
+
+def extract_conversation_entities(conversation: str) -> List[dict]:
+    """Find candidate entities in conversation text in a single pass over it
+    (see ConversationExtractor.finish for the result)"""
+    extractor = ConversationExtractor()
+    extractor.feed(conversation)
+    return extractor.finish()
+
+
+async def run_blocking(func, *args):
+    """Run blocking graph and file work on a worker thread instead of the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(func, *args))
 
 
 async def review_conversation_analysis(conversation: str, manager=None) -> dict:
+    """Analyze conversation text without blocking the event loop (see analyze_conversation)"""
+    return await run_blocking(analyze_conversation, conversation, manager)
+
+
+def analyze_conversation(conversation: str, manager=None) -> dict:
     """
     Analyze conversation text to extract entities, relations, and observations.
     This is a simplified implementation that uses pattern matching for key extraction.
     """
     try:
-        # Use provided manager or default global one
-        if manager is None:
-            manager = knowledge_graph_manager
-        
-        # Simple analysis using basic text processing
-        # In a real implementation, this would use more sophisticated NLP
-        
-        lines = conversation.split('\n')
-        entities_created = []
-        relations_created = []
-        observations_added = []
-        entities_mentioned = set()
-        
-        # Basic pattern matching for common entity types
-        import re
-        
-        # Look for person names (capitalized words)
-        person_pattern = r'\b[A-Z][a-z]+\s+[A-Z][a-z]+\b'
-        # Look for locations
-        location_keywords = ['office', 'building', 'city', 'street', 'room', 'floor']
-        # Look for companies/organizations 
-        org_keywords = ['company', 'corporation', 'inc', 'ltd', 'organization', 'team', 'department']
-        # Look for concepts/topics
-        concept_keywords = ['project', 'meeting', 'task', 'goal', 'plan', 'idea', 'problem']
-        
-        conversation_lower = conversation.lower()
-        
-        # Extract potential entities
-        extracted_entities = []
-        
-        # Find person names
-        person_matches = re.findall(person_pattern, conversation)
-        for person in person_matches[:10]:  # Limit to avoid overwhelming
-            if len(person.split()) == 2:  # Simple first+last name check
-                extracted_entities.append({
-                    'name': person.strip(),
-                    'type': 'person',
-                    'observations': [f'mentioned in conversation']
-                })
-                entities_mentioned.add(person.strip())
-        
-        # Find locations
-        for keyword in location_keywords:
-            if keyword in conversation_lower:
-                # Extract context around the keyword
-                for line in lines:
-                    if keyword in line.lower():
-                        words = line.split()
-                        for i, word in enumerate(words):
-                            if keyword in word.lower():
-                                # Try to extract the full location name
-                                context = ' '.join(words[max(0, i-2):i+3])
-                                location_name = f"{keyword} from conversation"
-                                extracted_entities.append({
-                                    'name': location_name,
-                                    'type': 'location',
-                                    'observations': [context.strip()[:100]]
-                                })
-                                entities_mentioned.add(location_name)
-                                break
-                        break
-        
-        # Find organizations
-        for keyword in org_keywords:
-            if keyword in conversation_lower:
-                for line in lines:
-                    if keyword in line.lower():
-                        words = line.split()
-                        for i, word in enumerate(words):  
-                            if keyword in word.lower():
-                                context = ' '.join(words[max(0, i-2):i+3])
-                                org_name = f"{keyword} from conversation"
-                                extracted_entities.append({
-                                    'name': org_name,
-                                    'type': 'organization', 
-                                    'observations': [context.strip()[:100]]
-                                })
-                                entities_mentioned.add(org_name)
-                                break
-                        break
-        
-        # Find concepts
-        for keyword in concept_keywords:
-            if keyword in conversation_lower:
-                for line in lines:
-                    if keyword in line.lower():
-                        words = line.split()
-                        for i, word in enumerate(words):
-                            if keyword in word.lower():
-                                context = ' '.join(words[max(0, i-2):i+3])
-                                concept_name = f"{keyword} from conversation"
-                                extracted_entities.append({
-                                    'name': concept_name,
-                                    'type': 'concept',
-                                    'observations': [context.strip()[:100]]
-                                })
-                                entities_mentioned.add(concept_name)
-                                break
-                        break
-        
-        # Create unique entities (avoid duplicates)
-        unique_entities = []
-        seen_names = set()
-        for entity in extracted_entities:
-            if entity['name'] not in seen_names:
-                unique_entities.append(entity)
-                seen_names.add(entity['name'])
-        
-        # Convert to Entity objects and create them
-        entity_objects = []
-        for entity_data in unique_entities:
-            entity = Entity(
+        return store_conversation_entities(extract_conversation_entities(conversation), manager)
+    except Exception as e:
+        return {
+            "success": False,
+            "error": f"Conversation analysis failed: {str(e)}"
+        }
+
+
+def extract_conversation_file(path: str) -> List[dict]:
+    """Find candidate entities in a transcript file, reading it in chunks"""
+    extractor = ConversationExtractor()
+    # newline='' keeps the text exactly as a conversation string would have it
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        for chunk in iter(functools.partial(f.read, REVIEW_CHUNK_SIZE), ''):
+            extractor.feed(chunk)
+    return extractor.finish()
+
+
+def analyze_conversation_file(path: str, manager=None) -> dict:
+    """Analyze a conversation transcript file, reading it in chunks (see analyze_conversation)"""
+    try:
+        return store_conversation_entities(extract_conversation_file(path), manager)
+    except Exception as e:
+        return {
+            "success": False,
+            "error": f"Conversation analysis failed: {str(e)}"
+        }
+
+
+def conversation_changes(extracted_entities: List[dict]) -> Tuple[List[Entity], List[Relation], List[str]]:
+    """What reviewing one conversation stores: its entities (first mention of a
+    name wins), relations between them, and the names whose weights are bumped"""
+    # Create unique entities (avoid duplicates)
+    entity_objects = []
+    seen_names = set()
+    for entity_data in extracted_entities:
+        if entity_data['name'] not in seen_names:
+            seen_names.add(entity_data['name'])
+            entity_objects.append(Entity(
                 name=entity_data['name'],
                 entityType=entity_data['type'],
                 observations=entity_data['observations'],
                 weight=1  # Start with weight 1 for new entities
-            )
-            entity_objects.append(entity)
-        
+            ))
+    
+    # Create "mentioned_with" relations between entities found in the same conversation
+    relations = []
+    for i, entity1 in enumerate(entity_objects):
+        for entity2 in entity_objects[i+1:]:
+            if entity1.entityType != entity2.entityType:  # Don't relate same types
+                relations.append(Relation(
+                    from_entity=entity1.name,
+                    to_entity=entity2.name,
+                    relationType="mentioned_with"
+                ))
+    
+    return entity_objects, relations[:5], [entity.name for entity in entity_objects]  # Limit relations
+
+
+def store_conversation_entities(extracted_entities: List[dict], manager=None) -> dict:
+    """Create extracted conversation entities and relations between them, and bump their weights"""
+    # Use provided manager or default global one
+    if manager is None:
+        manager = knowledge_graph_manager
+    
+    entity_objects, relations, entities_mentioned = conversation_changes(extracted_entities)
+    
+    # One atomic update for everything the review stores
+    with manager.batch():
         if entity_objects:
             manager.create_entities(entity_objects)
-            entities_created = [entity.name for entity in entity_objects]
-        
-        # Create some basic relations if we have multiple entities
-        if len(entity_objects) >= 2:
-            relations = []
-            # Create "mentioned_with" relations between entities found in the same conversation
-            for i, entity1 in enumerate(entity_objects):
-                for entity2 in entity_objects[i+1:]:
-                    if entity1.entityType != entity2.entityType:  # Don't relate same types
-                        relation = Relation(
-                            from_entity=entity1.name,
-                            to_entity=entity2.name,
-                            relationType="mentioned_with"
-                        )
-                        relations.append(relation)
-            
-            if relations:
-                manager.create_relations(relations[:5])  # Limit relations
-                relations_created = [(r.from_entity, r.to_entity, r.relationType) for r in relations[:5]]
-        
+        if relations:
+            manager.create_relations(relations)
         # Increment weights for all mentioned entities (existing ones)
         if entities_mentioned:
-            existing_entity_names = list(entities_mentioned)
-            manager.increment_weights(existing_entity_names)
-        
+            manager.increment_weights(entities_mentioned)
+    
+    entities_created = [entity.name for entity in entity_objects]
+    relations_created = [(r.from_entity, r.to_entity, r.relationType) for r in relations]
+    return {
+        "success": True,
+        "entities_created": entities_created,
+        "relations_created": relations_created,
+        "observations_added": [],
+        "entities_mentioned": entities_mentioned,
+        "summary": f"Extracted {len(entities_created)} entities, {len(relations_created)} relations, and incremented weights for {len(entities_mentioned)} mentioned entities"
+    }
+
+
+def _extract_transcript(source: Tuple[str, str]) -> Tuple[Optional[List[dict]], Optional[str]]:
+    """Process pool job of review_conversations: ('path', path) or ('text', conversation)
+    to (extracted entities, None), or (None, error message)"""
+    kind, value = source
+    try:
+        if kind == 'path':
+            return extract_conversation_file(value), None
+        return extract_conversation_entities(value), None
+    except Exception as e:
+        return None, str(e)
+
+
+def review_conversations(paths: Iterable[str] = (), conversations: Iterable[str] = (),
+                         manager=None, workers: int = REVIEW_WORKERS) -> dict:
+    """Review many transcripts (files and/or texts) in one go.
+    
+    Entities are extracted in a pool of worker processes; each transcript's
+    changes are then stored as its own batch, in order, ending up as if each
+    had been reviewed in turn. Transcripts that cannot be read, or whose
+    write the capacity limits refuse, are reported and skipped.
+    """
+    if manager is None:
+        manager = knowledge_graph_manager
+    
+    paths, conversations = list(paths), list(conversations)
+    sources = [('path', path) for path in paths] + [('text', text) for text in conversations]
+    workers = min(workers or os.cpu_count() or 1, len(sources))
+    if workers > 1:
+        # spawn: the server process runs threads, which fork does not mix with
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            extracted = list(pool.map(_extract_transcript, sources,
+                                      chunksize=max(1, len(sources) // (workers * 4))))
+    else:
+        extracted = [_extract_transcript(source) for source in sources]
+    
+    created: List[str] = []
+    relations_created = 0
+    mentions: set = set()
+    failed = []
+    for index, ((kind, value), (found, error)) in enumerate(zip(sources, extracted)):
+        source = value if kind == 'path' else f"conversations[{index - len(paths)}]"
+        if error is not None:
+            failed.append({"source": source, "error": error})
+            continue
+        entity_objects, relation_objects, mentioned = conversation_changes(found)
+        try:
+            # One atomic update per transcript, as review_conversation stores it
+            with manager.batch():
+                names = manager.create_entities(entity_objects) if entity_objects else []
+                count = manager.create_relations(relation_objects) if relation_objects else 0
+                if mentioned:
+                    manager.increment_weights(mentioned)
+        except Exception as e:
+            failed.append({"source": source, "error": f"Storing the review failed: {e}"})
+            continue
+        created += names
+        relations_created += count
+        mentions.update(mentioned)
+    
+    reviewed = len(sources) - len(failed)
+    return {
+        "success": True,
+        "reviewed": reviewed,
+        "failed": failed,
+        "entities_created": len(created),
+        "relations_created": relations_created,
+        "entities_mentioned": len(mentions),
+        "summary": f"Reviewed {reviewed} of {len(sources)} conversations: created {len(created)} entities and "
+                   f"{relations_created} relations, and incremented weights for {len(mentions)} mentioned entities"
+    }
+
+
+class ReviewSessions:
+    """Chunked conversation reviews in progress (begin / append / finish), by session id"""
+    
+    def __init__(self, idle_timeout: float = 3600.0):
+        self.idle_timeout = idle_timeout
+        self._sessions: Dict[str, Tuple[ConversationExtractor, float]] = {}
+        self._lock = threading.Lock()
+    
+    def begin(self) -> str:
+        now = time.monotonic()
+        with self._lock:
+            # Drop sessions whose client went away without finishing them
+            for session_id, (_, last_used) in list(self._sessions.items()):
+                if now - last_used > self.idle_timeout:
+                    del self._sessions[session_id]
+            session_id = uuid.uuid4().hex
+            self._sessions[session_id] = (ConversationExtractor(), now)
+        return session_id
+    
+    def append(self, session_id: str, chunk: str) -> int:
+        """Feed the next chunk of a session's conversation; returns characters received so far"""
+        with self._lock:
+            extractor = self._get(session_id)
+            extractor.feed(chunk)
+            self._sessions[session_id] = (extractor, time.monotonic())
+            return extractor.characters
+    
+    def finish(self, session_id: str) -> ConversationExtractor:
+        with self._lock:
+            extractor = self._get(session_id)
+            del self._sessions[session_id]
+            return extractor
+    
+    def _get(self, session_id: str) -> ConversationExtractor:
+        try:
+            return self._sessions[session_id][0]
+        except KeyError:
+            raise ValueError(f"Unknown or expired review session: {session_id}") from None
+
+
+review_sessions = ReviewSessions(REVIEW_SESSION_TIMEOUT)
+
+
+def entity_projection(entity: Entity, projection: str = "full"):
+    """JSON-ready view of an entity without copying its observations"""
+    if projection == "full":
         return {
-            "success": True,
-            "entities_created": entities_created,
-            "relations_created": relations_created,
-            "observations_added": observations_added,
-            "entities_mentioned": list(entities_mentioned),
-            "summary": f"Extracted {len(entities_created)} entities, {len(relations_created)} relations, and incremented weights for {len(entities_mentioned)} mentioned entities"
+            "name": entity.name,
+            "entityType": entity.entityType,
+            "observations": entity.observations,
+            "weight": entity.weight,
+            "last_accessed": entity.last_accessed
         }
-        
-    except Exception as e:
+    if projection == "summary":
         return {
-            "success": False,
-            "error": f"Conversation analysis failed: {str(e)}"
+            "name": entity.name,
+            "entityType": entity.entityType,
+            "observation_count": len(entity.observations),
+            "weight": entity.weight,
+            "last_accessed": entity.last_accessed
         }
+    if projection == "names":
+        return entity.name
+    raise ValueError(f"Unknown projection: {projection}")
+
+
+def entity_json_body(entity: Entity) -> str:
+    """json_members() of an entity's full projection up to its weight fields, which
+    change on every access and are added by entities_json"""
+    return json_members({"name": entity.name, "entityType": entity.entityType,
+                         "observations": entity.observations})
+
+
+def entities_json(entities: List[Entity], bodies: Optional[List[str]] = None,
+                  scores: Optional[List[float]] = None) -> str:
+    """JSON array of entities' full projections (plus a score each if given),
+    completing their entity_json_body if given"""
+    items = []
+    for i, entity in enumerate(entities):
+        current = {"weight": entity.weight, "last_accessed": entity.last_accessed}
+        if scores is not None:
+            current["score"] = scores[i]
+        items.append(json_object(bodies[i] if bodies is not None else entity_json_body(entity), current))
+    return json_array(items)
+
+
+def graph_page_json(page: GraphPage, projection: str = "full", include_relations: bool = True,
+                    include_paging: bool = True) -> Iterator[str]:
+    """Serialize a graph page piece by piece, one entity or relation at a time"""
+    yield '{"entities":['
+    for i, entity in enumerate(page.entities):
+        yield (',' if i else '') + json_dumps(entity_projection(entity, projection))
+    yield ']'
+    
+    if include_relations:
+        yield ',"relations":['
+        for i, relation in enumerate(page.relations):
+            yield (',' if i else '') + json_dumps({
+                "from_entity": relation.from_entity,
+                "to_entity": relation.to_entity,
+                "relationType": relation.relationType
+            })
+        yield ']'
+    
+    if include_paging:
+        yield ',' + json_members({"next_cursor": page.next_cursor, "total": page.total})
+    yield '}'
 
 
 # MCP Server setup
+# Upper bounds (seconds) of the tool latency histogram buckets; one more counts the rest
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_METRIC_TOOLS = 64  # Further unknown tool names are counted together as "other"
+
+
+class ServerMetrics:
+    """Per-tool call counts, failures, latency histograms and response sizes (in characters of JSON text)"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self._tools: Dict[str, dict] = {}
+    
+    def record_call(self, tool: str, seconds: float, response_chars: int, failed: bool) -> None:
+        with self._lock:
+            if tool not in self._tools and len(self._tools) >= MAX_METRIC_TOOLS:
+                tool = 'other'
+            stats = self._tools.get(tool)
+            if stats is None:
+                stats = self._tools[tool] = {
+                    'calls': 0,
+                    'errors': 0,
+                    'latency_sum': 0.0,
+                    'latency_max': 0.0,
+                    'latency_buckets': [0] * (len(LATENCY_BUCKETS) + 1),
+                    'response_chars': 0,
+                    'response_chars_max': 0
+                }
+            stats['calls'] += 1
+            stats['errors'] += failed
+            stats['latency_sum'] += seconds
+            stats['latency_max'] = max(stats['latency_max'], seconds)
+            stats['latency_buckets'][bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            stats['response_chars'] += response_chars
+            stats['response_chars_max'] = max(stats['response_chars_max'], response_chars)
+    
+    def snapshot(self) -> Dict[str, dict]:
+        """Copy of the per-tool stats, with latency percentiles estimated from the buckets"""
+        with self._lock:
+            tools = {tool: {**stats, 'latency_buckets': list(stats['latency_buckets'])}
+                     for tool, stats in self._tools.items()}
+        for stats in tools.values():
+            for name, fraction in (('latency_p50', 0.5), ('latency_p95', 0.95), ('latency_p99', 0.99)):
+                stats[name] = self._percentile(stats, fraction)
+        return tools
+    
+    @staticmethod
+    def _percentile(stats: dict, fraction: float) -> float:
+        # Upper bound of the bucket holding the percentile (the max for the last one)
+        rank = fraction * stats['calls']
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, stats['latency_buckets']):
+            seen += count
+            if seen >= rank:
+                return min(bound, stats['latency_max'])
+        return stats['latency_max']
+    
+    def reset(self) -> None:
+        with self._lock:
+            self._tools = {}
+
+
+metrics = ServerMetrics()
+
+
+def server_stats(manager=None) -> dict:
+    """Tool metrics plus graph and storage gauges, as returned by the server_stats tool"""
+    manager = manager or knowledge_graph_manager
+    return {
+        "uptime_seconds": time.time() - metrics.started,
+        "json_codec": JSON_CODEC,
+        "tools": metrics.snapshot(),
+        "graph": manager.stats(),
+        "namespaces": namespaces.stats()
+    }
+
+
+def _prometheus_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_text(stats: dict) -> str:
+    """Render server_stats() in the Prometheus text exposition format"""
+    lines = ["# TYPE memory_uptime_seconds gauge", f"memory_uptime_seconds {stats['uptime_seconds']:.3f}"]
+    tools = sorted((f'tool="{_prometheus_label(tool)}"', tool_stats) for tool, tool_stats in stats['tools'].items())
+    for metric, key in (('memory_tool_calls_total', 'calls'), ('memory_tool_errors_total', 'errors'),
+                        ('memory_tool_response_chars_total', 'response_chars')):
+        lines.append(f"# TYPE {metric} counter")
+        lines.extend(f"{metric}{{{label}}} {tool_stats[key]}" for label, tool_stats in tools)
+    lines.append("# TYPE memory_tool_latency_seconds histogram")
+    for label, tool_stats in tools:
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), tool_stats['latency_buckets']):
+            cumulative += count
+            lines.append(f'memory_tool_latency_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+        lines.append(f"memory_tool_latency_seconds_sum{{{label}}} {tool_stats['latency_sum']:.6f}")
+        lines.append(f"memory_tool_latency_seconds_count{{{label}}} {tool_stats['calls']}")
+    graph = stats['graph']
+    for name in ('entities', 'relations', 'graph_bytes', 'pending_weight_updates'):
+        lines.append(f"# TYPE memory_{name} gauge")
+        lines.append(f"memory_{name} {graph[name]}")
+    for name, value in graph['result_cache'].items():
+        metric, kind = (f"memory_result_cache_{name}", "gauge") if name in ('entries', 'max_entries') \
+            else (f"memory_result_cache_{name}_total", "counter")
+        lines.append(f"# TYPE {metric} {kind}")
+        lines.append(f"{metric} {value}")
+    for name, value in stats['namespaces'].items():
+        metric, kind = (f"memory_namespaces_{name}", "gauge") if name in ('loaded', 'max_loaded') \
+            else (f"memory_namespace_{name}_total", "counter")
+        lines.append(f"# TYPE {metric} {kind}")
+        lines.append(f"{metric} {value}")
+    store = graph['store']
+    backend = f'backend="{_prometheus_label(store.get("backend", ""))}"'
+    for name, value in store.items():
+        if isinstance(value, (int, float)):
+            # The *_bytes sizes are gauges, the rest count I/O since start
+            metric, kind = (f"memory_store_{name}", "gauge") if name.endswith('_bytes') \
+                else (f"memory_store_{name}_total", "counter")
+            lines.append(f"# TYPE {metric} {kind}")
+            lines.append(f"{metric}{{{backend}}} {value}")
+    return '\n'.join(lines) + '\n'
+
+
+def _write_stats_file(path: Path, stats_format: str) -> None:
+    stats = server_stats()
+    text = prometheus_text(stats) if stats_format == 'prometheus' else json_dumps(stats)
+    fd, tmp_name = tempfile.mkstemp(prefix=path.name + '.', suffix='.tmp', dir=path.parent)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_name, path)
+    finally:
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+
+
+def start_stats_dump(path: str, interval: float, stats_format: str = 'json') -> threading.Event:
+    """Rewrite path with server_stats() every interval seconds on a daemon thread;
+    set the returned event to stop it"""
+    stop = threading.Event()
+    stats_path = Path(path)
+    stats_path.parent.mkdir(parents=True, exist_ok=True)
+    
+    def run():
+        while True:
+            stopping = stop.wait(interval)
+            try:
+                _write_stats_file(stats_path, stats_format)
+            except OSError as e:
+                logger.warning("Could not write stats file %s: %s", stats_path, e)
+            if stopping:
+                return
+    
+    threading.Thread(target=run, name='memory-stats', daemon=True).start()
+    return stop
+
+
+def _failed_response(response: list) -> bool:
+    # Tools report errors in-band as {"success": false, ...}
+    text = response[0].get("text", "") if response and isinstance(response[0], dict) else ""
+    return text.startswith(('{"success":false', '{"success": false'))
+
+
 app = Server("memory-server")
 
 # Tool handlers using the official MCP SDK pattern
 @app.call_tool()
 async def handle_tool_call(name: str, arguments: dict) -> list:
     """Handle tool calls from MCP clients"""
+    start = time.perf_counter()
+    response = None
+    try:
+        # Tools block on locks and file I/O; run them on worker threads so
+        # concurrent requests are not serialized behind the event loop
+        response = await run_blocking(call_tool, name, arguments)
+        return response
+    finally:
+        size = sum(len(item.get("text", "")) for item in response if isinstance(item, dict)) if response else 0
+        metrics.record_call(name, time.perf_counter() - start, size,
+                            response is None or _failed_response(response))
+
+
+# Mutation tools apply_batch accepts: the argument holding their items, and the
+# string fields each item needs (prune_entities takes a threshold and/or count instead)
+BATCH_OPERATIONS = {
+    "create_entities": ("entities", ("name", "entityType")),
+    "create_relations": ("relations", ("from_entity", "to_entity", "relationType")),
+    "add_observations": ("observations", ("entityName", "observation")),
+    "delete_entities": ("entity_names", None),
+    "delete_observations": ("deletions", ("entityName", "observation")),
+    "delete_relations": ("relations", ("from_entity", "to_entity", "relationType")),
+    "prune_entities": ("threshold", None),
+}
+
+
+def validate_operation(operation) -> Optional[str]:
+    """Check the shape of one apply_batch operation; returns an error message or None"""
+    if not isinstance(operation, dict):
+        return "operation must be an object"
+    tool = operation.get("tool")
+    if tool not in BATCH_OPERATIONS:
+        return f"unsupported tool: {tool}"
+    arguments = operation.get("arguments")
+    if not isinstance(arguments, dict):
+        return "arguments must be an object"
+    argument, fields = BATCH_OPERATIONS[tool]
+    value = arguments.get(argument)
+    
+    if tool == "prune_entities":
+        count = arguments.get("count")
+        if value is None and count is None:
+            return "threshold or count is required"
+        try:
+            check_prune(value, count)
+        except ValueError as e:
+            return str(e)
+        return None
+    if not isinstance(value, list):
+        return f"{argument} must be an array"
+    for i, item in enumerate(value):
+        if fields is None:
+            if not isinstance(item, str):
+                return f"{argument}[{i}] must be a string"
+            continue
+        if not isinstance(item, dict):
+            return f"{argument}[{i}] must be an object"
+        for field in fields:
+            if not isinstance(item.get(field), str):
+                return f"{argument}[{i}].{field} must be a string"
+        if tool == "create_entities":
+            observations = item.get("observations", [])
+            if not isinstance(observations, list) or not all(isinstance(o, str) for o in observations):
+                return f"{argument}[{i}].observations must be an array of strings"
+            weight = item.get("weight", 0)
+            if isinstance(weight, bool) or not isinstance(weight, int):
+                return f"{argument}[{i}].weight must be an integer"
+    return None
+
+
+def apply_operation(manager: KnowledgeGraphManager, tool: str, arguments: dict) -> dict:
+    """Run one (validated) apply_batch operation against manager and describe what it changed"""
+    if tool == "create_entities":
+        created = manager.create_entities([
+            Entity(
+                name=entity_data['name'],
+                entityType=entity_data['entityType'],
+                observations=list(entity_data.get('observations', [])),
+                weight=entity_data.get('weight', 0)
+            )
+            for entity_data in arguments["entities"]
+        ])
+        return {"applied": len(created), "skipped": len(arguments["entities"]) - len(created), "entities": created}
+    if tool == "create_relations":
+        applied = manager.create_relations([
+            Relation(
+                from_entity=relation_data['from_entity'],
+                to_entity=relation_data['to_entity'],
+                relationType=relation_data['relationType']
+            )
+            for relation_data in arguments["relations"]
+        ])
+        return {"applied": applied, "skipped": len(arguments["relations"]) - applied}
+    if tool == "add_observations":
+        applied = manager.add_observations(arguments["observations"])
+        return {"applied": applied, "skipped": len(arguments["observations"]) - applied}
+    if tool == "delete_entities":
+        deleted = manager.delete_entities(arguments["entity_names"])
+        return {"applied": len(deleted), "skipped": len(set(arguments["entity_names"])) - len(deleted),
+                "entities": deleted}
+    if tool == "delete_observations":
+        applied = manager.delete_observations(arguments["deletions"])
+        return {"applied": applied, "skipped": len(arguments["deletions"]) - applied}
+    if tool == "delete_relations":
+        applied = manager.delete_relations(arguments["relations"])
+        return {"applied": applied, "skipped": len(arguments["relations"]) - applied}
+    if tool == "prune_entities":
+        pruned = manager.prune_entities(arguments.get("threshold"), arguments.get("count"))
+        return {"applied": len(pruned), "skipped": 0, "entities": pruned}
+    raise ValueError(f"Unsupported batch operation: {tool}")
+
+
+def call_tool(name: str, arguments: dict) -> list:
+    """Execute one tool call synchronously, against the graph of its namespace argument"""
+    namespace = arguments.get("namespace")
+    if not namespace:
+        return _call_tool(knowledge_graph_manager, name, arguments)
+    try:
+        manager = namespaces.acquire(namespace)
+    except Exception as e:
+        return [{"type": "text", "text": json_dumps({"success": False, "error": str(e)})}]
+    try:
+        return _call_tool(manager, name, arguments)
+    finally:
+        namespaces.release(namespace)
+
+
+def _call_tool(manager: KnowledgeGraphManager, name: str, arguments: dict) -> list:
     
     if name == "create_entities":
         try:
@@ -455,10 +4132,10 @@ async def handle_tool_call(name: str, arguments: dict) -> list:
                 )
                 entity_objects.append(entity)
             
-            knowledge_graph_manager.create_entities(entity_objects)
-            return [{"type": "text", "text": json.dumps({"success": True, "message": f"Created {len(entity_objects)} entities"})}]
+            manager.create_entities(entity_objects)
+            return [{"type": "text", "text": json_dumps({"success": True, "message": f"Created {len(entity_objects)} entities"})}]
         except Exception as e:
-            return [{"type": "text", "text": json.dumps({"success": False, "error": str(e)})}]
+            return [{"type": "text", "text": json_dumps({"success": False, "error": str(e)})}]
     
     elif name == "create_relations":
         try:
@@ -472,112 +4149,272 @@ async def handle_tool_call(name: str, arguments: dict) -> list:
                 )
                 relation_objects.append(relation)
             
-            knowledge_graph_manager.create_relations(relation_objects)
-            return [{"type": "text", "text": json.dumps({"success": True, "message": f"Created {len(relation_objects)} relations"})}]
+            manager.create_relations(relation_objects)
+            return [{"type": "text", "text": json_dumps({"success": True, "message": f"Created {len(relation_objects)} relations"})}]
         except Exception as e:
-            return [{"type": "text", "text": json.dumps({"success": False, "error": str(e)})}]
+            return [{"type": "text", "text": json_dumps({"success": False, "error": str(e)})}]
     
     elif name == "add_observations":
         try:
             observations = arguments.get("observations", [])
-            knowledge_graph_manager.add_observations(observations)
-            return [{"type": "text", "text": json.dumps({"success": True, "message": f"Added {len(observations)} observations"})}]
+            manager.add_observations(observations)
+            return [{"type": "text", "text": json_dumps({"success": True, "message": f"Added {len(observations)} observations"})}]
         except Exception as e:
-            return [{"type": "text", "text": json.dumps({"success": False, "error": str(e)})}]
+            return [{"type": "text", "text": json_dumps({"success": False, "error": str(e)})}]
     
     elif name == "delete_entities":
         try:
             entity_names = arguments.get("entity_names", [])
-            knowledge_graph_manager.delete_entities(entity_names)
-            return [{"type": "text", "text": json.dumps({"success": True, "message": f"Deleted {len(entity_names)} entities"})}]
+            manager.delete_entities(entity_names)
+            return [{"type": "text", "text": json_dumps({"success": True, "message": f"Deleted {len(entity_names)} entities"})}]
         except Exception as e:
-            return [{"type": "text", "text": json.dumps({"success": False, "error": str(e)})}]
+            return [{"type": "text", "text": json_dumps({"success": False, "error": str(e)})}]
     
     elif name == "delete_observations":
         try:
             deletions = arguments.get("deletions", [])
-            knowledge_graph_manager.delete_observations(deletions)
-            return [{"type": "text", "text": json.dumps({"success": True, "message": f"Deleted {len(deletions)} observations"})}]
+            manager.delete_observations(deletions)
+            return [{"type": "text", "text": json_dumps({"success": True, "message": f"Deleted {len(deletions)} observations"})}]
         except Exception as e:
-            return [{"type": "text", "text": json.dumps({"success": False, "error": str(e)})}]
+            return [{"type": "text", "text": json_dumps({"success": False, "error": str(e)})}]
     
     elif name == "delete_relations":
         try:
             relations = arguments.get("relations", [])
-            knowledge_graph_manager.delete_relations(relations)
-            return [{"type": "text", "text": json.dumps({"success": True, "message": f"Deleted {len(relations)} relations"})}]
+            manager.delete_relations(relations)
+            return [{"type": "text", "text": json_dumps({"success": True, "message": f"Deleted {len(relations)} relations"})}]
         except Exception as e:
-            return [{"type": "text", "text": json.dumps({"success": False, "error": str(e)})}]
+            return [{"type": "text", "text": json_dumps({"success": False, "error": str(e)})}]
     
     elif name == "read_graph":
         try:
-            graph = knowledge_graph_manager.read_graph()
-            graph_dict = {
-                "entities": [asdict(entity) for entity in graph.entities],
-                "relations": [asdict(relation) for relation in graph.relations]
-            }
-            return [{"type": "text", "text": json.dumps(graph_dict)}]
+            page = manager.read_graph_page(
+                offset=arguments.get("offset", 0),
+                limit=arguments.get("limit"),
+                cursor=arguments.get("cursor"),
+                entity_types=arguments.get("entity_types"),
+                relation_types=arguments.get("relation_types")
+            )
+            paged = any(key in arguments for key in ("offset", "limit", "cursor", "entity_types"))
+            chunks = graph_page_json(
+                page,
+                projection=arguments.get("projection", "full"),
+                include_relations=arguments.get("include_relations", True),
+                include_paging=paged
+            )
+            return [{"type": "text", "text": ''.join(chunks)}]
         except Exception as e:
-            return [{"type": "text", "text": json.dumps({"success": False, "error": str(e)})}]
+            return [{"type": "text", "text": json_dumps({"success": False, "error": str(e)})}]
     
     elif name == "search_nodes":
         try:
             query = arguments.get("query", "")
-            entities = knowledge_graph_manager.search_nodes(query)
-            entities_dict = [asdict(entity) for entity in entities]
+            limit = arguments.get("limit")
+            entities, count = manager.search_nodes_json(query, limit, arguments.get("include_scores", False))
+            return [{"type": "text", "text": json_object({"success": True}, ("entities", entities), {"count": count})}]
+        except Exception as e:
+            return [{"type": "text", "text": json_dumps({"success": False, "error": str(e)})}]
+    
+    elif name == "open_nodes":
+        try:
+            names = arguments.get("names", [])
+            entities, count = manager.open_nodes_json(names)
+            return [{"type": "text", "text": json_object({"success": True}, ("entities", entities), {"count": count})}]
+        except Exception as e:
+            return [{"type": "text", "text": json_dumps({"success": False, "error": str(e)})}]
+    
+    elif name == "get_changes_since":
+        try:
+            version = arguments.get("version", 0)
+            if not isinstance(version, int) or isinstance(version, bool):
+                raise ValueError("version must be an integer")
+            changes = manager.changes_since(version, arguments.get("graph_id"))
             result = {
                 "success": True,
-                "entities": entities_dict,
-                "count": len(entities)
+                "graph_id": changes.graph_id,
+                "version": changes.version,
+                "snapshot": changes.snapshot,
+                "records": changes.records
             }
-            return [{"type": "text", "text": json.dumps(result)}]
+            return [{"type": "text", "text": json_dumps(result)}]
         except Exception as e:
-            return [{"type": "text", "text": json.dumps({"success": False, "error": str(e)})}]
+            return [{"type": "text", "text": json_dumps({"success": False, "error": str(e)})}]
     
-    elif name == "open_nodes":
+    elif name == "get_neighbors":
         try:
-            names = arguments.get("names", [])
-            entities = knowledge_graph_manager.open_nodes(names)
-            entities_dict = [asdict(entity) for entity in entities]
+            relations = manager.get_neighbors(
+                arguments["name"],
+                relation_types=arguments.get("relation_types"),
+                direction=arguments.get("direction", "both")
+            )
+            neighbors = []
+            for relation in relations:
+                neighbor = relation.to_entity if relation.from_entity == arguments["name"] else relation.from_entity
+                if neighbor not in neighbors:
+                    neighbors.append(neighbor)
+            result = {
+                "success": True,
+                "neighbors": neighbors,
+                "relations": relations,
+                "count": len(neighbors)
+            }
+            return [{"type": "text", "text": json_dumps(result)}]
+        except Exception as e:
+            return [{"type": "text", "text": json_dumps({"success": False, "error": str(e)})}]
+    
+    elif name == "traverse":
+        try:
+            subgraph, depths = manager.traverse(
+                arguments.get("start", []),
+                max_depth=arguments.get("max_depth", TRAVERSE_DEPTH),
+                relation_types=arguments.get("relation_types"),
+                direction=arguments.get("direction", "both"),
+                max_entities=arguments.get("max_entities")
+            )
             result = {
                 "success": True,
-                "entities": entities_dict,
-                "count": len(entities)
+                "entities": subgraph.entities,
+                "relations": subgraph.relations,
+                "depths": depths
             }
-            return [{"type": "text", "text": json.dumps(result)}]
+            return [{"type": "text", "text": json_dumps(result)}]
         except Exception as e:
-            return [{"type": "text", "text": json.dumps({"success": False, "error": str(e)})}]
+            return [{"type": "text", "text": json_dumps({"success": False, "error": str(e)})}]
     
     elif name == "prune_entities":
         try:
-            threshold = arguments.get("threshold", 0)
-            pruned_names = knowledge_graph_manager.prune_entities(threshold)
+            count = arguments.get("count")
+            threshold = arguments.get("threshold", 0 if count is None else None)
+            check_prune(threshold, count)
+            pruned_names = manager.prune_entities(threshold, count)
+            criteria = []
+            if threshold is not None:
+                criteria.append(f"with weight < {threshold}")
+            if count is not None:
+                criteria.append(f"(at most {count}, lowest weight first)")
             result = {
                 "success": True,
                 "pruned_entities": pruned_names,
                 "count": len(pruned_names),
-                "message": f"Pruned {len(pruned_names)} entities with weight < {threshold}"
+                "message": f"Pruned {len(pruned_names)} entities {' '.join(criteria)}"
             }
-            return [{"type": "text", "text": json.dumps(result)}]
+            return [{"type": "text", "text": json_dumps(result)}]
         except Exception as e:
-            return [{"type": "text", "text": json.dumps({"success": False, "error": str(e)})}]
+            return [{"type": "text", "text": json_dumps({"success": False, "error": str(e)})}]
     
     elif name == "review_conversation":
         try:
-            conversation = arguments.get("conversation", "")
-            result = await review_conversation_analysis(conversation)
-            return [{"type": "text", "text": json.dumps(result)}]
+            if arguments.get("conversation_path"):
+                result = analyze_conversation_file(arguments["conversation_path"], manager)
+            else:
+                conversation = arguments.get("conversation", "")
+                result = analyze_conversation(conversation, manager)
+            return [{"type": "text", "text": json_dumps(result)}]
+        except Exception as e:
+            return [{"type": "text", "text": json_dumps({"success": False, "error": str(e)})}]
+    
+    elif name == "review_conversations":
+        try:
+            paths = arguments.get("conversation_paths", [])
+            conversations = arguments.get("conversations", [])
+            for argument, values in (("conversation_paths", paths), ("conversations", conversations)):
+                if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+                    raise ValueError(f"{argument} must be an array of strings")
+            result = review_conversations(paths, conversations, manager, arguments.get("workers") or REVIEW_WORKERS)
+            return [{"type": "text", "text": json_dumps(result)}]
+        except Exception as e:
+            return [{"type": "text", "text": json_dumps({"success": False, "error": str(e)})}]
+    
+    elif name == "apply_batch":
+        try:
+            operations = arguments.get("operations", [])
+            # Reject the whole batch before touching the graph if any operation is malformed
+            errors = []
+            for index, operation in enumerate(operations):
+                error = validate_operation(operation)
+                if error is not None:
+                    errors.append({"index": index, "error": error})
+            if errors:
+                result = {
+                    "success": False,
+                    "error": f"{len(errors)} invalid operation(s); nothing was applied",
+                    "errors": errors
+                }
+                return [{"type": "text", "text": json_dumps(result)}]
+            
+            # All operations succeed and are saved together, or none is
+            results = []
+            with manager.batch():
+                for index, operation in enumerate(operations):
+                    try:
+                        outcome = apply_operation(manager, operation["tool"], operation["arguments"])
+                    except Exception as e:
+                        raise RuntimeError(f"Operation {index} ({operation['tool']}) failed: {e}") from e
+                    results.append({"index": index, "tool": operation["tool"], **outcome})
+            result = {
+                "success": True,
+                "results": results,
+                "message": f"Applied {len(operations)} operations"
+            }
+            return [{"type": "text", "text": json_dumps(result)}]
+        except Exception as e:
+            return [{"type": "text", "text": json_dumps({"success": False, "error": str(e)})}]
+    
+    elif name == "begin_conversation_review":
+        try:
+            result = {
+                "success": True,
+                "session_id": review_sessions.begin()
+            }
+            return [{"type": "text", "text": json_dumps(result)}]
+        except Exception as e:
+            return [{"type": "text", "text": json_dumps({"success": False, "error": str(e)})}]
+    
+    elif name == "append_conversation_chunk":
+        try:
+            characters = review_sessions.append(arguments["session_id"], arguments.get("chunk", ""))
+            result = {
+                "success": True,
+                "characters": characters
+            }
+            return [{"type": "text", "text": json_dumps(result)}]
         except Exception as e:
-            return [{"type": "text", "text": json.dumps({"success": False, "error": str(e)})}]
+            return [{"type": "text", "text": json_dumps({"success": False, "error": str(e)})}]
+    
+    elif name == "finish_conversation_review":
+        try:
+            extractor = review_sessions.finish(arguments["session_id"])
+            result = store_conversation_entities(extractor.finish(), manager)
+            return [{"type": "text", "text": json_dumps(result)}]
+        except Exception as e:
+            return [{"type": "text", "text": json_dumps({"success": False, "error": str(e)})}]
+    
+    elif name == "server_stats":
+        try:
+            stats = server_stats(manager)
+            if arguments.get("reset"):
+                metrics.reset()
+            if arguments.get("format") == "prometheus":
+                return [{"type": "text", "text": prometheus_text(stats)}]
+            return [{"type": "text", "text": json_dumps({"success": True, **stats})}]
+        except Exception as e:
+            return [{"type": "text", "text": json_dumps({"success": False, "error": str(e)})}]
     
     else:
-        return [{"type": "text", "text": json.dumps({"success": False, "error": f"Unknown tool: {name}"})}]
+        return [{"type": "text", "text": json_dumps({"success": False, "error": f"Unknown tool: {name}"})}]
+
+
+# Accepted by every tool; see call_tool
+NAMESPACE_ARGUMENT = {
+    "type": "string",
+    "description": "Separate graph to use (letters, digits, '_', '-', '.'); omit for the default graph"
+}
 
 
 @app.list_tools()
 async def list_tools() -> list:
     """List available tools for MCP clients"""
-    return [
+    tools = [
         {
             "name": "create_entities",
             "description": "Create multiple entities in the knowledge graph",
@@ -703,19 +4540,64 @@ async def list_tools() -> list:
         },
         {
             "name": "read_graph",
-            "description": "Get the entire knowledge graph",
+            "description": "Get the knowledge graph, optionally one page at a time, filtered, or without observations",
             "inputSchema": {
                 "type": "object",
-                "properties": {}
+                "properties": {
+                    "limit": {
+                        "type": "integer",
+                        "minimum": 1,
+                        "description": "Maximum number of entities to return; relations are those going out of the returned entities"
+                    },
+                    "offset": {
+                        "type": "integer",
+                        "minimum": 0,
+                        "default": 0,
+                        "description": "Number of entities to skip"
+                    },
+                    "cursor": {
+                        "type": "string",
+                        "description": "next_cursor from a previous page, to continue after it"
+                    },
+                    "entity_types": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Only return entities of these types"
+                    },
+                    "relation_types": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Only return relations of these types"
+                    },
+                    "projection": {
+                        "type": "string",
+                        "enum": ["full", "summary", "names"],
+                        "default": "full",
+                        "description": "full entities, summary (observation count instead of observations), or names only"
+                    },
+                    "include_relations": {
+                        "type": "boolean",
+                        "default": True
+                    }
+                }
             }
         },
         {
             "name": "search_nodes",
-            "description": "Search entities by name/type/observations and increment their weights",
+            "description": "Search entities by name/type/observations, best matches first, and increment their weights",
             "inputSchema": {
                 "type": "object",
                 "properties": {
-                    "query": {"type": "string"}
+                    "query": {"type": "string"},
+                    "limit": {
+                        "type": "integer",
+                        "description": "Maximum number of entities to return (default: all matches)"
+                    },
+                    "include_scores": {
+                        "type": "boolean",
+                        "default": False,
+                        "description": "Include each entity's relevance score in the results"
+                    }
                 },
                 "required": ["query"]
             }
@@ -734,18 +4616,95 @@ async def list_tools() -> list:
                 "required": ["names"]
             }
         },
+        {
+            "name": "get_changes_since",
+            "description": "Changes to the graph since a version returned by an earlier call, as storage records "
+                           "('entity', 'delete_entity', 'add_observation', 'weight', 'relation', ...) each with its "
+                           "version; or, on the first call or when too far behind, the whole graph as a snapshot "
+                           "of entity and relation records",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "version": {
+                        "type": "integer",
+                        "description": "version from the previous response (default: 0)"
+                    },
+                    "graph_id": {
+                        "type": "string",
+                        "description": "graph_id from the previous response; without it a snapshot is returned"
+                    }
+                }
+            }
+        },
+        {
+            "name": "get_neighbors",
+            "description": "Get the relations and neighboring entity names of one entity",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "relation_types": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Only follow relations of these types (default: all)"
+                    },
+                    "direction": {
+                        "type": "string",
+                        "enum": ["out", "in", "both"],
+                        "default": "both"
+                    }
+                },
+                "required": ["name"]
+            }
+        },
+        {
+            "name": "traverse",
+            "description": "Walk the graph breadth-first from start entities and return the reached subgraph",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "start": {
+                        "type": "array",
+                        "items": {"type": "string"}
+                    },
+                    "max_depth": {
+                        "type": "integer",
+                        "default": TRAVERSE_DEPTH,
+                        "description": "Maximum number of hops from the start entities"
+                    },
+                    "relation_types": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Only follow relations of these types (default: all)"
+                    },
+                    "direction": {
+                        "type": "string",
+                        "enum": ["out", "in", "both"],
+                        "default": "both"
+                    },
+                    "max_entities": {
+                        "type": "integer",
+                        "description": "Stop adding entities once this many have been reached"
+                    }
+                },
+                "required": ["start"]
+            }
+        },
         {
             "name": "prune_entities",
-            "description": "Remove entities with weight below threshold and their relations",
+            "description": "Remove entities with weight below threshold and their relations, lowest weight first (weights decay with time since last access when a half-life is configured)",
             "inputSchema": {
                 "type": "object",
                 "properties": {
                     "threshold": {
+                        "type": "number",
+                        "description": "Minimum weight threshold - entities below this will be removed (default 0 unless count is given)"
+                    },
+                    "count": {
                         "type": "integer",
-                        "description": "Minimum weight threshold - entities below this will be removed"
+                        "description": "Remove at most this many entities; alone, removes the count lowest-weight entities"
                     }
-                },
-                "required": ["threshold"]
+                }
             }
         },
         {
@@ -757,20 +4716,178 @@ async def list_tools() -> list:
                     "conversation": {
                         "type": "string",
                         "description": "Full conversation text to analyze for knowledge extraction"
+                    },
+                    "conversation_path": {
+                        "type": "string",
+                        "description": "Path of a UTF-8 transcript file to analyze instead, read in chunks"
+                    }
+                }
+            }
+        },
+        {
+            "name": "review_conversations",
+            "description": "Analyze many conversations at once (e.g. to backfill chat history), extracting entities "
+                           "in parallel worker processes and storing the results as one update",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "conversation_paths": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Paths of UTF-8 transcript files to analyze"
+                    },
+                    "conversations": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Conversation texts to analyze"
+                    },
+                    "workers": {
+                        "type": "integer",
+                        "description": "Worker processes to use (default: MEMORY_REVIEW_WORKERS, or one per CPU)"
                     }
+                }
+            }
+        },
+        {
+            "name": "apply_batch",
+            "description": "Apply an ordered list of mutations in one call and atomically: all are saved together, "
+                           "or none if one is invalid or fails. Returns what each operation changed",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "operations": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "tool": {
+                                    "type": "string",
+                                    "enum": list(BATCH_OPERATIONS)
+                                },
+                                "arguments": {
+                                    "type": "object",
+                                    "description": "Arguments as the named tool takes them"
+                                }
+                            },
+                            "required": ["tool", "arguments"]
+                        }
+                    }
+                },
+                "required": ["operations"]
+            }
+        },
+        {
+            "name": "begin_conversation_review",
+            "description": "Start a chunked conversation review for transcripts too large for one call; returns a session_id",
+            "inputSchema": {
+                "type": "object",
+                "properties": {}
+            }
+        },
+        {
+            "name": "append_conversation_chunk",
+            "description": "Send the next piece of a chunked review's conversation (chunks may split lines anywhere)",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "session_id": {"type": "string"},
+                    "chunk": {"type": "string"}
+                },
+                "required": ["session_id", "chunk"]
+            }
+        },
+        {
+            "name": "finish_conversation_review",
+            "description": "Finish a chunked conversation review and store what it extracted, like review_conversation",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "session_id": {"type": "string"}
                 },
-                "required": ["conversation"]
+                "required": ["session_id"]
+            }
+        },
+        {
+            "name": "server_stats",
+            "description": "Per-tool call counts, errors, latency histograms and response sizes, plus graph size and storage I/O counters",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "format": {
+                        "type": "string",
+                        "enum": ["json", "prometheus"],
+                        "description": "json (default) or Prometheus text exposition format"
+                    },
+                    "reset": {
+                        "type": "boolean",
+                        "description": "Clear the per-tool metrics after reading them (default: false)"
+                    }
+                }
             }
         }
     ]
+    for tool in tools:
+        tool["inputSchema"]["properties"]["namespace"] = NAMESPACE_ARGUMENT
+    return tools
 
 
 async def main():
     """Run the MCP server"""
-    async with stdio_server() as (read_stream, write_stream):
-        await app.run(read_stream, write_stream, app.create_initialization_options())
+    stats_dump = None
+    if MEMORY_STATS_FILE:
+        stats_dump = start_stats_dump(MEMORY_STATS_FILE, MEMORY_STATS_INTERVAL, MEMORY_STATS_FORMAT)
+    try:
+        async with stdio_server() as (read_stream, write_stream):
+            await app.run(read_stream, write_stream, app.create_initialization_options())
+    finally:
+        # Persist batched weight increments before exiting
+        knowledge_graph_manager.close()
+        namespaces.close()
+        if stats_dump is not None:
+            stats_dump.set()
+
+
+def cli(argv: Optional[List[str]] = None) -> None:
+    """Run the MCP server, convert between JSONL and SQLite storage, or review transcript files"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Knowledge graph memory MCP server")
+    commands = parser.add_subparsers(dest="command")
+    import_parser = commands.add_parser("import-jsonl", help="Copy a JSONL memory file into a SQLite database")
+    export_parser = commands.add_parser("export-jsonl", help="Copy a SQLite database into a JSONL memory file")
+    for command_parser in (import_parser, export_parser):
+        command_parser.add_argument("--jsonl", default=MEMORY_FILE_PATH, help="JSONL file (default: MEMORY_FILE_PATH)")
+        command_parser.add_argument("--db", default=MEMORY_DB_PATH, help="SQLite database (default: MEMORY_DB_PATH)")
+    review_parser = commands.add_parser("review-conversations",
+                                        help="Analyze transcript files into the graph, as the review_conversations tool")
+    review_parser.add_argument("paths", nargs="+", help="UTF-8 transcript files")
+    review_parser.add_argument("--workers", type=int, default=REVIEW_WORKERS,
+                               help="Worker processes (default: MEMORY_REVIEW_WORKERS, or one per CPU)")
+    review_parser.add_argument("--namespace", help="Store into this namespace instead of the default graph")
+    args = parser.parse_args(argv)
+    
+    if args.command == "review-conversations":
+        try:
+            if args.namespace:
+                with namespaces.use(args.namespace) as manager:
+                    result = review_conversations(args.paths, manager=manager, workers=args.workers)
+            else:
+                result = review_conversations(args.paths, workers=args.workers)
+        finally:
+            # Flushes weights and waits for background compaction
+            (namespaces if args.namespace else knowledge_graph_manager).close()
+        for failure in result["failed"]:
+            print(f"Skipped {failure['source']}: {failure['error']}", file=sys.stderr)
+        print(result["summary"])
+    elif args.command == "import-jsonl":
+        entities, relations = copy_graph(JsonlStore(args.jsonl), SqliteStore(args.db))
+        print(f"Imported {entities} entities and {relations} relations from {args.jsonl} into {args.db}")
+    elif args.command == "export-jsonl":
+        entities, relations = copy_graph(SqliteStore(args.db), JsonlStore(args.jsonl))
+        print(f"Exported {entities} entities and {relations} relations from {args.db} into {args.jsonl}")
+    else:
+        asyncio.run(main())
 
 
 if __name__ == "__main__":
-    import asyncio
-    asyncio.run(main())
+    cli()
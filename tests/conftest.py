@@ -0,0 +1,55 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# The server module builds its global manager on import; keep it off real data
+os.environ['MEMORY_FILE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='memory-tests-'), 'memory.jsonl')
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+import memory_server  # noqa: E402
+
+
+BACKENDS = ['jsonl', 'sqlite']
+
+
+def graph_state(manager) -> tuple:
+    """Everything a client can observe of a graph, in comparable form"""
+    graph = manager.read_graph()
+    entities = sorted((e.name, e.entityType, tuple(e.observations), e.weight) for e in graph.entities)
+    relations = sorted((r.from_entity, r.to_entity, r.relationType) for r in graph.relations)
+    return entities, relations
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request) -> str:
+    return request.param
+
+
+@pytest.fixture
+def make_manager(tmp_path, backend):
+    """Build managers of the parametrized backend, on the same storage file unless
+    given another file name; all are closed afterwards"""
+    managers = []
+    
+    def make(name: str = 'memory', **options):
+        path = str(tmp_path / (name + ('.db' if backend == 'sqlite' else '.jsonl')))
+        manager = memory_server.create_manager(backend, path, **options)
+        managers.append(manager)
+        return manager
+    
+    yield make
+    for manager in managers:
+        manager.close()
+
+
+@pytest.fixture
+def manager(make_manager):
+    return make_manager()
+
+
+def call(manager, tool: str, **arguments):
+    """Run a tool against manager and decode its JSON response"""
+    return memory_server.json_loads(memory_server._call_tool(manager, tool, arguments)[0]['text'])
@@ -0,0 +1,112 @@
+import pytest
+
+from memory_server import Entity, Relation, analyze_conversation
+from tests.conftest import call, graph_state
+
+
+def test_batch_is_persisted_as_one_record(make_manager):
+    manager = make_manager()
+    with manager.batch():
+        manager.create_entities([Entity('A', 't', ['x']), Entity('B', 't', [])])
+        manager.create_relations([Relation('A', 'B', 'r')])
+        manager.delete_observations([{'entityName': 'A', 'observation': 'x'}])
+    expected = graph_state(manager)
+    manager.close()
+    assert graph_state(make_manager()) == expected
+
+
+def test_batch_rolls_back_on_error(make_manager):
+    manager = make_manager(weight_flush_interval=3600)
+    manager.create_entities([Entity('A', 't', ['x']), Entity('B', 't', [])])
+    manager.create_relations([Relation('A', 'B', 'r')])
+    manager.open_nodes(['A'])  # An unflushed access count survives the rollback
+    before = graph_state(manager)
+
+    with pytest.raises(KeyError):
+        with manager.batch():
+            manager.create_entities([Entity('C', 't', [])])
+            manager.delete_entities(['A'])
+            manager.add_observations([{'entityName': 'B', 'observation': 'y'}])
+            raise KeyError('abort')
+    assert graph_state(manager) == before
+    assert [e.name for e, _ in manager.search_nodes_scored('x', record_access=False)] == ['A']
+
+    manager.close()
+    assert graph_state(make_manager()) == before
+
+
+def test_nested_batches_join_the_outer_one(manager):
+    with pytest.raises(RuntimeError):
+        with manager.batch():
+            manager.create_entities([Entity('A', 't', [])])
+            with manager.batch():
+                manager.create_entities([Entity('B', 't', [])])
+            raise RuntimeError
+    assert graph_state(manager) == ([], [])
+
+
+def test_snapshots_are_refused_inside_a_batch(manager):
+    with pytest.raises(RuntimeError):
+        with manager.batch():
+            manager.compact()
+
+
+def test_apply_batch_reports_each_operation(manager):
+    result = call(manager, 'apply_batch', operations=[
+        {'tool': 'create_entities', 'arguments': {'entities': [
+            {'name': 'A', 'entityType': 't', 'observations': ['x']},
+            {'name': 'B', 'entityType': 't'},
+        ]}},
+        {'tool': 'create_relations', 'arguments': {'relations': [
+            {'from_entity': 'A', 'to_entity': 'B', 'relationType': 'r'},
+        ]}},
+        {'tool': 'create_entities', 'arguments': {'entities': [{'name': 'A', 'entityType': 't'}]}},
+        {'tool': 'delete_entities', 'arguments': {'entity_names': ['B', 'missing']}},
+    ])
+    assert result['success']
+    assert [(r['applied'], r['skipped']) for r in result['results']] == [(2, 0), (1, 0), (0, 1), (1, 1)]
+    assert result['results'][3]['entities'] == ['B']
+    assert graph_state(manager) == ([('A', 't', ('x',), 0)], [])
+
+
+def test_apply_batch_validates_before_applying(manager):
+    result = call(manager, 'apply_batch', operations=[
+        {'tool': 'create_entities', 'arguments': {'entities': [{'name': 'A', 'entityType': 't'}]}},
+        {'tool': 'create_entities', 'arguments': {'entities': [{'name': 'B'}]}},
+        {'tool': 'read_graph', 'arguments': {}},
+        {'tool': 'prune_entities', 'arguments': {'count': -1}},
+    ])
+    assert not result['success']
+    assert [error['index'] for error in result['errors']] == [1, 2, 3]
+    assert graph_state(manager) == ([], [])
+
+
+def test_apply_batch_is_all_or_nothing(manager, monkeypatch):
+    manager.create_entities([Entity('A', 't', [])])
+    before = graph_state(manager)
+
+    def fail(*args, **kwargs):
+        raise OSError('disk full')
+    monkeypatch.setattr(manager, 'delete_relations', fail)
+    result = call(manager, 'apply_batch', operations=[
+        {'tool': 'create_entities', 'arguments': {'entities': [{'name': 'B', 'entityType': 't'}]}},
+        {'tool': 'delete_relations', 'arguments': {'relations': []}},
+    ])
+    assert not result['success']
+    assert 'Operation 1 (delete_relations) failed: disk full' in result['error']
+    assert graph_state(manager) == before
+
+
+def test_conversation_review_is_stored_atomically(manager, monkeypatch):
+    conversation = 'Alice Johnson works at Google on the Python project. Bob Lee uses Docker.'
+
+    def fail(*args, **kwargs):
+        raise OSError('disk full')
+    monkeypatch.setattr(manager, 'create_relations', fail)
+    assert not analyze_conversation(conversation, manager)['success']
+    assert graph_state(manager) == ([], [])
+
+    monkeypatch.undo()
+    result = analyze_conversation(conversation, manager)
+    assert result['success'] and result['entities_created']
+    assert {e.name for e in manager.read_graph().entities} == set(result['entities_created'])
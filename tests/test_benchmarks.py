@@ -0,0 +1,18 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+BENCHMARK = Path(__file__).resolve().parent.parent / 'benchmarks' / 'bench_manager.py'
+
+
+def test_benchmark_suite_runs_and_compares(tmp_path):
+    output = tmp_path / 'run.json'
+    subprocess.run([sys.executable, str(BENCHMARK), '--sizes', '50', '--repeat', '1', '--queries', '5',
+                    '--batch', '5', '--conversation-lines', '5', '--no-memory', '--output', str(output)],
+                   check=True, capture_output=True)
+    results = json.loads(output.read_text())['results']
+    assert {(r['operation'], r['backend']) for r in results} >= {('search_nodes', 'jsonl'), ('load_graph', 'sqlite')}
+    compared = subprocess.run([sys.executable, str(BENCHMARK), '--compare', str(output), str(output)],
+                              capture_output=True, text=True)
+    assert compared.returncode == 0, compared.stdout + compared.stderr
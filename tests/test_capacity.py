@@ -0,0 +1,91 @@
+import time
+
+import pytest
+
+from memory_server import Entity, Relation
+from tests.conftest import graph_state
+
+
+def names(manager) -> list:
+    return [entity.name for entity in manager.read_graph().entities]
+
+
+def test_max_entities_evicts_least_used(make_manager):
+    manager = make_manager(max_entities=3)
+    manager.create_entities([Entity('A', 't', [], weight=5), Entity('B', 't', [], weight=1),
+                             Entity('C', 't', [], weight=3)])
+    manager.create_relations([Relation('A', 'B', 'r')])
+    manager.create_entities([Entity('D', 't', [])])
+    assert names(manager) == ['A', 'C', 'D']
+    assert graph_state(manager)[1] == []  # B's relation went with it
+    manager.close()
+    assert names(make_manager()) == ['A', 'C', 'D']
+
+
+def test_lru_policy_evicts_least_recently_accessed(make_manager):
+    manager = make_manager(max_entities=2, eviction_policy='lru')
+    now = time.time()
+    manager.create_entities([Entity('old', 't', [], weight=9, last_accessed=now - 100),
+                             Entity('recent', 't', [], weight=0, last_accessed=now)])
+    manager.create_entities([Entity('new', 't', [])])
+    assert names(manager) == ['recent', 'new']
+
+
+def test_entities_just_written_go_last(make_manager):
+    manager = make_manager(max_entities=2)
+    manager.create_entities([Entity('heavy', 't', [], weight=9), Entity('light', 't', [])])
+    manager.add_observations([{'entityName': 'light', 'observation': 'x'}])
+    manager.create_entities([Entity('new', 't', [])])
+    assert names(manager) == ['heavy', 'new']
+
+
+def test_max_observations_drops_oldest(make_manager):
+    manager = make_manager(max_observations=2)
+    manager.create_entities([Entity('A', 't', ['1', '2', '3'])])
+    manager.add_observations([{'entityName': 'A', 'observation': '4'}])
+    assert graph_state(manager)[0] == [('A', 't', ('3', '4'), 0)]
+    manager.close()
+    assert graph_state(make_manager())[0] == [('A', 't', ('3', '4'), 0)]
+
+
+def test_max_file_bytes_bounds_the_graph(make_manager):
+    manager = make_manager(max_file_bytes=2000)
+    for i in range(40):
+        manager.create_entities([Entity(f'E{i}', 't', ['x' * 50])])
+    assert manager.stats()['graph_bytes'] <= 2000
+    assert 'E39' in names(manager) and 'E0' not in names(manager)
+
+
+def test_oversized_write_is_refused_without_evicting(make_manager):
+    manager = make_manager(max_file_bytes=3000)
+    for i in range(14):
+        manager.create_entities([Entity(f'E{i}', 't', ['x' * 100])])
+    before = graph_state(manager)
+    version = manager.change_version()
+
+    with pytest.raises(ValueError, match='max_file_bytes'):
+        manager.create_entities([Entity('huge', 't', ['x' * 5000])])
+    with pytest.raises(ValueError, match='max_file_bytes'):
+        manager.add_observations([{'entityName': 'E13', 'observation': 'y' * 5000}])
+    assert graph_state(manager) == before
+    assert manager.change_version() == version  # Nothing was persisted either
+    manager.close()
+    assert graph_state(make_manager()) == before
+
+
+def test_write_larger_than_max_entities_is_refused(make_manager):
+    manager = make_manager(max_entities=2)
+    manager.create_entities([Entity('A', 't', [])])
+    with pytest.raises(ValueError, match='max_entities'):
+        manager.create_entities([Entity(f'N{i}', 't', []) for i in range(3)])
+    assert names(manager) == ['A']
+
+
+def test_written_entities_are_never_evicted(make_manager):
+    manager = make_manager(max_file_bytes=800)
+    manager.create_entities([Entity('old', 't', ['x' * 100])])
+    # Fits alone, but together with its relation overshoots: only other entities go
+    manager.create_entities([Entity('A', 't', ['y' * 150]), Entity('B', 't', ['z' * 150])])
+    manager.create_relations([Relation('A', 'B', 'r' * 300)])
+    assert names(manager) == ['A', 'B']
+    assert len(graph_state(manager)[1]) == 1
@@ -0,0 +1,118 @@
+import copy
+
+import pytest
+
+import memory_server
+from memory_server import Entity, KnowledgeGraph, Relation
+from tests.conftest import call, graph_state
+
+
+class Replica:
+    """Client-side copy of a graph kept in sync through the change feed"""
+
+    def __init__(self, tmp_path):
+        self.graph = memory_server.KnowledgeGraphManager(str(tmp_path / 'replica.jsonl'), result_cache_size=0)
+        self.graph.read_graph()  # Loads its (empty) storage now, not over what is applied
+        self.graph_id, self.version, self.snapshots = None, 0, 0
+
+    def sync(self, manager) -> None:
+        changes = manager.changes_since(self.version, self.graph_id)
+        if changes.snapshot:
+            self.graph._reset()
+            self.snapshots += 1
+        else:
+            assert [record['version'] for record in changes.records] == \
+                list(range(self.version + 1, changes.version + 1))
+        for record in copy.deepcopy(changes.records):
+            self.graph._apply_record(record)
+        self.graph_id, self.version = changes.graph_id, changes.version
+
+
+def test_replica_follows_changes(tmp_path, make_manager):
+    manager = make_manager(weight_flush_threshold=3)
+    replica = Replica(tmp_path)
+    replica.sync(manager)
+    manager.create_entities([Entity('A', 't', ['x']), Entity('B', 't', [])])
+    manager.create_relations([Relation('A', 'B', 'r')])
+    replica.sync(manager)
+    with manager.batch():
+        manager.add_observations([{'entityName': 'B', 'observation': 'y'}])
+        manager.delete_relations([{'from_entity': 'A', 'to_entity': 'B', 'relationType': 'r'}])
+    for _ in range(3):
+        manager.open_nodes(['A'])  # Flushed as a weight change
+    manager.delete_entities(['B'])
+    replica.sync(manager)
+    assert replica.snapshots == 1
+    assert graph_state(replica.graph) == graph_state(manager)
+
+
+def test_other_processes_writes_are_changes(tmp_path, make_manager):
+    manager, other = make_manager(), make_manager()
+    replica = Replica(tmp_path)
+    replica.sync(manager)
+    other.create_entities([Entity('A', 't', [])])
+    replica.sync(manager)
+    assert graph_state(replica.graph) == graph_state(manager)
+
+
+def test_unflushed_weights_are_left_out_of_snapshots(tmp_path, make_manager):
+    manager = make_manager(weight_flush_interval=3600)
+    manager.create_entities([Entity('A', 't', [], weight=2)])
+    manager.open_nodes(['A'])
+    replica = Replica(tmp_path)
+    replica.sync(manager)
+    assert replica.graph.read_graph().entities[0].weight == 2
+    manager.flush_weights()
+    replica.sync(manager)
+    assert replica.graph.read_graph().entities[0].weight == 3
+
+
+def test_falling_behind_gets_a_snapshot(tmp_path, make_manager):
+    manager = make_manager(change_log_size=3)
+    replica = Replica(tmp_path)
+    replica.sync(manager)
+    manager.create_entities([Entity(f'E{i}', 't', []) for i in range(3)])
+    replica.sync(manager)  # Three records, all still in the log
+    for i in range(4):
+        manager.delete_entities([f'E{i}'] if i < 3 else [])
+        manager.create_entities([Entity(f'N{i}', 't', [])])
+    replica.sync(manager)
+    assert replica.snapshots == 2
+    assert graph_state(replica.graph) == graph_state(manager)
+
+
+def test_rolled_back_batch_keeps_the_feed(tmp_path, make_manager):
+    manager = make_manager()
+    replica = Replica(tmp_path)
+    replica.sync(manager)
+    manager.create_entities([Entity('A', 't', [])])
+    with pytest.raises(KeyError):
+        with manager.batch():
+            manager.delete_entities(['A'])
+            raise KeyError
+    manager.create_entities([Entity('B', 't', [])])
+    replica.sync(manager)
+    assert replica.snapshots == 1
+    assert graph_state(replica.graph) == graph_state(manager)
+
+
+def test_replaced_graph_starts_over(tmp_path, make_manager):
+    manager = make_manager()
+    replica = Replica(tmp_path)
+    replica.sync(manager)
+    manager.save_graph(KnowledgeGraph(entities=[Entity('Z', 't', [])], relations=[]))
+    replica.sync(manager)
+    assert replica.snapshots == 2
+    graph_id = manager.graph_id
+    manager.close()
+    assert make_manager().changes_since(replica.version, graph_id).snapshot
+
+
+def test_get_changes_since_tool(manager):
+    first = call(manager, 'get_changes_since')
+    assert first['snapshot'] and first['records'] == []
+    manager.create_entities([Entity('A', 't', [])])
+    result = call(manager, 'get_changes_since', version=first['version'], graph_id=first['graph_id'])
+    assert not result['snapshot']
+    assert [(r['type'], r['name'], r['version']) for r in result['records']] == [('entity', 'A', result['version'])]
+    assert not call(manager, 'get_changes_since', version='1')['success']
@@ -0,0 +1,224 @@
+import threading
+import time
+
+import pytest
+
+from memory_server import Entity, KnowledgeGraph, Relation
+from tests.conftest import graph_state
+
+
+def populate(manager) -> None:
+    manager.create_entities([
+        Entity('Alice', 'person', ['works on Python', 'likes tea']),
+        Entity('Bob', 'person', ['plays chess']),
+        Entity('Acme', 'organization', ['makes Python tooling']),
+    ])
+    manager.create_relations([
+        Relation('Alice', 'Acme', 'works_at'),
+        Relation('Bob', 'Alice', 'knows'),
+    ])
+
+
+def test_mutations_return_what_changed(manager):
+    assert manager.create_entities([Entity('A', 't', ['x']), Entity('A', 't', ['y'])]) == ['A']
+    assert manager.create_entities([Entity('A', 't', [])]) == []
+    assert manager.add_observations([{'entityName': 'A', 'observation': 'x'},
+                                     {'entityName': 'A', 'observation': 'z'},
+                                     {'entityName': 'missing', 'observation': 'z'}]) == 1
+    assert manager.delete_observations([{'entityName': 'A', 'observation': 'x'},
+                                        {'entityName': 'A', 'observation': 'nope'}]) == 1
+    assert manager.create_relations([Relation('A', 'A', 'self'), Relation('A', 'A', 'self')]) == 1
+    assert manager.delete_relations([{'from_entity': 'A', 'to_entity': 'A', 'relationType': 'self'}]) == 1
+    assert manager.delete_entities(['A', 'missing']) == ['A']
+    assert graph_state(manager) == ([], [])
+
+
+def test_graph_survives_restart(make_manager):
+    manager = make_manager()
+    populate(manager)
+    manager.add_observations([{'entityName': 'Bob', 'observation': 'lives in Oslo'}])
+    manager.delete_observations([{'entityName': 'Alice', 'observation': 'likes tea'}])
+    manager.delete_relations([{'from_entity': 'Bob', 'to_entity': 'Alice', 'relationType': 'knows'}])
+    manager.increment_weights(['Acme', 'Acme'])
+    expected = graph_state(manager)
+    manager.close()
+    assert graph_state(make_manager()) == expected
+
+
+def test_delete_entities_cascades_relations(manager):
+    populate(manager)
+    manager.delete_entities(['Alice'])
+    assert graph_state(manager)[1] == []
+    assert manager.get_neighbors('Bob') == []
+
+
+def test_save_graph_replaces_the_graph(make_manager):
+    manager = make_manager()
+    populate(manager)
+    manager.save_graph(KnowledgeGraph(entities=[Entity('Z', 't', ['only'])], relations=[]))
+    assert graph_state(manager) == ([('Z', 't', ('only',), 0)], [])
+    manager.close()
+    assert graph_state(make_manager()) == ([('Z', 't', ('only',), 0)], [])
+
+
+def test_search_ranks_names_then_whole_words(manager):
+    manager.create_entities([
+        Entity('Idioms', 'concept', ['pythonic code']),
+        Entity('Snake', 'animal', ['a python is a snake']),
+        Entity('Python', 'language', ['used by Alice']),
+        Entity('Other', 'concept', ['nothing here']),
+    ])
+    found = manager.search_nodes_scored('python', record_access=False)
+    assert [entity.name for entity, _ in found] == ['Python', 'Snake', 'Idioms']
+    assert found[0][1] > found[1][1] > found[2][1]
+    assert [entity.name for entity in manager.search_nodes('PYTHON', limit=1)] == ['Python']
+    assert manager.search_nodes('absent') == []
+
+
+def test_search_index_follows_mutations(manager):
+    manager.create_entities([Entity('A', 't', ['alpha'])])
+    manager.add_observations([{'entityName': 'A', 'observation': 'gamma ray'}])
+    assert [e.name for e in manager.search_nodes('gamma')] == ['A']
+    manager.delete_observations([{'entityName': 'A', 'observation': 'gamma ray'}])
+    assert manager.search_nodes('gamma') == []
+    manager.delete_entities(['A'])
+    assert manager.search_nodes('alpha') == []
+
+
+def test_neighbors_and_traverse(manager):
+    populate(manager)
+    manager.create_relations([Relation('Acme', 'Acme', 'owns')])
+    assert {r.relationType for r in manager.get_neighbors('Alice')} == {'works_at', 'knows'}
+    assert [r.relationType for r in manager.get_neighbors('Alice', direction='out')] == ['works_at']
+    assert [r.relationType for r in manager.get_neighbors('Acme', direction='in')] == ['works_at', 'owns']
+    assert [r.to_entity for r in manager.get_neighbors('Alice', relation_types=['knows'])] == ['Alice']
+    with pytest.raises(ValueError):
+        manager.get_neighbors('Alice', direction='sideways')
+
+    subgraph, depths = manager.traverse(['Bob'], max_depth=2)
+    assert depths == {'Bob': 0, 'Alice': 1, 'Acme': 2}
+    assert len(subgraph.relations) == 2  # Not Acme's own edges, at the last hop
+    _, depths = manager.traverse(['Bob'], max_depth=2, direction='out', relation_types=['knows'])
+    assert depths == {'Bob': 0, 'Alice': 1}
+
+
+def test_read_graph_pages_cover_the_graph(manager):
+    manager.create_entities([Entity(f'E{i}', 'even' if i % 2 == 0 else 'odd', [f'o{i}']) for i in range(7)])
+    manager.create_relations([Relation(f'E{i}', f'E{i + 1}', 'next') for i in range(6)])
+
+    names, relations, cursor = [], [], None
+    while True:
+        page = manager.read_graph_page(limit=3, cursor=cursor)
+        assert page.total == 7
+        names += [entity.name for entity in page.entities]
+        relations += page.relations
+        cursor = page.next_cursor
+        if cursor is None:
+            break
+    assert names == [f'E{i}' for i in range(7)]
+    assert len(relations) == 6
+
+    page = manager.read_graph_page(entity_types=['odd'], offset=1)
+    assert [entity.name for entity in page.entities] == ['E3', 'E5']
+    assert page.total == 3
+
+
+def test_access_weights_are_coalesced(make_manager):
+    manager = make_manager(weight_flush_interval=3600, weight_flush_threshold=1000)
+    manager.create_entities([Entity('A', 't', ['x'])])
+    for _ in range(5):
+        manager.open_nodes(['A'])
+    assert manager.open_nodes(['A'])[0].weight == 6
+    assert manager.stats()['pending_weight_updates'] == 6
+    manager.close()  # Flushes
+    assert graph_state(make_manager())[0] == [('A', 't', ('x',), 6)]
+
+
+def test_track_access_off_leaves_weights(make_manager):
+    manager = make_manager(track_access=False)
+    manager.create_entities([Entity('A', 't', ['x'])])
+    manager.search_nodes('x')
+    manager.open_nodes(['A'])
+    assert manager.read_graph().entities[0].weight == 0
+
+
+def test_prune_removes_lowest_weights(manager):
+    manager.create_entities([Entity(f'E{i}', 't', [], weight=i) for i in range(5)])
+    assert manager.prune_entities(threshold=2) == ['E0', 'E1']
+    assert manager.prune_entities(count=2) == ['E2', 'E3']
+    assert [e.name for e in manager.read_graph().entities] == ['E4']
+
+
+def test_failed_prune_leaves_every_entity_prunable(manager, monkeypatch):
+    manager.create_entities([Entity(f'E{i}', 't', [], weight=i) for i in range(3)])
+    with pytest.raises(ValueError):
+        manager.prune_entities(threshold='2')
+    with pytest.raises(ValueError):
+        manager.prune_entities(count=-1)
+    with monkeypatch.context() as patch:
+        patch.setattr(type(manager), 'effective_weight', lambda *args: 1 / 0)
+        with pytest.raises(ZeroDivisionError):
+            manager.prune_entities(threshold=2)  # Fails after popping E0 off the rank heap
+    assert manager.prune_entities(threshold=2) == ['E0', 'E1']
+
+
+def test_decayed_weights_prefer_recent_access(make_manager):
+    manager = make_manager(weight_half_life=86400)
+    now = time.time()
+    manager.create_entities([
+        Entity('old', 't', [], weight=8, last_accessed=now - 5 * 86400),
+        Entity('new', 't', [], weight=2, last_accessed=now),
+    ])
+    assert manager.effective_weight(manager.get_entities(['old'])[0]) == pytest.approx(0.25, rel=1e-3)
+    assert manager.prune_entities(threshold=1) == ['old']
+
+
+def test_names_are_interned(manager):
+    name = ''.join(['sha', 'red'])
+    manager.create_entities([Entity(name, 't', []), Entity('other', 't', [])])
+    manager.create_relations([Relation(''.join(['sha', 'red']), 'other', 'r')])
+    relation = manager.read_graph().relations[0]
+    assert relation.from_entity is manager.get_entities(['shared'])[0].name
+
+
+def test_concurrent_readers_and_writers(manager):
+    errors = []
+
+    def write(start):
+        try:
+            for i in range(start, start + 50):
+                manager.create_entities([Entity(f'E{i}', 't', [f'obs {i}'])])
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    def read():
+        try:
+            for _ in range(50):
+                manager.search_nodes('obs')
+                manager.read_graph()
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(i * 50,)) for i in range(3)]
+    threads += [threading.Thread(target=read) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(manager.read_graph().entities) == 150
+
+
+def test_duplicate_observations_are_stored_once(make_manager):
+    manager = make_manager()
+    manager.create_entities([Entity('A', 't', ['o4', 'o1', 'o4'])])
+    assert graph_state(manager)[0] == [('A', 't', ('o4', 'o1'), 0)]
+    other = make_manager()  # Loads from storage, as a restart or another process would
+    assert graph_state(other) == graph_state(manager)
+
+    manager.save_graph(KnowledgeGraph(entities=[Entity('B', 't', ['x', 'x', 'y'])], relations=[]))
+    manager.delete_observations([{'entityName': 'B', 'observation': 'x'}])
+    assert graph_state(manager)[0] == [('B', 't', ('y',), 0)]
+    assert graph_state(other) == graph_state(manager)
+    manager.close()
+    assert graph_state(make_manager()) == graph_state(other)
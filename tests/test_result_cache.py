@@ -0,0 +1,79 @@
+import pytest
+
+from memory_server import Entity, Relation, ResultCache
+from tests.conftest import call
+
+
+def cache_stats(manager) -> dict:
+    return manager.stats()['result_cache']
+
+
+def test_repeated_reads_are_served_from_the_cache(manager):
+    manager.create_entities([Entity('A', 't', ['alpha']), Entity('B', 't', ['beta'])])
+    first = call(manager, 'search_nodes', query='alpha')
+    second = call(manager, 'search_nodes', query='alpha')
+    assert second['entities'][0]['weight'] == first['entities'][0]['weight'] + 1  # Weights stay current
+    call(manager, 'open_nodes', names=['A', 'B'])
+    call(manager, 'open_nodes', names=['A', 'B'])
+    assert cache_stats(manager)['hits'] == 2
+
+
+def test_writes_drop_exactly_the_affected_entries(manager):
+    manager.create_entities([Entity('A', 't', ['alpha']), Entity('B', 't', ['beta'])])
+    for query in ('alpha', 'beta', 'gamma'):
+        call(manager, 'search_nodes', query=query)
+    call(manager, 'open_nodes', names=['B'])
+
+    manager.add_observations([{'entityName': 'A', 'observation': 'gamma'}])
+    assert cache_stats(manager)['invalidations'] == 2  # alpha (holds A) and gamma (now matches A)
+    assert [e['name'] for e in call(manager, 'search_nodes', query='gamma')['entities']] == ['A']
+
+    manager.create_relations([Relation('A', 'B', 'r')])
+    manager.increment_weights(['B'])
+    assert cache_stats(manager)['invalidations'] == 2
+
+    manager.delete_observations([{'entityName': 'B', 'observation': 'beta'}])
+    assert call(manager, 'search_nodes', query='beta')['entities'] == []
+    assert call(manager, 'open_nodes', names=['B'])['entities'][0]['observations'] == []
+
+
+def test_results_match_an_uncached_manager(make_manager):
+    cached, uncached = make_manager('cached'), make_manager('uncached', result_cache_size=0)
+    for manager in (cached, uncached):
+        manager.create_entities([Entity(f'E{i}', 't', [f'word{i % 3}']) for i in range(9)])
+    for step in range(6):
+        for manager in (cached, uncached):
+            manager.add_observations([{'entityName': f'E{step}', 'observation': f'word{step % 2}'}])
+            manager.delete_entities([f'E{8 - step}'])
+        for query in ('word0', 'word1', 'ord', 'E'):
+            assert [e.name for e, _ in cached.search_nodes_scored(query, record_access=False)] == \
+                [e.name for e, _ in uncached.search_nodes_scored(query, record_access=False)]
+            assert call(cached, 'search_nodes', query=query)['count'] == call(uncached, 'search_nodes', query=query)['count']
+
+
+@pytest.mark.parametrize('misses', [0, 100])  # Fewer and more cached queries than the text has positions
+def test_invalidation_finds_every_query_the_change_contains(misses):
+    cache = ResultCache(1000)
+    queries = ['', 'a', 'y', 'ph', 'alpha', 'lph', 'gamma r', 'beta gamma', 'zz', 'q', 'x'] + \
+        [f'miss{i}' for i in range(misses)]
+    for query in queries:
+        cache.put(('search', query, None), [[], None], query)
+    text = 'E\0type\0Gamma ray\0alpha'
+    cache.invalidate('E', text)
+    contained = {query for query in queries if query in text.lower()} | {'beta gamma'}  # Shares the word gamma
+    assert {key[1] for key in cache._entries} == set(queries) - contained
+    assert cache.invalidations == len(contained)
+
+
+def test_observation_writes_only_check_the_changed_text(manager):
+    manager.create_entities([Entity('A', 't', ['xoo bax']), Entity('B', 't', ['other']), Entity('C', 't', ['oo ba'])])
+    for query in ('oo ba', 'other', 'zz'):
+        call(manager, 'search_nodes', query=query)
+    for i in range(200):
+        manager.add_observations([{'entityName': 'B', 'observation': f'note {i}'}])
+    assert cache_stats(manager)['invalidations'] == 1  # Only 'other', which holds B
+    assert [e['name'] for e in call(manager, 'search_nodes', query='oo ba', limit=1)['entities']] == ['C']
+    # The words of 'oo ba' give A, which the cached entry does not hold, the whole-word bonus;
+    # its tie with C goes to the older entity
+    manager.add_observations([{'entityName': 'A', 'observation': 'oo'}, {'entityName': 'A', 'observation': 'ba'}])
+    assert [e['name'] for e in call(manager, 'search_nodes', query='oo ba', limit=1)['entities']] == ['A']
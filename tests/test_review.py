@@ -0,0 +1,80 @@
+import pytest
+
+import memory_server
+from memory_server import (ConversationExtractor, analyze_conversation, extract_conversation_entities,
+                           extract_conversation_file, review_conversations)
+from tests.conftest import call, graph_state
+
+CONVERSATIONS = [
+    'Alice Johnson works at Google on the Python project. Bob Lee uses Docker.',
+    'We met Carol King at Microsoft.\nShe wants to learn the Rust language for the Atlas project.',
+    'Alice Johnson said the Python project ships next week. Dave Brown agreed.',
+]
+
+
+def test_extractor_finds_people_and_concepts():
+    found = extract_conversation_entities(CONVERSATIONS[0])
+    names = {entity['name']: entity['type'] for entity in found}
+    assert names['Alice Johnson'] == 'person'
+    assert names['Bob Lee'] == 'person'
+    assert 'concept' in names.values()
+
+
+@pytest.mark.parametrize('size', [1, 7, 64])
+def test_chunked_extraction_matches_whole_text(size):
+    text = '\n'.join(CONVERSATIONS * 3)
+    extractor = ConversationExtractor()
+    for start in range(0, len(text), size):
+        extractor.feed(text[start:start + size])
+    assert extractor.finish() == extract_conversation_entities(text)
+
+
+def test_unfinished_line_stays_bounded():
+    words = [f'word{i} ' for i in range(20000)]
+    text = ''.join(words[:10000]) + 'the office team ' + ''.join(words[10000:]) + 'y' * 100000 + ' plan'
+    extractor = ConversationExtractor()
+    for start in range(0, len(text), 1000):
+        extractor.feed(text[start:start + 1000])
+        assert len(extractor._line_tail) < 2 * memory_server._LINE_TAIL_LIMIT
+    assert extractor.finish() == extract_conversation_entities(text)
+
+
+def test_review_file_matches_review_text(tmp_path):
+    path = tmp_path / 'transcript.txt'
+    text = '\r\n'.join(CONVERSATIONS)
+    path.write_text(text, encoding='utf-8', newline='')
+    assert extract_conversation_file(str(path)) == extract_conversation_entities(text)
+
+
+def test_chunked_review_tools(manager):
+    session = call(manager, 'begin_conversation_review')['session_id']
+    text = CONVERSATIONS[0]
+    for start in range(0, len(text), 10):
+        assert call(manager, 'append_conversation_chunk', session_id=session, chunk=text[start:start + 10])['success']
+    result = call(manager, 'finish_conversation_review', session_id=session)
+    assert result['success'] and 'Alice Johnson' in result['entities_created']
+    assert not call(manager, 'finish_conversation_review', session_id=session)['success']
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+@pytest.mark.parametrize('max_entities', [0, 4, 2])
+def test_review_conversations_matches_reviewing_in_turn(tmp_path, make_manager, workers, max_entities):
+    paths = []
+    for i, text in enumerate(CONVERSATIONS[:2]):
+        path = tmp_path / f'{i}.txt'
+        path.write_text(text, encoding='utf-8', newline='')
+        paths.append(str(path))
+
+    one_by_one = make_manager('one_by_one', max_entities=max_entities)
+    refused = [i for i, text in enumerate(CONVERSATIONS) if not analyze_conversation(text, one_by_one)['success']]
+
+    together = make_manager('together', max_entities=max_entities)
+    result = review_conversations(paths + [str(tmp_path / 'missing.txt')], CONVERSATIONS[2:], together, workers)
+    sources = paths + ['conversations[0]']
+    expected = [sources[i] for i in refused if i < 2] + [str(tmp_path / 'missing.txt')] + \
+        [sources[i] for i in refused if i == 2]
+    assert result['reviewed'] == 3 - len(refused)
+    assert [failure['source'] for failure in result['failed']] == expected
+    assert graph_state(together) == graph_state(one_by_one)
+    if max_entities:
+        assert refused if max_entities == 2 else not refused  # The transcripts hold 2 or 3 entities each
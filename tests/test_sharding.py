@@ -0,0 +1,73 @@
+import pytest
+
+from memory_server import Entity, KnowledgeGraphManager, Relation, ShardedGraph, shard_path
+from tests.conftest import call, graph_state
+
+
+@pytest.fixture
+def sharded(tmp_path):
+    graph = ShardedGraph(str(tmp_path / 'memory.jsonl'), 3, backend='jsonl', weight_flush_interval=0)
+    yield graph
+    graph.close()
+
+
+def build(graph) -> None:
+    graph.create_entities([Entity(f'E{i}', 'even' if i % 2 == 0 else 'odd', [f'word{i % 4}']) for i in range(12)])
+    graph.create_relations([Relation(f'E{i}', f'E{(i * 5) % 12}', 'r') for i in range(12)])
+    graph.add_observations([{'entityName': 'E3', 'observation': 'word0'}])
+    graph.delete_entities(['E5'])
+
+
+def test_sharded_graph_matches_a_single_manager(tmp_path, sharded):
+    single = KnowledgeGraphManager(str(tmp_path / 'single.jsonl'), weight_flush_interval=0)
+    for graph in (single, sharded):
+        build(graph)
+    assert graph_state(sharded) == graph_state(single)
+    for query in ('word0', 'E1', 'odd'):
+        assert sorted(e.name for e in sharded.search_nodes(query)) == sorted(e.name for e in single.search_nodes(query))
+    assert sorted(r.from_entity for r in sharded.get_neighbors('E0', direction='in')) == \
+        sorted(r.from_entity for r in single.get_neighbors('E0', direction='in'))
+    assert sharded.traverse(['E1'], max_depth=3)[1] == single.traverse(['E1'], max_depth=3)[1]
+    single.close()
+
+
+def test_sharded_files_and_restart(tmp_path, sharded):
+    build(sharded)
+    expected = graph_state(sharded)
+    sharded.close()
+    assert all((tmp_path / f'memory.shard-{i}-of-3.jsonl').exists() for i in range(3))
+    assert shard_path(str(tmp_path / 'memory.jsonl'), 1, 3) == str(tmp_path / 'memory.shard-1-of-3.jsonl')
+    reopened = ShardedGraph(str(tmp_path / 'memory.jsonl'), 3, backend='jsonl')
+    assert graph_state(reopened) == expected
+    reopened.close()
+
+
+def test_sharded_pages_and_tools(sharded):
+    build(sharded)
+    names, cursor = [], None
+    while True:
+        page = call(sharded, 'read_graph', limit=4, projection='names', **({'cursor': cursor} if cursor else {}))
+        names += page['entities']
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert sorted(names) == sorted(e.name for e in sharded.read_graph().entities)
+    result = call(sharded, 'apply_batch', operations=[
+        {'tool': 'delete_entities', 'arguments': {'entity_names': ['E0', 'E1']}},
+    ])
+    assert result['success'] and result['results'][0]['entities'] == ['E0', 'E1']
+
+
+def test_sharded_change_feed_is_snapshots(sharded):
+    build(sharded)
+    first = sharded.changes_since(0)
+    assert first.snapshot and len([r for r in first.records if r['type'] == 'entity']) == 11
+    assert sharded.changes_since(first.version, first.graph_id).records == []
+    sharded.create_entities([Entity('new', 't', [])])
+    assert sharded.changes_since(first.version, first.graph_id).snapshot
+
+
+def test_sharded_paging_is_validated(sharded):
+    build(sharded)
+    for arguments in ({'limit': 0}, {'offset': -1}, {'cursor': '9:'}, {'cursor': '0:x'}):
+        assert not call(sharded, 'read_graph', **arguments)['success']
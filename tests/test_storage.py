@@ -0,0 +1,137 @@
+import json
+
+import memory_server
+from memory_server import (Entity, JsonlStore, KnowledgeGraphManager, Relation, SqliteStore, copy_graph,
+                           create_store)
+from tests.conftest import graph_state
+
+
+def jsonl_records(path) -> list:
+    return [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines() if line.strip()]
+
+
+def test_mutations_are_appended_as_deltas(tmp_path):
+    path = tmp_path / 'memory.jsonl'
+    manager = KnowledgeGraphManager(str(path))
+    manager.create_entities([Entity('A', 't', ['x'])])
+    manager.add_observations([{'entityName': 'A', 'observation': 'y'}])
+    manager.delete_observations([{'entityName': 'A', 'observation': 'x'}])
+    manager.close()
+    types = [record['type'] for record in jsonl_records(path)]
+    assert types[-2:] == ['add_observation', 'delete_observation']
+
+
+def test_compaction_rewrites_the_log_as_a_snapshot(tmp_path):
+    path = tmp_path / 'memory.jsonl'
+    manager = KnowledgeGraphManager(str(path), compaction_min_bytes=256)
+    manager.create_entities([Entity('A', 't', [])])
+    for i in range(50):
+        manager.add_observations([{'entityName': 'A', 'observation': f'observation {i}'}])
+    manager.close()  # Waits for background compaction
+    records = jsonl_records(path)
+    assert records[0]['type'] == 'entity' and records[0]['observations']  # Compacted in the background
+    assert len(records) < 50
+    manager.compact()
+    assert [record['type'] for record in jsonl_records(path)] == ['entity']
+    assert graph_state(KnowledgeGraphManager(str(path)))[0][0][2] == tuple(f'observation {i}' for i in range(50))
+
+
+def test_torn_and_corrupt_lines_are_quarantined(tmp_path):
+    path = tmp_path / 'memory.jsonl'
+    manager = KnowledgeGraphManager(str(path))
+    manager.create_entities([Entity('A', 't', ['x']), Entity('B', 't', [])])
+    manager.close()
+    with open(path, 'ab') as f:
+        f.write(b'not json at all\n{"type": "entity", "name": "C", "entityType": "t", "observ')
+
+    recovered = KnowledgeGraphManager(str(path))
+    assert [entity.name for entity in recovered.read_graph().entities] == ['A', 'B']
+    quarantined = (tmp_path / 'memory.jsonl.corrupt').read_bytes().splitlines()
+    assert quarantined[0] == b'not json at all'
+    assert len(quarantined) == 2
+    # The file itself was rewritten without them and keeps working
+    recovered.create_entities([Entity('D', 't', [])])
+    recovered.close()
+    assert [record['name'] for record in jsonl_records(path)] == ['A', 'B', 'D']
+
+
+def test_snapshots_replace_the_file_atomically(tmp_path):
+    path = tmp_path / 'memory.jsonl'
+    manager = KnowledgeGraphManager(str(path))
+    manager.create_entities([Entity('A', 't', [])])
+    manager.compact()
+    assert sorted(p.name for p in tmp_path.iterdir() if not p.name.endswith('.lock')) == ['memory.jsonl']
+
+
+def test_processes_sharing_a_file_see_each_others_writes(make_manager):
+    first, second = make_manager(), make_manager()
+    first.create_entities([Entity('A', 't', ['x'])])
+    second.add_observations([{'entityName': 'A', 'observation': 'y'}])
+    second.create_relations([Relation('A', 'A', 'self')])
+    assert graph_state(first) == graph_state(second)
+    assert graph_state(first)[0] == [('A', 't', ('x', 'y'), 0)]
+
+
+def test_binary_snapshot_cold_start(tmp_path):
+    path = str(tmp_path / 'memory.jsonl')
+    manager = KnowledgeGraphManager(path, store=create_store('jsonl', path, binary_snapshot=True))
+    manager.create_entities([Entity(f'E{i}', 't', [f'text {i}']) for i in range(20)])
+    manager.compact()
+    manager.close()
+    assert (tmp_path / 'memory.jsonl.snap').exists()
+
+    reloaded = KnowledgeGraphManager(path, store=create_store('jsonl', path, binary_snapshot=True))
+    reloaded.create_entities([Entity('late', 't', ['text late'])])
+    assert {e.name for e in reloaded.search_nodes('text 1')} == {'E1'} | {f'E{i}' for i in range(10, 20)}
+    assert len(reloaded.search_nodes('text')) == 21
+
+
+def test_stale_binary_snapshot_is_ignored(tmp_path):
+    path = tmp_path / 'memory.jsonl'
+    manager = KnowledgeGraphManager(str(path), store=create_store('jsonl', str(path), binary_snapshot=True))
+    manager.create_entities([Entity('A', 't', [])])
+    manager.compact()
+    manager.close()
+    path.write_text('{"type": "entity", "name": "B", "entityType": "t", "observations": []}\n', encoding='utf-8')
+
+    reloaded = KnowledgeGraphManager(str(path), store=create_store('jsonl', str(path), binary_snapshot=True))
+    assert [e.name for e in reloaded.read_graph().entities] == ['B']
+
+
+def test_sqlite_import_and_export_round_trip(tmp_path):
+    source = tmp_path / 'memory.jsonl'
+    manager = KnowledgeGraphManager(str(source))
+    manager.create_entities([Entity('A', 't', ['x', 'y'], weight=3), Entity('B', 'u', [])])
+    manager.create_relations([Relation('A', 'B', 'r')])
+    expected = graph_state(manager)
+    manager.close()
+
+    assert copy_graph(JsonlStore(str(source)), SqliteStore(str(tmp_path / 'memory.db'))) == (2, 1)
+    assert copy_graph(SqliteStore(str(tmp_path / 'memory.db')), JsonlStore(str(tmp_path / 'out.jsonl'))) == (2, 1)
+    for path, store in ((tmp_path / 'memory.db', SqliteStore), (tmp_path / 'out.jsonl', JsonlStore)):
+        assert graph_state(KnowledgeGraphManager(str(path), store=store(str(path)))) == expected
+
+
+def test_cli_import_jsonl(tmp_path, capsys):
+    source = tmp_path / 'memory.jsonl'
+    manager = KnowledgeGraphManager(str(source))
+    manager.create_entities([Entity('A', 't', [])])
+    manager.close()
+    memory_server.cli(['import-jsonl', '--jsonl', str(source), '--db', str(tmp_path / 'memory.db')])
+    assert 'Imported 1 entities and 0 relations' in capsys.readouterr().out
+
+
+def test_codecs_read_each_others_files(tmp_path, monkeypatch):
+    path = tmp_path / 'memory.jsonl'
+    manager = KnowledgeGraphManager(str(path))
+    manager.create_entities([Entity('Zoë', 't', ['naïve ☃', 'lone \ud800 surrogate'])])
+    manager.close()
+    expected = graph_state(KnowledgeGraphManager(str(path)))
+
+    with monkeypatch.context() as patch:
+        # Without orjson/msgspec: reads the file, and writes one the fast codec reads back
+        patch.setattr(memory_server, '_fast_dumpb', None)
+        patch.setattr(memory_server, '_fast_loads', None)
+        assert graph_state(KnowledgeGraphManager(str(path))) == expected
+        KnowledgeGraphManager(str(path)).compact()
+    assert graph_state(KnowledgeGraphManager(str(path))) == expected
@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+
+import memory_server
+from memory_server import Entity, NamespaceManagers, handle_tool_call
+from tests.conftest import call
+
+
+def populate(manager) -> None:
+    call(manager, 'create_entities', entities=[
+        {'name': 'Alice', 'entityType': 'person', 'observations': ['likes Python']},
+        {'name': 'Bob', 'entityType': 'person', 'observations': ['likes chess']},
+    ])
+    call(manager, 'create_relations', relations=[{'from_entity': 'Alice', 'to_entity': 'Bob', 'relationType': 'knows'}])
+
+
+def call_text(manager, tool: str, **arguments) -> str:
+    return memory_server._call_tool(manager, tool, arguments)[0]['text']
+
+
+def test_search_and_open_nodes_responses(manager):
+    populate(manager)
+    result = call(manager, 'search_nodes', query='likes', include_scores=True)
+    assert result['success'] and result['count'] == 2
+    assert [entity['name'] for entity in result['entities']] == ['Alice', 'Bob']
+    assert set(result['entities'][0]) == {'name', 'entityType', 'observations', 'weight', 'last_accessed', 'score'}
+    result = call(manager, 'open_nodes', names=['Bob', 'missing'])
+    assert result['count'] == 1 and result['entities'][0]['weight'] == 2  # Found by the search too
+
+
+def test_read_graph_projections_and_paging(manager):
+    populate(manager)
+    full = call(manager, 'read_graph')
+    assert [e['name'] for e in full['entities']] == ['Alice', 'Bob'] and len(full['relations']) == 1
+    assert 'next_cursor' not in full
+    page = call(manager, 'read_graph', limit=1, projection='summary')
+    assert page['entities'] == [{'name': 'Alice', 'entityType': 'person', 'observation_count': 1,
+                                 'weight': 0, 'last_accessed': page['entities'][0]['last_accessed']}]
+    assert page['total'] == 2
+    rest = call(manager, 'read_graph', cursor=page['next_cursor'], projection='names', include_relations=False)
+    assert rest == {'entities': ['Bob'], 'next_cursor': None, 'total': 2}
+
+
+def test_neighbors_and_traverse_tools(manager):
+    populate(manager)
+    assert call(manager, 'get_neighbors', name='Bob', direction='in')['neighbors'] == ['Alice']
+    result = call(manager, 'traverse', start=['Bob'], max_depth=1)
+    assert result['depths'] == {'Bob': 0, 'Alice': 1}
+    assert call(manager, 'traverse', start=['Bob'])['depths'] == manager.traverse(['Bob'])[1]  # Same default depth
+    assert not call(manager, 'get_neighbors', name='Bob', direction='up')['success']
+
+
+def test_prune_tool(manager):
+    manager.create_entities([Entity('A', 't', [], weight=0), Entity('B', 't', [], weight=4)])
+    assert call(manager, 'prune_entities', threshold=1)['pruned_entities'] == ['A']
+    assert call(manager, 'prune_entities', count=5)['pruned_entities'] == ['B']
+
+
+def test_prune_tool_rejects_bad_arguments(manager):
+    manager.create_entities([Entity('A', 't', [], weight=0)])
+    for arguments in ({'threshold': '2'}, {'threshold': True}, {'count': -1}, {'count': 1.5}):
+        result = call(manager, 'prune_entities', **arguments)
+        assert not result['success'] and 'must be' in result['error']
+    assert call(manager, 'prune_entities', threshold=1)['pruned_entities'] == ['A']
+
+
+def test_unknown_tool(manager):
+    assert call(manager, 'no_such_tool') == {'success': False, 'error': 'Unknown tool: no_such_tool'}
+
+
+def test_server_stats_counts_tool_calls(tmp_path, monkeypatch):
+    manager = memory_server.create_manager('jsonl', str(tmp_path / 'memory.jsonl'))
+    monkeypatch.setattr(memory_server, 'knowledge_graph_manager', manager)
+    memory_server.metrics.reset()
+    asyncio.run(handle_tool_call('create_entities', {'entities': [{'name': 'A', 'entityType': 't'}]}))
+    asyncio.run(handle_tool_call('open_nodes', {'names': 'not a list'}))
+
+    stats = call(manager, 'server_stats')
+    assert stats['graph']['entities'] == 1
+    assert stats['tools']['create_entities']['calls'] == 1
+    assert stats['tools']['create_entities']['errors'] == 0
+    text = call_text(manager, 'server_stats', format='prometheus', reset=True)
+    assert 'memory_tool_calls_total{tool="create_entities"} 1' in text
+    assert memory_server.metrics.snapshot() == {}
+    manager.close()
+
+
+def test_namespaces_are_separate_graphs(tmp_path, monkeypatch):
+    monkeypatch.setattr(memory_server, 'namespaces', NamespaceManagers(str(tmp_path), 'jsonl', max_loaded=1))
+    for namespace in ('one', 'two'):
+        memory_server.call_tool('create_entities', {'namespace': namespace,
+                                                     'entities': [{'name': namespace, 'entityType': 't'}]})
+    for namespace in ('one', 'two'):
+        result = memory_server.json_loads(memory_server.call_tool('read_graph', {'namespace': namespace})[0]['text'])
+        assert [entity['name'] for entity in result['entities']] == [namespace]
+    assert memory_server.namespaces.stats()['evictions'] >= 2
+    assert sorted(p.name for p in tmp_path.glob('*.jsonl')) == ['one.jsonl', 'two.jsonl']
+    bad = memory_server.json_loads(memory_server.call_tool('read_graph', {'namespace': '../etc'})[0]['text'])
+    assert not bad['success'] and 'Invalid namespace' in bad['error']
+    memory_server.namespaces.close()
+
+
+@pytest.mark.parametrize('arguments, error', [
+    ({'limit': 0}, 'limit must be a positive integer'),
+    ({'limit': -3}, 'limit must be a positive integer'),
+    ({'limit': '5'}, 'limit must be a positive integer'),
+    ({'offset': -1}, 'offset must be a non-negative integer'),
+    ({'cursor': 'abc'}, 'Invalid cursor: abc'),
+    ({'cursor': '-1'}, 'Invalid cursor: -1'),
+])
+def test_read_graph_rejects_bad_paging(manager, arguments, error):
+    populate(manager)
+    result = call(manager, 'read_graph', **arguments)
+    assert result == {'success': False, 'error': result['error']}
+    assert result['error'].startswith(error)
+
+
+def test_read_graph_last_page_has_no_cursor(manager):
+    populate(manager)
+    page = call(manager, 'read_graph', limit=2)
+    assert len(page['entities']) == 2 and page['next_cursor'] is None
+    assert call(manager, 'read_graph', limit=1, offset=5) == {'entities': [], 'relations': [],
+                                                               'next_cursor': None, 'total': 2}
+
+
+@pytest.mark.parametrize('fast_codec', [True, False])
+def test_responses_are_in_the_codecs_own_format(manager, monkeypatch, fast_codec):
+    if not fast_codec:
+        monkeypatch.setattr(memory_server, '_fast_dumpb', None)
+    populate(manager)
+    manager.create_entities([Entity('Zoë', 'person', ['naïve "quoted"\n'])])
+    for tool, arguments in (('search_nodes', {'query': 'o'}), ('search_nodes', {'query': 'o'}),
+                            ('search_nodes', {'query': 'likes', 'include_scores': True}),
+                            ('open_nodes', {'names': ['Zoë', 'Bob']}), ('open_nodes', {'names': ['Zoë', 'Bob']}),
+                            ('read_graph', {}), ('read_graph', {'limit': 1, 'projection': 'summary'})):
+        text = call_text(manager, tool, **arguments)
+        assert text == memory_server.json_dumps(memory_server.json_loads(text)), (tool, arguments)